@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import AsyncLoginView
+
+# Async versions of the auth endpoints, served under api/async/auth/.
+urlpatterns = [
+    path('login/', AsyncLoginView.as_view(), name='async-login'),
+]
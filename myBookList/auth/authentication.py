@@ -0,0 +1,76 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import user_cache
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication for async views. Validating the token needs no I/O,
+    only the user is fetched, with the async ORM.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: self.get_user_id(validated_token)})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        self.check_user(user, validated_token)
+        return user
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        # Same checks as JWTAuthentication.get_user().
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+class CachedJWTAuthentication(AsyncJWTAuthentication):
+    """
+    JWTAuthentication that serves the user from auth.cache.user_cache, so
+    most authenticated requests run no query for it.
+
+    The user is a regular User instance built from the cached row, it
+    compares equal to the creator of a book and can be used in queries. Opt
+    in through DEFAULT_AUTHENTICATION_CLASSES, the cache is configured with
+    the AUTH_USER_CACHE_* settings.
+    """
+
+    def get_user(self, validated_token):
+        user = user_cache.get(self.get_user_id(validated_token))
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+        else:
+            self.check_user(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        user = user_cache.get(self.get_user_id(validated_token))
+        if user is None:
+            user = await super().aget_user(validated_token)
+            user_cache.set(user)
+        else:
+            self.check_user(user, validated_token)
+        return user
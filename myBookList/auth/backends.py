@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password
+
+from .passwords import hashing_pool, verify_password
+
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend hashing the passwords in auth.passwords.hashing_pool, and
+    upgrading the outdated hashes. The queries and the upgrade run in the
+    calling thread, on its database connection.
+
+    aauthenticate() is its async counterpart, see auth.passwords.aauthenticate().
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway, so unknown usernames take as long as wrong passwords.
+            hashing_pool.run(make_password, password)
+            return None
+        valid, upgraded = hashing_pool.run(verify_password, password, user.password)
+        if upgraded:
+            user.password = upgraded
+            user.save(update_fields=['password'])
+        return user if valid and self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget(**{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            await hashing_pool.arun(make_password, password)
+            return None
+        valid, upgraded = await hashing_pool.arun(verify_password, password, user.password)
+        if upgraded:
+            user.password = upgraded
+            await user.asave(update_fields=['password'])
+        return user if valid and self.user_can_authenticate(user) else None
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+
+from myBookList.metrics import registry
+
+
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+
+HIT = (('cache', 'users'), ('result', 'hit'))
+MISS = (('cache', 'users'), ('result', 'miss'))
+
+
+class UserCache:
+    """
+    Thread safe, in-process LRU of user rows, each entry expires ``ttl``
+    seconds after it was stored.
+
+    Users are evicted as they are saved or deleted, see auth.signals, but
+    only in the process that made the change: the TTL bounds how long other
+    processes may serve the old row.
+    """
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        # Keyed by the string of the id, as stored in the token claims.
+        key = str(user_id)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                registry.inc('cache_requests_total', MISS)
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                registry.inc('cache_requests_total', MISS)
+                return None
+            self.entries.move_to_end(key)
+        registry.inc('cache_requests_total', HIT)
+        # A new instance every time, requests are free to modify their user.
+        return User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+
+    def set(self, user):
+        if self.ttl <= 0 or self.size <= 0:
+            return
+        key = str(user.pk)
+        values = tuple(getattr(user, name) for name in USER_FIELDS)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def evict(self, user_id):
+        with self.lock:
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(settings.AUTH_USER_CACHE_TTL, settings.AUTH_USER_CACHE_SIZE)
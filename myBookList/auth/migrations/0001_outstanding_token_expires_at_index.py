@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-18 07:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # prune_tokens selects the expired tokens by expires_at, which
+    # token_blacklist leaves unindexed.
+    atomic = False
+
+    dependencies = [
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS outstanding_token_expires_at_idx '
+            'ON token_blacklist_outstandingtoken (expires_at)',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS outstanding_token_expires_at_idx',
+        ),
+    ]
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import load_backend, user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import PermissionDenied
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, try again later."
+    default_code = 'hashing_unavailable'
+
+
+class HashingPool:
+    """
+    Runs password hashing in a bounded pool of threads.
+
+    hashlib releases the GIL while it hashes, so the threads run in
+    parallel. At most ``workers + queue`` hashes are accepted at a time, a
+    request that cannot get a slot within ``timeout`` seconds gets
+    HashingUnavailable instead of piling up behind the others.
+
+    run() waits for the hash in the calling thread: under WSGI the pool only
+    bounds how many hashes run at once, each login still holds a worker
+    thread meanwhile. The async login view awaits arun() instead, which
+    holds no thread while the hash runs.
+    """
+
+    def __init__(self, workers, queue, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise HashingUnavailable()
+        try:
+            return self.get_executor().submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+    async def arun(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            # Waiting for a slot must not block the event loop.
+            acquired = await sync_to_async(self.slots.acquire, thread_sensitive=False)(timeout=self.timeout)
+            if not acquired:
+                raise HashingUnavailable()
+        try:
+            future = self.get_executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # Once the hash is done, even when the request was cancelled meanwhile.
+        future.add_done_callback(lambda future: self.slots.release())
+        return await asyncio.wrap_future(future)
+
+    def get_executor(self):
+        # Created on first use, forking servers would not copy the threads.
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hashing')
+            return self.executor
+
+
+hashing_pool = HashingPool(
+    settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE, settings.PASSWORD_HASHING_TIMEOUT,
+)
+
+
+def verify_password(password, encoded):
+    """
+    Returns whether ``password`` matches ``encoded``, along with the password
+    re-encoded with the preferred hasher when ``encoded`` is outdated.
+    """
+    outdated = []
+    valid = check_password(password, encoded, setter=outdated.append)
+    return valid, make_password(password) if valid and outdated else None
+
+
+async def aauthenticate(request, **credentials):
+    """
+    django.contrib.auth.authenticate() for the async views. Backends with an
+    aauthenticate() method, like auth.backends.PooledModelBackend, are
+    awaited, the others run in a thread. Django's own aauthenticate() runs
+    every backend in the thread shared by the sync code, one login at a time.
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        try:
+            if hasattr(backend, 'aauthenticate'):
+                user = await backend.aauthenticate(request, **credentials)
+            else:
+                user = await sync_to_async(backend.authenticate)(request, **credentials)
+        except PermissionDenied:
+            # The backend refused the user, the others are not tried.
+            break
+        if user is not None:
+            user.backend = backend_path
+            return user
+
+    cleansed = {key: '********************' if key == 'password' else value for key, value in credentials.items()}
+    await user_login_failed.asend(sender=__name__, credentials=cleansed, request=request)
+    return None
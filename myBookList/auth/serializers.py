@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import CachedRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,17 +13,33 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'id': {'read_only': True},
             'password': {'write_only': True},
+            # Uniqueness is left to the database constraint, see CreateUserView.
+            'username': {'validators': [User.username_validator]},
         }
 
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
         return user
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
 
-        refresh = RefreshToken.for_user(instance)
-        data['refresh'] = str(refresh)
-        data['access'] = str(refresh.access_token)
+class RefreshTokenSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        # Same as TokenRefreshSerializer.validate(), with the user loaded once
+        # for the check, the blacklist and the rotated token.
+        refresh = self.token_class(attrs['refresh'])
+        user = refresh.get_user()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
 
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
         return data
@@ -0,0 +1,15 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import user_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_cached_user(instance, **kwargs):
+    # Evicted again on commit, a request may cache the old row meanwhile.
+    user_id = instance.pk
+    user_cache.evict(user_id)
+    transaction.on_commit(lambda: user_cache.evict(user_id))
@@ -3,6 +3,27 @@ from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+from django.core.cache import caches
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from unittest import mock
+from book.models import Book
+from book.views import BookRetrieveUpdateDestroyView, FavouriteBook, UserFavouriteBooksView
+from .authentication import CachedJWTAuthentication
+from .cache import UserCache, user_cache
+from .tokens import CachedRefreshToken
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth.hashers import make_password
+from django.test import override_settings
+from django.contrib.auth.signals import user_login_failed
+from .passwords import HashingPool, HashingUnavailable, hashing_pool
+from .serializers import UserSerializer
 
 class RegisterViewTestCase(TestCase):
     def setUp(self):
@@ -23,6 +44,34 @@ class RegisterViewTestCase(TestCase):
         self.assertIn('refresh', response.data)
         self.assertIn('access', response.data)
 
+    def test_register_writes_once(self):
+        data = {'username': 'testuser', 'email': 'test@mail.com', 'password': 'testpassword'}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/auth/register/', data)
+        # Savepoints stand in for the transaction inside the test case.
+        queries = [query['sql'] for query in context.captured_queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        token = OutstandingToken.objects.get()
+        self.assertEqual(token.token, response.data['refresh'])
+
+    def test_register_taken_username(self):
+        User.objects.create_user(username='testuser', password='testpassword')
+        data = {'username': 'testuser', 'email': 'test@mail.com', 'password': 'testpassword'}
+        response = self.client.post('/api/auth/register/', data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['username'], ['A user with that username already exists.'])
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+    def test_serializing_a_user_mints_no_token(self):
+        user = User.objects.create_user(username='testuser', password='testpassword')
+        with CaptureQueriesContext(connection) as context:
+            data = UserSerializer(user).data
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(set(data), {'id', 'username', 'email'})
+
 class LoginViewTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -73,3 +122,207 @@ class LogoutViewTestCase(TestCase):
     def test_logout_unauthenticated(self):
         response = self.client.post('/api/auth/logout/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        user_cache.clear()
+        self.addCleanup(user_cache.clear)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_user_is_cached(self):
+        authentication = CachedJWTAuthentication()
+        with self.assertNumQueries(1):
+            user, _ = authentication.authenticate(self.request)
+        with self.assertNumQueries(0):
+            cached, _ = authentication.authenticate(self.request)
+        self.assertIsInstance(cached, User)
+        self.assertEqual(cached, self.user)
+        self.assertEqual(cached.username, 'testuser')
+        self.assertIsNot(cached, user)
+
+    def test_saving_the_user_evicts_it(self):
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate(self.request)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate(self.request)
+
+    def test_lru_and_ttl(self):
+        cache = UserCache(ttl=60, size=2)
+        users = [self.user] + [User.objects.create_user(username=f'user{i}') for i in range(2)]
+        for user in users:
+            cache.set(user)
+        self.assertIsNone(cache.get(users[0].pk))
+        self.assertEqual(cache.get(users[1].pk), users[1])
+        with mock.patch('auth.cache.time.monotonic', return_value=float('inf')):
+            self.assertIsNone(cache.get(users[2].pk))
+
+    def test_views_skip_the_user_query(self):
+        book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/favourites/')
+        # The captured queries are read lazily, later requests reset the log.
+        uncached = len(queries)
+
+        views = [BookRetrieveUpdateDestroyView, FavouriteBook, UserFavouriteBooksView]
+        patches = [mock.patch.object(view, 'authentication_classes', [CachedJWTAuthentication]) for view in views]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.client.get('/api/favourites/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/favourites/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), uncached - 1)
+
+        response = self.client.post(f'/api/favourites/{book.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/favourites/').data['count'], 1)
+        # IsCreator compares the book creator with the cached user.
+        response = self.client.patch(f'/api/books/{book.pk}/', {'title': 'Updated Book'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RefreshTokenBlacklistTestCase(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': str(token)})
+
+    def test_rotated_tokens_are_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.refresh(self.refresh(RefreshToken.for_user(self.user)).data['refresh']).status_code,
+            status.HTTP_200_OK)
+
+    def test_logged_out_tokens_are_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/auth/logout/', {'refresh_token': str(token)})
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklisted_tokens(self):
+        token = CachedRefreshToken.for_user(self.user)
+        token.blacklist()
+        self.assertEqual(self.refresh(token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prune_tokens(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        for _ in range(3):
+            RefreshToken.for_user(self.user)
+        current = RefreshToken.for_user(self.user)
+        current.blacklist()
+        OutstandingToken.objects.exclude(jti=current['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        out = StringIO()
+        call_command('prune_tokens', batch_size=2, stdout=out)
+        self.assertIn('Deleted 4 expired tokens', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [current['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class LoginHashingTestCase(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def login(self, password='testpassword'):
+        return self.client.post('/api/auth/login/', {'username': 'testuser', 'password': password})
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_hash_is_upgraded_on_login(self):
+        self.user.password = make_password('testpassword', hasher='pbkdf2_sha1')
+        self.user.save()
+        self.assertEqual(self.login('wrongpassword').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha1$'))
+
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.user.check_password('testpassword'))
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_inactive_and_unknown_users(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.login().status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post('/api/auth/login/', {'username': 'nobody', 'password': 'testpassword'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_saturated_pool(self):
+        with mock.patch.object(hashing_pool, 'slots', mock.Mock(**{'acquire.return_value': False})):
+            response = self.login()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_pool_bounds_hashes_in_progress(self):
+        pool = HashingPool(workers=1, queue=0, timeout=0)
+        self.addCleanup(lambda: pool.executor and pool.executor.shutdown())
+        self.assertEqual(pool.run(pow, 2, 10), 1024)
+        pool.slots.acquire()
+        with self.assertRaises(HashingUnavailable):
+            pool.run(pow, 2, 10)
+
+    async def test_async_pool(self):
+        pool = HashingPool(workers=1, queue=0, timeout=0)
+        self.addCleanup(lambda: pool.executor and pool.executor.shutdown())
+        self.assertEqual(await pool.arun(pow, 2, 10), 1024)
+        # Released once the hash is done.
+        self.assertEqual(await pool.arun(pow, 2, 10), 1024)
+        pool.slots.acquire()
+        with self.assertRaises(HashingUnavailable):
+            await pool.arun(pow, 2, 10)
+
+    def test_failed_logins_are_signalled(self):
+        failures = []
+
+        def failed(credentials, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(failed)
+        self.addCleanup(user_login_failed.disconnect, failed)
+        self.assertEqual(self.login('wrongpassword').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]['username'], 'testuser')
+        self.assertNotEqual(failures[0]['password'], 'wrongpassword')
+
+    async def test_async_login(self):
+        url = '/api/async/auth/login/'
+        response = await self.async_client.post(url, {'username': 'testuser', 'password': 'testpassword'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['username'], 'testuser')
+        self.assertIn('access', response.json())
+
+        response = await self.async_client.post(url, {'username': 'testuser', 'password': 'wrongpassword'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.post(url, {'username': 'nobody', 'password': 'testpassword'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = False
+        await self.user.asave()
+        response = await self.async_client.post(url, {'username': 'testuser', 'password': 'testpassword'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    RefreshToken loading its user once and keeping it in ``user``,
+    blacklisting and outstanding the token each load it again in
+    RefreshToken.
+
+    The blacklist check is RefreshToken's, an indexed lookup of the jti. The
+    expired tokens are deleted by the prune_tokens command.
+    """
+    user = None
+
+    def get_user(self):
+        if self.user is None:
+            User = get_user_model()
+            user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+            self.user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        return self.user
+
+    def blacklist(self):
+        return BlacklistedToken.objects.get_or_create(token=self.outstand()[0])
+
+    def outstand(self):
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user': self.get_user,
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
@@ -1,8 +1,10 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import LoginView, CreateUserView, LogoutView
 
 urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('register/', CreateUserView.as_view(), name='register'),
-    path('logout/', LogoutView.as_view(), name='logout')
+    path('logout/', LogoutView.as_view(), name='logout'),
+    path('refresh/', TokenRefreshView.as_view(), name='token-refresh'),
 ]
@@ -1,13 +1,19 @@
+from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from .serializers import UserSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from rest_framework.response import Response
 from rest_framework import status
-from django.contrib.auth import authenticate
+from book.async_views import AsyncAPIView
+from .passwords import aauthenticate
 from rest_framework_simplejwt.exceptions import TokenError
+from .tokens import CachedRefreshToken
 # Create your views here.
 
 class CreateUserView(generics.CreateAPIView):
@@ -15,24 +21,53 @@ class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # The user and its refresh token are written in one transaction, and
+        # a taken username is caught by the unique constraint instead of a
+        # query beforehand.
+        try:
+            with transaction.atomic():
+                user = serializer.save()
+                refresh = RefreshToken.for_user(user)
+        except IntegrityError:
+            raise ValidationError({'username': [User._meta.get_field('username').error_messages['unique']]})
+
+        data = {**serializer.data, 'refresh': str(refresh), 'access': str(refresh.access_token)}
+        return Response(data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(data))
+
+def login_response(user):
+    if user is None:
+        return Response({'error': 'Invalid Credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+    refresh = RefreshToken.for_user(user)
+    return Response({
+        "id": user.id,
+        "username": user.username,
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    })
+
 class LoginView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
-        user = authenticate(username=username, password=password)
-
-        if user is not None:
-            refresh = RefreshToken.for_user(user)
-            return Response({
-                "id": user.id,
-                "username": user.username,
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            })
-        else:
-            return Response({'error': 'Invalid Credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        return login_response(authenticate(request, username=username, password=password))
+
+class AsyncLoginView(AsyncAPIView):
+    """
+    LoginView for ASGI servers, waiting for the password hash without
+    holding a thread, see auth.passwords.HashingPool.
+    """
+
+    async def post(self, request):
+        username = request.data.get('username')
+        password = request.data.get('password')
+        user = await aauthenticate(request, username=username, password=password)
+        # Writes the outstanding token.
+        return await sync_to_async(login_response)(user)
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
@@ -42,7 +77,7 @@ class LogoutView(APIView):
             refresh_token = request.data.get("refresh_token")
             if refresh_token:
                 try:
-                    token = RefreshToken(refresh_token)
+                    token = CachedRefreshToken(refresh_token)
                     token.blacklist()
                 except TokenError as e:
                     return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
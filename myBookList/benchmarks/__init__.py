@@ -0,0 +1,11 @@
+"""
+Performance benchmarks for the book API.
+
+Each module is a script that creates a throw-away test database, seeds it and
+prints its measurements as JSON. Run them from the myBookList directory, with
+the same environment variables as the server:
+
+    python -m benchmarks.export --rows 100000
+
+Benchmarks that go through HTTP start their servers with benchmarks.settings.
+"""
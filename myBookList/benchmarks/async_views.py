@@ -0,0 +1,171 @@
+"""
+Requests/sec and latency of the sync (WSGI) book views against the async
+views (ASGI) under many concurrent connections.
+
+    python -m benchmarks.async_views --connections 500 --duration 30
+
+A WSGI and an ASGI server are started on the benchmark database with
+benchmarks.settings (no throttling, no response cache), by default gunicorn
+and uvicorn, which must be installed (``pip install gunicorn uvicorn``). The
+commands are format strings, see --wsgi-command and --asgi-command.
+
+Every connection may hold a database connection, PostgreSQL's
+max_connections has to be raised accordingly (or --connections lowered).
+"""
+import argparse
+import asyncio
+import os
+import shlex
+import socket
+import subprocess
+import time
+
+from .utils import benchmark_database, percentile, report, seed_books, setup_django
+
+
+WSGI_COMMAND = 'gunicorn myBookList.wsgi:application --bind {host}:{port} --workers {workers} --threads 8'
+ASGI_COMMAND = 'uvicorn myBookList.asgi:application --host {host} --port {port} --workers {workers} --no-access-log'
+
+ENDPOINTS = {
+    'list': 'books/',
+    'cursor': 'books/?pagination=cursor&page_size=20',
+    'detail': 'books/{book_id}/',
+    'favourites': 'favourites/',
+}
+
+
+class Server:
+    def __init__(self, command, host, port, env):
+        self.host = host
+        self.port = port
+        self.process = subprocess.Popen(shlex.split(command), env=env)
+
+    def wait_until_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'Server exited with status {self.process.returncode}')
+            try:
+                socket.create_connection((self.host, self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f'Server not listening on {self.host}:{self.port} after {timeout}s')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+async def request(reader, writer, host, path, headers):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{headers}\r\n'.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed')
+    length, keep_alive = 0, True
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            keep_alive = value.strip().lower() != 'close'
+    await reader.readexactly(length)
+    return int(status_line.split()[1]), keep_alive
+
+
+async def connection(host, port, path, headers, deadline, latencies, errors):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            status, keep_alive = await request(reader, writer, host, path, headers)
+        except (OSError, asyncio.IncompleteReadError):
+            errors['connection'] = errors.get('connection', 0) + 1
+            writer = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(host, port, path, headers, connections, duration):
+    latencies, errors = [], {}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[
+        connection(host, port, path, headers, deadline, latencies, errors) for _ in range(connections)
+    ])
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--endpoint', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--wsgi-command', default=WSGI_COMMAND)
+    parser.add_argument('--asgi-command', default=ASGI_COMMAND)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection as db_connection
+    from rest_framework_simplejwt.tokens import AccessToken
+    from book.models import Book
+
+    results = []
+    with benchmark_database():
+        user = User.objects.create_user(username='benchmark')
+        seed_books(args.books, user)
+        book_ids = list(Book.objects.values_list('pk', flat=True)[:50])
+        user.favourite_books.add(*book_ids)
+        headers = f'Authorization: Bearer {AccessToken.for_user(user)}\r\n'
+        # The servers connect to the benchmark database too.
+        env = {**os.environ, 'PG_DB_NAME': db_connection.settings_dict['NAME']}
+
+        for name, command, prefix in [('wsgi', args.wsgi_command, '/api/'), ('asgi', args.asgi_command, '/api/async/')]:
+            server = Server(command.format(host=args.host, port=args.port, workers=args.workers), args.host, args.port, env)
+            try:
+                server.wait_until_ready()
+                for endpoint in args.endpoint:
+                    path = prefix + ENDPOINTS[endpoint].format(book_id=book_ids[0])
+                    latencies, errors = asyncio.run(
+                        load(args.host, args.port, path, headers, args.connections, args.duration)
+                    )
+                    results.append({
+                        'server': name,
+                        'endpoint': endpoint,
+                        'requests': len(latencies),
+                        'requests_per_sec': round(len(latencies) / args.duration, 1),
+                        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+                        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+                        'errors': {str(key): count for key, count in errors.items()},
+                    })
+            finally:
+                server.stop()
+
+    report({
+        'benchmark': 'async_views',
+        'books': args.books,
+        'connections': args.connections,
+        'duration': args.duration,
+        'workers': args.workers,
+        'results': results,
+    })
+
+
+if __name__ == '__main__':
+    main()
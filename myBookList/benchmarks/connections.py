@@ -0,0 +1,80 @@
+"""
+Cost of the database connection in the request path: a fresh connection per
+request (CONN_MAX_AGE = 0), against connections taken from the pool.
+
+    python -m benchmarks.connections --requests 2000 --concurrency 1 8
+
+Each request opens the connection, runs one indexed query and closes it
+again, like a view under each configuration.
+"""
+import argparse
+import threading
+import time
+
+from .utils import benchmark_database, percentile, report, setup_django
+
+
+def run_requests(wrapper_class, settings_dict, concurrency, requests):
+    connect_times, request_times = [], []
+
+    def worker(count):
+        wrapper = wrapper_class(settings_dict)
+        for _ in range(count):
+            started = time.perf_counter()
+            wrapper.ensure_connection()
+            connected = time.perf_counter()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT id FROM book_book WHERE id = 1')
+                cursor.fetchall()
+            wrapper.close()
+            request_times.append(time.perf_counter() - started)
+            connect_times.append(connected - started)
+
+    threads = [threading.Thread(target=worker, args=(requests // concurrency,)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, connect_times, request_times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.db.backends.postgresql.base import DatabaseWrapper
+    from myBookList.db.postgresql import base as pooled
+
+    results = []
+    with benchmark_database():
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0}
+        backends = {
+            'new-connection': (DatabaseWrapper, {**settings_dict, 'OPTIONS': {}}),
+            'pool': (pooled.DatabaseWrapper, {**settings_dict, 'OPTIONS': {'pool': {'max_size': args.pool_size}}}),
+        }
+        for name, (wrapper_class, backend_settings) in backends.items():
+            for concurrency in args.concurrency:
+                elapsed, connect_times, request_times = run_requests(
+                    wrapper_class, backend_settings, concurrency, args.requests,
+                )
+                results.append({
+                    'backend': name,
+                    'concurrency': concurrency,
+                    'requests_per_sec': round(len(request_times) / elapsed, 1),
+                    'connect_ms_mean': round(sum(connect_times) / len(connect_times) * 1000, 3),
+                    'p50_ms': round(percentile(request_times, 50) * 1000, 3),
+                    'p99_ms': round(percentile(request_times, 99) * 1000, 3),
+                })
+        stats = pooled.pool_stats()
+        pooled.close_pools()
+    report({'benchmark': 'connections', 'results': results, 'pool': stats})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Memory of idle event stream connections and the time to fan an event out
+to all of them.
+
+    python -m benchmarks.events --subscribers 10000 --events 100
+
+Each connection is a GET /api/events/ request of its own user, served by
+the ASGI application (myBookList.asgi) in this process: the middleware, the
+JWT authentication, the view and the task Django runs to notice the client
+leaving are all there, only the sockets and the ASGI server are not.
+"bytes_per_connection" is the Python memory they hold while idle
+(tracemalloc), "threads_per_connection" and "db_connections" the threads
+and database connections held meanwhile, "fanout" the time from publishing
+an event to every connection having sent its bytes. Add the memory the ASGI
+server takes per socket, see its documentation, for the cost of a real
+connection.
+
+Django runs the sync code of each ASGI request in a thread of the request's
+own, kept until the request ends. myBookList.asgi serves the streams
+without one, "threads_per_connection" should stay near 0.
+"""
+import argparse
+import asyncio
+import threading
+import time
+import tracemalloc
+
+from .utils import benchmark_database, percentile, report, seed_users, setup_django
+
+
+class Received:
+    def __init__(self, connections):
+        self.connections = connections
+        self.remaining = 0
+        self.done = None
+        self.started = 0
+
+    def expect(self):
+        self.remaining = self.connections
+        self.done = asyncio.Event()
+
+    def body(self, body):
+        if body.startswith(b'retry:'):
+            self.started += 1
+        elif body.startswith(b'event:'):
+            self.remaining -= 1
+            if not self.remaining:
+                self.done.set()
+
+
+def connect(application, token, number, received):
+    """
+    Starts a GET /api/events/ request, returns its task and the future that
+    disconnects the client once set.
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': '/api/events/', 'raw_path': b'/api/events/',
+        'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 10000 + number), 'server': ('localhost', 80),
+    }
+    disconnected = asyncio.get_running_loop().create_future()
+    requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        return await disconnected
+
+    async def send(message):
+        if message['type'] == 'http.response.start' and message['status'] != 200:
+            raise AssertionError(f"GET /api/events/ returned {message['status']}.")
+        if message['type'] == 'http.response.body':
+            received.body(message.get('body', b''))
+
+    return asyncio.create_task(application(scope, receive, send)), disconnected
+
+
+def database_sessions():
+    from django.db import connection
+
+    try:
+        with connection.cursor() as cursor:
+            # Without this one.
+            cursor.execute("SELECT count(*) - 1 FROM pg_stat_activity WHERE datname = current_database()")
+            return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+async def run(args, tokens):
+    from asgiref.sync import sync_to_async
+    from book import events
+    from myBookList.asgi import application
+
+    received = Received(args.subscribers)
+    threads = threading.active_count()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    connections = []
+    # In waves: each request holds a database connection until it is
+    # authenticated, all of them at once would go over max_connections.
+    for start in range(0, len(tokens), args.connect_batch):
+        connections += [
+            connect(application, token, number, received)
+            for number, token in enumerate(tokens[start:start + args.connect_batch], start)
+        ]
+        # Every stream sent its retry line and waits for events.
+        while received.started < len(connections):
+            for task, disconnected in connections[start:]:
+                if task.done():
+                    task.result()
+            await asyncio.sleep(0.01)
+    idle = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    threads = threading.active_count() - threads
+    db_connections = await sync_to_async(database_sessions, thread_sensitive=False)()
+
+    dispatch, fanout = [], []
+    for number in range(args.events):
+        received.expect()
+        started = time.perf_counter()
+        events.hub.deliver({'type': 'book.updated', 'ids': [number]})
+        dispatch.append(time.perf_counter() - started)
+        await received.done.wait()
+        fanout.append(time.perf_counter() - started)
+
+    for task, disconnected in connections:
+        disconnected.set_result({'type': 'http.disconnect'})
+    await asyncio.gather(*(task for task, disconnected in connections))
+    if events.hub.subscriptions:
+        raise AssertionError("Subscriptions left after the clients left.")
+
+    return {
+        'bytes_per_connection': round(idle / args.subscribers),
+        'threads_per_connection': round(threads / args.subscribers, 2),
+        'db_connections': db_connections,
+        'idle_mb': round(idle / 2 ** 20, 1),
+        'dispatch_ms': {'p50': round(percentile(dispatch, 50) * 1000, 2), 'p99': round(percentile(dispatch, 99) * 1000, 2)},
+        'fanout_ms': {'p50': round(percentile(fanout, 50) * 1000, 2), 'p99': round(percentile(fanout, 99) * 1000, 2)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=100)
+    parser.add_argument('--connect-batch', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    with benchmark_database(), override_settings(
+        BOOK_EVENTS_MAX_SUBSCRIBERS=args.subscribers, BOOK_EVENTS_BROKER='book.events.LocalBroker',
+        BOOK_EVENTS_HEARTBEAT=3600, ALLOWED_HOSTS=['localhost'], QUERY_BUDGET_MODE='off',
+    ):
+        # One user each, the throttling counts the requests per user.
+        tokens = [str(AccessToken.for_user(user)) for user in seed_users(args.subscribers, 'benchmark-password')]
+        results = asyncio.run(run(args, tokens))
+    report({'benchmark': 'events', 'subscribers': args.subscribers, 'events': args.events, **results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Streaming export throughput (rows/sec) and peak Python memory.
+
+    python -m benchmarks.export --rows 10000 100000 --format ndjson csv
+
+Peak memory is measured in a separate pass with tracemalloc, it should stay
+flat while the number of rows grows.
+"""
+import argparse
+import time
+import tracemalloc
+
+from .utils import benchmark_database, report, seed_books, setup_django
+
+
+def consume(fmt, chunk_size):
+    from book.exporters import export_chunks, export_rows
+    from book.models import Book
+
+    size = 0
+    for chunk in export_chunks(export_rows(Book.objects.all(), chunk_size), fmt, chunk_size=chunk_size):
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--format', nargs='+', default=['ndjson', 'csv'])
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+
+    results = []
+    with benchmark_database():
+        creator = User.objects.create_user(username='benchmark')
+        for rows in sorted(args.rows):
+            seed_books(rows, creator)
+            for fmt in args.format:
+                started = time.perf_counter()
+                size = consume(fmt, args.chunk_size)
+                elapsed = time.perf_counter() - started
+
+                tracemalloc.start()
+                consume(fmt, args.chunk_size)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                results.append({
+                    'rows': rows,
+                    'format': fmt,
+                    'seconds': round(elapsed, 3),
+                    'rows_per_sec': round(rows / elapsed),
+                    'bytes': size,
+                    'peak_memory_kb': round(peak / 1024),
+                })
+    report({'benchmark': 'export', 'chunk_size': args.chunk_size, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
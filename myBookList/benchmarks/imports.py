@@ -0,0 +1,56 @@
+"""
+Import throughput (rows/sec) of BookImporter, from JSON Lines, for a list
+of batch sizes.
+
+    python -m benchmarks.imports --rows 100000 --batch-size 1000 5000
+
+The time includes the validation with BookSerializer, the inserts and the
+search vectors, every run starts from an empty table.
+"""
+import argparse
+import json
+import time
+
+from .utils import benchmark_database, report, setup_django
+
+
+def lines(rows):
+    for i in range(rows):
+        yield json.dumps({
+            'title': f'Book {i}', 'author': f'Author {i % 1000}',
+            'publicationYear': 1900 + i % 125, 'isbn': '978-0-261-10221-7',
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1000, 5000])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+
+    from book.importers import BookImporter, read_rows
+    from book.models import Book
+
+    results = []
+    with benchmark_database(), override_settings(QUERY_BUDGET_MODE='off'):
+        creator = User.objects.create_user(username='benchmark')
+        for batch_size in args.batch_size:
+            Book.objects.all().delete()
+            started = time.perf_counter()
+            importer = BookImporter(creator, batch_size=batch_size).run(read_rows(lines(args.rows), 'jsonl'))
+            elapsed = time.perf_counter() - started
+            assert importer.created == args.rows, importer.errors
+            results.append({
+                'batch_size': batch_size,
+                'seconds': round(elapsed, 3),
+                'rows_per_sec': round(args.rows / elapsed),
+            })
+    report({'benchmark': 'imports', 'rows': args.rows, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
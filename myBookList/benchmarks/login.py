@@ -0,0 +1,88 @@
+"""
+Login throughput (logins/sec, and per core) and latency.
+
+    python -m benchmarks.login --iterations 720000 100000 --concurrency 1 4 16
+
+Every login goes through django.contrib.auth.authenticate() and
+auth.backends.PooledModelBackend: the user query runs in the calling thread
+and the hashing in the bounded hashing pool, as in LoginView. Each run uses PBKDF2 with the given iteration count.
+"""
+import argparse
+import os
+import threading
+import time
+
+from .utils import benchmark_database, percentile, report, setup_django
+
+
+def run_logins(usernames, password, concurrency, logins):
+    from django.db import connection
+    from django.contrib.auth import authenticate
+
+    latencies = []
+    failures = []
+
+    def worker(count):
+        try:
+            for i in range(count):
+                started = time.perf_counter()
+                user = authenticate(None, username=usernames[i % len(usernames)], password=password)
+                latencies.append(time.perf_counter() - started)
+                if user is None:
+                    failures.append(i)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(logins // concurrency,)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, nargs='+', default=[720000, 100000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from auth.passwords import hashing_pool
+
+    password = 'benchmark-password'
+    usernames = [f'benchmark{i}' for i in range(args.users)]
+    cores = min(os.cpu_count(), hashing_pool.workers)
+    results = []
+    with benchmark_database():
+        for iterations in args.iterations:
+            settings.PASSWORD_HASH_ITERATIONS = iterations
+            # One hash for every user, hashing each one would cost as much as the benchmark.
+            encoded = make_password(password)
+            User.objects.all().delete()
+            User.objects.bulk_create([User(username=username, password=encoded) for username in usernames])
+
+            for concurrency in args.concurrency:
+                elapsed, latencies, failures = run_logins(usernames, password, concurrency, args.logins)
+                logins_per_sec = len(latencies) / elapsed
+                results.append({
+                    'iterations': iterations,
+                    'concurrency': concurrency,
+                    'logins': len(latencies),
+                    'failures': len(failures),
+                    'logins_per_sec': round(logins_per_sec, 1),
+                    'logins_per_sec_per_core': round(logins_per_sec / min(cores, concurrency), 1),
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+                })
+    report({'benchmark': 'login', 'cores': cores, 'hashing_workers': hashing_pool.workers, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
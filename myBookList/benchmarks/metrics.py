@@ -0,0 +1,117 @@
+"""
+Per-request cost of MetricsMiddleware.
+
+    python -m benchmarks.metrics --requests 20000 --concurrency 1 8
+
+"middleware" times the middleware alone around a view that does nothing, so
+the difference is what recording costs every request. "books-list" sends
+GET /api/books/ through the whole stack with and without the middleware.
+Throttling is turned off for the run.
+"""
+import argparse
+import threading
+import time
+from unittest import mock
+
+from .utils import benchmark_database, percentile, report, seed_books, setup_django
+
+
+def run_threads(call, concurrency, requests):
+    latencies = []
+
+    def worker(count):
+        from django.db import connection
+
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(requests // concurrency,)) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def summary(elapsed, latencies):
+    return {
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'mean_us': round(sum(latencies) / len(latencies) * 1e6, 2),
+        'p50_us': round(percentile(latencies, 50) * 1e6, 2),
+        'p99_us': round(percentile(latencies, 99) * 1e6, 2),
+    }
+
+
+def middleware_runs(concurrency, requests):
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from django.urls import resolve
+    from myBookList.middleware import MetricsMiddleware, QueryLog
+
+    request = RequestFactory().get('/api/books/')
+    request.resolver_match = resolve('/api/books/')
+    request.query_log = QueryLog()
+    response = HttpResponse()
+
+    def view(request):
+        return response
+
+    middleware = MetricsMiddleware(view)
+    results = []
+    for name, call in (('without', lambda: view(request)), ('with', lambda: middleware(request))):
+        results.append({'case': 'middleware', 'metrics': name, 'concurrency': concurrency, **summary(*run_threads(call, concurrency, requests))})
+    return results
+
+
+def books_list_runs(user, concurrency, requests):
+    from django.conf import settings
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    without = [name for name in settings.MIDDLEWARE if name != 'myBookList.middleware.MetricsMiddleware']
+    results = []
+    for name, middleware in (('without', without), ('with', settings.MIDDLEWARE)):
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=['testserver']):
+            local = threading.local()
+
+            def call():
+                if not hasattr(local, 'client'):
+                    local.client = APIClient()
+                    local.client.force_authenticate(user)
+                assert local.client.get('/api/books/').status_code == 200
+
+            runs = summary(*run_threads(call, concurrency, requests))
+        results.append({'case': 'books-list', 'metrics': name, 'concurrency': concurrency, **runs})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--http-requests', type=int, default=2000)
+    parser.add_argument('--books', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.views import APIView
+
+    results = []
+    with benchmark_database(), mock.patch.object(APIView, 'check_throttles'):
+        user = User.objects.create_user(username='benchmark', password='benchmark')
+        seed_books(args.books, user)
+        for concurrency in args.concurrency:
+            results += middleware_runs(concurrency, args.requests)
+            results += books_list_runs(user, concurrency, args.http_requests)
+    report({'benchmark': 'metrics', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Building and serving the recommendations of book.recommendations.
+
+    python -m benchmarks.recommendations --users 10000 --books 10000 --favourites 200000
+
+Reports how long build_recommendations takes for every book and then with
+--changed after --changes favourite changes, and the p50/p99 latency of
+the per book and per user lookups. "max_rss_mb" is the peak memory of this
+process, which does not grow with the data: the pairs are counted by
+PostgreSQL, a --batch-size chunk of books at a time.
+"""
+import argparse
+import io
+import random
+import resource
+import time
+
+from .utils import benchmark_database, percentile, report, seed_books, seed_favourites, seed_users, setup_django
+
+
+def timed_build(*args):
+    from django.core.management import call_command
+
+    started = time.perf_counter()
+    call_command('build_recommendations', *args, stdout=io.StringIO())
+    return round(time.perf_counter() - started, 2)
+
+
+def lookups(function, arguments):
+    latencies = []
+    for argument in arguments:
+        started = time.perf_counter()
+        list(function(argument))
+        latencies.append(time.perf_counter() - started)
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--favourites', type=int, default=200000)
+    parser.add_argument('--changes', type=int, default=100)
+    parser.add_argument('--lookups', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    from book.favourites import update_favourites
+    from book.models import Book, BookNeighbour
+    from book.recommendations import recommended_books, similar_books
+
+    rng = random.Random(args.seed)
+    with benchmark_database():
+        users = seed_users(args.users, 'benchmark-password')
+        seed_books(args.books, users[0])
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        seed_favourites(args.favourites, users, book_ids, seed=args.seed)
+
+        full_s = timed_build('--batch-size', str(args.batch_size))
+        rows = BookNeighbour.objects.count()
+        changed_users = [rng.choice(users) for _ in range(args.changes)]
+        for user in changed_users:
+            update_favourites(user, add=[rng.choice(book_ids)])
+        incremental_s = timed_build('--changed', '--batch-size', str(args.batch_size))
+
+        anonymous = users[0].__class__()
+        book_lookups = lookups(
+            lambda book_id: similar_books(anonymous, book_id, 10),
+            [rng.choice(book_ids) for _ in range(args.lookups)],
+        )
+        user_lookups = lookups(
+            lambda user: recommended_books(user, 10),
+            [rng.choice(users) for _ in range(args.lookups)],
+        )
+
+    report({
+        'benchmark': 'recommendations',
+        'users': args.users,
+        'books': args.books,
+        'favourites': args.favourites,
+        'neighbour_rows': rows,
+        'full_build_s': full_s,
+        'incremental_build_s': incremental_s,
+        'changes': args.changes,
+        'book_lookup': book_lookups,
+        'user_lookup': user_lookups,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Serializing and rendering book lists: BookSerializer and JSONRenderer (the
+old path) against BookValuesSerializer and FastJSONRenderer.
+
+    python -m benchmarks.serializers --books 10000 --repeat 5
+
+The rows are fetched once per run, the times are for building the
+representations and for rendering them, best of --repeat. The two paths
+must produce the same bytes.
+"""
+import argparse
+import time
+
+from .utils import benchmark_database, report, seed_books, setup_django
+
+
+def best(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+    from book.models import Book
+    from book.serializers import BookSerializer, BookValuesSerializer
+    from myBookList import renderers
+
+    with benchmark_database():
+        user = User.objects.create_user(username='benchmark')
+        seed_books(args.books, user)
+        queryset = Book.objects.with_favourite_state(user)
+        fetch_models, books = best(lambda: list(queryset.all()), args.repeat)
+        fetch_values, rows = best(lambda: list(queryset.values(*BookValuesSerializer.values_fields)), args.repeat)
+
+    serialize_models, data = best(lambda: BookSerializer(books, many=True).data, args.repeat)
+    serialize_values, values_data = best(lambda: BookValuesSerializer(rows, many=True).data, args.repeat)
+    render_json, content = best(lambda: JSONRenderer().render(data), args.repeat)
+    render_fast, fast_content = best(lambda: renderers.FastJSONRenderer().render(values_data), args.repeat)
+    if fast_content != content:
+        raise AssertionError("The fast path renders different bytes.")
+
+    def path(fetch, serialize, render):
+        return {
+            'fetch_ms': round(fetch * 1000, 1),
+            'serialize_ms': round(serialize * 1000, 1),
+            'render_ms': round(render * 1000, 1),
+            'total_ms': round((fetch + serialize + render) * 1000, 1),
+            'books_per_sec': round(args.books / (serialize + render)),
+        }
+
+    report({
+        'benchmark': 'serializers',
+        'books': args.books,
+        'orjson': renderers.orjson is not None,
+        'bytes': len(content),
+        'results': {
+            'model_serializer': path(fetch_models, serialize_models, render_json),
+            'values_fast_path': path(fetch_values, serialize_values, render_fast),
+        },
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+"""
+Settings for the servers started by the HTTP benchmarks.
+"""
+from myBookList.settings import *  # noqa: F401,F403
+from myBookList.settings import CACHES, REST_FRAMEWORK
+
+# Throttling would reject most requests and cached responses would skip the
+# views, neither is what the benchmarks measure.
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'DEFAULT_THROTTLE_CLASSES': []}
+CACHES = {**CACHES, 'books': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# DEBUG records every query, which costs as much as some of the views.
+DEBUG = False
+ALLOWED_HOSTS = ['localhost', '127.0.0.1']
@@ -0,0 +1,349 @@
+"""
+Throughput and p50/p95/p99 latency of the book and auth endpoints, under
+single-endpoint and mixed workloads, in-process and over HTTP.
+
+    python -m benchmarks.suite --users 100 --books 10000 --favourites 5000 --output baseline.json
+    python -m benchmarks.suite --transport inprocess http --baseline baseline.json
+
+The benchmark database is seeded with --users users, --books books and
+--favourites favourites, then every workload of --workload runs for
+--duration seconds on --concurrency threads, each one acting as one of the
+users with its own tokens. "inprocess" goes through Django's test client,
+"http" through a WSGI server started like in benchmarks.async_views
+(gunicorn by default). benchmarks.settings turns throttling and the response
+cache off.
+
+With --baseline, the run is compared with an earlier report: operations
+whose throughput dropped, or whose p99 grew, by more than --tolerance are
+listed under "regressions" and the exit status is 1.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from .async_views import WSGI_COMMAND, Server
+from .utils import benchmark_database, percentile, report, seed_books, seed_favourites, seed_users, setup_django
+
+
+PASSWORD = 'benchmark-password'
+
+
+class State:
+    """
+    What one thread knows about its user.
+    """
+
+    def __init__(self, user, access, refresh, favourites, book_ids, seed):
+        self.username = user.username
+        self.access = access
+        self.refresh = refresh
+        self.favourites = favourites
+        self.book_ids = book_ids
+        self.random = random.Random(seed)
+        self.created = 0
+
+
+def list_books(client, state):
+    return client.request('GET', 'books/', token=state.access)[0]
+
+
+def book_detail(client, state):
+    return client.request('GET', f'books/{state.random.choice(state.book_ids)}/', token=state.access)[0]
+
+
+def create_book(client, state):
+    state.created += 1
+    book = {
+        'title': f'{state.username} book {state.created}', 'author': state.username,
+        'publicationYear': 2000, 'isbn': '978-0-261-10221-7',
+    }
+    return client.request('POST', 'books/', book, token=state.access)[0]
+
+
+def toggle_favourite(client, state):
+    book_id = state.random.choice(state.book_ids)
+    if book_id in state.favourites:
+        state.favourites.discard(book_id)
+        return client.request('DELETE', f'favourites/{book_id}/', token=state.access)[0]
+    state.favourites.add(book_id)
+    return client.request('POST', f'favourites/{book_id}/', token=state.access)[0]
+
+
+def login(client, state):
+    status, content = client.request('POST', 'auth/login/', {'username': state.username, 'password': PASSWORD})
+    if status == 200:
+        tokens = json.loads(content)
+        state.access, state.refresh = tokens['access'], tokens['refresh']
+    return status
+
+
+def refresh(client, state):
+    status, content = client.request('POST', 'auth/refresh/', {'refresh': state.refresh})
+    if status == 200:
+        tokens = json.loads(content)
+        # The refresh tokens rotate, the old one is blacklisted.
+        state.access, state.refresh = tokens['access'], tokens.get('refresh', state.refresh)
+    return status
+
+
+OPERATIONS = {
+    'list': list_books,
+    'detail': book_detail,
+    'create': create_book,
+    'favourite': toggle_favourite,
+    'login': login,
+    'refresh': refresh,
+}
+
+# Operation weights. Each endpoint alone, then a mix that is mostly browsing.
+WORKLOADS = {
+    **{name: {name: 1} for name in OPERATIONS},
+    'mixed': {'list': 30, 'detail': 45, 'favourite': 15, 'create': 5, 'refresh': 4, 'login': 1},
+}
+
+
+class InProcessClient:
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(SERVER_NAME='localhost')
+
+    def request(self, method, path, body=None, token=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        data = json.dumps(body) if body is not None else ''
+        response = self.client.generic(method, f'/api/{path}', data, content_type='application/json', **extra)
+        return response.status_code, response.content
+
+    def close(self):
+        from django.db import connection
+
+        connection.close()
+
+
+class HTTPClient:
+    """
+    One keep-alive connection, reopened when the server closes it.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connection = None
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body) if body is not None else None
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, f'/api/{path}', data, headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_workload(make_client, states, weights, duration):
+    names = list(weights)
+    cumulative = []
+    for name in names:
+        cumulative.append((cumulative[-1] if cumulative else 0) + weights[name])
+    latencies = defaultdict(list)
+    errors = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+
+    def worker(state):
+        client = make_client()
+        samples = defaultdict(list)
+        failures = defaultdict(lambda: defaultdict(int))
+        try:
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                name = state.random.choices(names, cum_weights=cumulative)[0]
+                started = time.perf_counter()
+                try:
+                    status = OPERATIONS[name](client, state)
+                except (OSError, http.client.HTTPException):
+                    failures[name]['connection'] += 1
+                    continue
+                samples[name].append(time.perf_counter() - started)
+                if status >= 400:
+                    failures[name][str(status)] += 1
+        finally:
+            client.close()
+        with lock:
+            for name, values in samples.items():
+                latencies[name] += values
+            for name, counts in failures.items():
+                for status, count in counts.items():
+                    errors[name][status] += count
+
+    threads = [threading.Thread(target=worker, args=(state,)) for state in states]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, errors
+
+
+def summary(samples, elapsed):
+    return {
+        'requests': len(samples),
+        'requests_per_sec': round(len(samples) / elapsed, 1),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2) if samples else None,
+        'p95_ms': round(percentile(samples, 95) * 1000, 2) if samples else None,
+        'p99_ms': round(percentile(samples, 99) * 1000, 2) if samples else None,
+    }
+
+
+def workload_result(transport, workload, elapsed, latencies, errors):
+    every = [latency for samples in latencies.values() for latency in samples]
+    return {
+        'transport': transport,
+        'workload': workload,
+        **summary(every, elapsed),
+        'errors': sum(sum(counts.values()) for counts in errors.values()),
+        'operations': {
+            name: {**summary(samples, elapsed), 'errors': dict(errors.get(name, {}))}
+            for name, samples in sorted(latencies.items())
+        },
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Operations slower than in ``baseline`` by more than ``tolerance`` (0.1 is
+    10%), in throughput or p99.
+    """
+    previous = {(result['transport'], result['workload']): result for result in baseline['results']}
+    found = []
+    for result in results:
+        before = previous.get((result['transport'], result['workload']))
+        if before is None:
+            continue
+        for name, current in result['operations'].items():
+            old = before['operations'].get(name)
+            if not old or not old['requests'] or not current['requests']:
+                continue
+            checks = [
+                ('requests_per_sec', current['requests_per_sec'] < old['requests_per_sec'] * (1 - tolerance)),
+                ('p99_ms', current['p99_ms'] > old['p99_ms'] * (1 + tolerance)),
+            ]
+            for metric, regressed in checks:
+                if regressed:
+                    found.append({
+                        'transport': result['transport'],
+                        'workload': result['workload'],
+                        'operation': name,
+                        'metric': metric,
+                        'baseline': old[metric],
+                        'current': current[metric],
+                        'change': round(current[metric] / old[metric] - 1, 3),
+                    })
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--favourites', type=int, default=5000)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workload', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--transport', nargs='+', choices=['inprocess', 'http'], default=['inprocess'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Also write the report to this file.")
+    parser.add_argument('--baseline', help="Report of an earlier run to compare with.")
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--wsgi-command', default=WSGI_COMMAND)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    setup_django()
+    from django.db import connection
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from book.models import Book
+
+    results = []
+    with benchmark_database():
+        users = seed_users(args.users, PASSWORD)
+        seed_books(args.books, users[0])
+        book_ids = list(Book.objects.values_list('pk', flat=True))
+        seed_favourites(args.favourites, users, book_ids, seed=args.seed)
+        favourites = defaultdict(set)
+        for user_id, book_id in Book.favourites.through.objects.values_list('user_id', 'book_id'):
+            favourites[user_id].add(book_id)
+
+        def make_states():
+            states = []
+            for number in range(args.concurrency):
+                user = users[number % len(users)]
+                token = RefreshToken.for_user(user)
+                states.append(State(
+                    user, str(token.access_token), str(token), set(favourites[user.pk]),
+                    book_ids, seed=args.seed + number,
+                ))
+            return states
+
+        for transport in args.transport:
+            server = None
+            if transport == 'http':
+                # The server connects to the benchmark database too.
+                env = {**os.environ, 'PG_DB_NAME': connection.settings_dict['NAME']}
+                command = args.wsgi_command.format(host=args.host, port=args.port, workers=args.workers)
+                server = Server(command, args.host, args.port, env)
+                server.wait_until_ready()
+                make_client = lambda: HTTPClient(args.host, args.port)  # noqa: E731
+            else:
+                make_client = InProcessClient
+            try:
+                for workload in args.workload:
+                    elapsed, latencies, errors = run_workload(make_client, make_states(), WORKLOADS[workload], args.duration)
+                    results.append(workload_result(transport, workload, elapsed, latencies, errors))
+            finally:
+                if server is not None:
+                    server.stop()
+
+    output = {
+        'benchmark': 'suite',
+        'users': args.users,
+        'books': args.books,
+        'favourites': args.favourites,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'results': results,
+    }
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            output['regressions'] = regressions(results, json.load(baseline), args.tolerance)
+    report(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2)
+    if output.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myBookList.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Creates the test database (test_<PG_DB_NAME>) for the duration of the
+    benchmark, so benchmarks never touch real data.
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def seed_books(count, creator, batch_size=5000):
+    from book.models import Book
+
+    existing = Book.objects.count()
+    for start in range(existing, count, batch_size):
+        Book.objects.bulk_create([
+            Book(
+                title=f'Book {i}', author=f'Author {i % 1000}', creator=creator,
+                publicationYear=1900 + i % 125, isbn='978-0-261-10221-7',
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+
+
+def seed_users(count, password, prefix='benchmark'):
+    """
+    Creates ``count`` users sharing one password hash, hashing for each of
+    them would take longer than most benchmarks.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+
+    encoded = make_password(password)
+    User.objects.bulk_create([User(username=f'{prefix}{i}', password=encoded) for i in range(count)])
+    return list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+
+
+def seed_favourites(count, users, book_ids, seed=0):
+    """
+    Adds ``count`` random (user, book) favourites and sets the
+    favourite_count of the books to match.
+    """
+    import io
+    import random
+    from django.core.management import call_command
+    from book.models import Book
+
+    rng = random.Random(seed)
+    count = min(count, len(users) * len(book_ids))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.choice(users).pk, rng.choice(book_ids)))
+    Favourite = Book.favourites.through
+    Favourite.objects.bulk_create(
+        [Favourite(user_id=user_id, book_id=book_id) for user_id, book_id in pairs],
+        batch_size=5000, ignore_conflicts=True,
+    )
+    # Its summary would end up in the JSON report.
+    call_command('reconcile_favourite_counts', stdout=io.StringIO())
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(results):
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
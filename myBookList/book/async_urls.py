@@ -0,0 +1,10 @@
+from django.urls import path
+from .async_views import AsyncBookListView, AsyncBookDetailView, AsyncUserFavouriteBooksView, AsyncFavouriteBook
+
+# Async versions of the book endpoints, served under api/async/.
+urlpatterns = [
+    path('books/', AsyncBookListView.as_view(), name="async-get-books-list"),
+    path('books/<int:pk>/', AsyncBookDetailView.as_view(), name="async-get-update-delete-book"),
+    path('favourites/', AsyncUserFavouriteBooksView.as_view(), name="async-get-favourite-books"),
+    path('favourites/<int:book_id>/', AsyncFavouriteBook.as_view(), name="async-favourite-book"),
+]
@@ -0,0 +1,370 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from auth.authentication import AsyncJWTAuthentication
+from myBookList.db.replicas import replica_for, stop_using_replica, use_replica
+from myBookList.renderers import FastJSONRenderer
+
+from . import events
+from .cache import AsyncCachedResponseMixin
+from .conditional import ETAG_FIELDS, book_etag, etag_matches, list_etag, not_modified
+from .favourites import add_favourite, remove_favourite
+from .filters import BookFilterBackend
+from .models import Book
+from .pagination import AsyncBookCursorPagination, AsyncPageNumberPagination
+from .serializers import BookSerializer, BookValuesSerializer, requested_fields
+from .views import BookListCreateView, BookRetrieveUpdateDestroyView, FavouriteBook
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the async views, the async counterpart of the parts of
+    APIView the book views use: JWT authentication, permissions, throttling
+    and DRF style error responses. Responses are always JSON.
+
+    The methods in ``sync_methods`` are handed over unchanged to
+    ``sync_view``, the DRF view of the same endpoint. With ``replica_reads``
+    safe requests read from a replica, like with ReplicaReadMixin.
+    """
+    # The configured authentication when it supports async views.
+    authentication = next(
+        (auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES if hasattr(auth, 'aauthenticate')),
+        AsyncJWTAuthentication(),
+    )
+    permission_classes = [AllowAny]
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    renderer = FastJSONRenderer()
+    sync_view = None
+    sync_methods = ()
+    replica_reads = False
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Like APIView, authentication is token based so CSRF does not apply.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() in self.sync_methods:
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        request.accepted_renderer = self.renderer
+        request.accepted_media_type = self.renderer.media_type
+        self.replica_token = None
+        try:
+            await self.initial(request)
+            handler = getattr(self, request.method.lower(), None)
+            if request.method.lower() not in self.http_method_names or handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(request, exc)
+        finally:
+            if self.replica_token is not None:
+                stop_using_replica(self.replica_token)
+        return self.finalize_response(request, response)
+
+    async def initial(self, request):
+        user_auth_tuple = await self.authentication.aauthenticate(request)
+        if user_auth_tuple is None:
+            user_auth_tuple = (api_settings.UNAUTHENTICATED_USER(), None)
+        request.user, request.auth = user_auth_tuple
+        self.check_permissions(request)
+        await self.check_throttles(request)
+        if self.replica_reads and request.method in SAFE_METHODS:
+            # The async ORM runs the queries in a copy of this context.
+            alias = await sync_to_async(replica_for, thread_sensitive=False)(request.user)
+            if alias is not None:
+                self.replica_token = use_replica(alias)
+
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(detail=getattr(permission, 'message', None))
+
+    async def check_throttles(self, request):
+        throttles = [throttle() for throttle in self.throttle_classes]
+        if not throttles:
+            return
+
+        # The throttles are synchronous cache calls, kept off the event loop.
+        def throttle_durations():
+            return [throttle.wait() for throttle in throttles if not throttle.allow_request(request, self)]
+
+        durations = await sync_to_async(throttle_durations, thread_sensitive=False)()
+        if durations:
+            raise exceptions.Throttled(max((wait for wait in durations if wait is not None), default=None))
+
+    def handle_exception(self, request, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication.authenticate_header(request)
+        response = exception_handler(exc, {'view': self, 'request': request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, request, response):
+        # Rendered here instead of returning the DRF Response, which Django
+        # would render in a worker thread.
+        content = self.renderer.render(response.data, self.renderer.media_type, {'request': request, 'view': self})
+        rendered = HttpResponse(content, status=response.status_code, content_type=self.renderer.media_type)
+        for name, value in response.items():
+            if name.lower() != 'content-type':
+                rendered[name] = value
+        patch_vary_headers(rendered, ['Accept'])
+        return rendered
+
+
+class AsyncBookListMixin:
+    """
+    Paginated, ETagged book list, see ConditionalListMixin for the ETags.
+    """
+
+    def get_queryset(self, request):
+        raise NotImplementedError
+
+    def get_paginator(self, request):
+        return AsyncPageNumberPagination()
+
+    async def get(self, request, *args, **kwargs):
+        fields = requested_fields(request)
+        queryset = self.get_queryset(request)
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            paginator = self.get_paginator(request)
+            rows = await paginator.apaginate_queryset(queryset.values(*ETAG_FIELDS), request, view=self)
+            etag = list_etag(request, paginator, rows)
+            if etag_matches(if_none_match, etag, weak=True):
+                return not_modified(etag)
+
+        paginator = self.get_paginator(request)
+        values_fields = BookValuesSerializer.values_fields_for(fields)
+        books = await paginator.apaginate_queryset(queryset.values(*values_fields), request, view=self)
+        serializer = BookValuesSerializer(books, many=True, fields=fields)
+        response = paginator.get_paginated_response(serializer.data)
+        response['ETag'] = list_etag(request, paginator, books)
+        return response
+
+
+class AsyncBookListView(AsyncCachedResponseMixin, AsyncBookListMixin, AsyncAPIView):
+    """
+    Async BookListCreateView, books are still created by the sync view.
+    """
+    sync_view = staticmethod(BookListCreateView.as_view())
+    sync_methods = ('post', 'options')
+    replica_reads = True
+
+    def get_queryset(self, request):
+        queryset = Book.objects.with_favourite_state(request.user)
+        return BookFilterBackend().filter_queryset(request, queryset, self)
+
+    def get_paginator(self, request):
+        params = request.query_params
+        if params.get('pagination') == 'cursor' or 'cursor' in params:
+            return AsyncBookCursorPagination()
+        return AsyncPageNumberPagination()
+
+
+class AsyncBookDetailMixin:
+    """
+    ETagged book, see ConditionalObjectMixin for the ETags.
+    """
+
+    async def get(self, request, pk):
+        fields = requested_fields(request)
+        queryset = Book.objects.with_favourite_state(request.user).filter(pk=pk)
+        if fields is not None:
+            queryset = queryset.only(*BookSerializer.only_fields(fields))
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            row = await queryset.values(*ETAG_FIELDS).afirst()
+            if row is not None:
+                etag = book_etag(request, row)
+                if etag_matches(if_none_match, etag, weak=True):
+                    return not_modified(etag)
+
+        try:
+            book = await queryset.aget()
+        except Book.DoesNotExist:
+            raise Http404(f"No {Book._meta.object_name} matches the given query.")
+        serializer = BookSerializer(book, fields=fields, context={'request': request, 'view': self})
+        return Response(serializer.data, headers={'ETag': book_etag(request, book)})
+
+
+class AsyncBookDetailView(AsyncCachedResponseMixin, AsyncBookDetailMixin, AsyncAPIView):
+    """
+    Async BookRetrieveUpdateDestroyView, updates and deletes are still
+    handled by the sync view, which locks the row for If-Match.
+    """
+    sync_view = staticmethod(BookRetrieveUpdateDestroyView.as_view())
+    sync_methods = ('put', 'patch', 'delete', 'options')
+    replica_reads = True
+
+
+class AsyncUserFavouriteBooksView(AsyncBookListMixin, AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    replica_reads = True
+
+    def get_queryset(self, request):
+        return Book.objects.favourited_by(request.user)
+
+
+class AsyncFavouriteBook(AsyncAPIView):
+    """
+    Async FavouriteBook. The change itself runs in a thread, since the async
+    ORM cannot run transactions.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_scope = FavouriteBook.throttle_scope
+
+    async def post(self, request, book_id):
+        return await self.change(add_favourite, request.user, book_id)
+
+    async def delete(self, request, book_id):
+        return await self.change(remove_favourite, request.user, book_id)
+
+    async def change(self, update, user, book_id):
+        try:
+            await sync_to_async(update)(user, book_id)
+            return Response({"sueccess": True}, status=status.HTTP_200_OK)
+        except Book.DoesNotExist:
+            return Response({"sueccess": False, "error": "The book Requested does not exist"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ServiceUnavailable(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many clients are connected, try again later."
+    default_code = 'service_unavailable'
+
+
+class BookEventsView(AsyncAPIView):
+    """
+    Server-sent events of the book changes, and of the favourites of the
+    authenticated user, see book.events. EventSource cannot send headers,
+    the access token can be given as ?access_token= instead.
+    """
+    http_method_names = ['get']
+
+    async def initial(self, request):
+        token = request.query_params.get('access_token')
+        if token and 'HTTP_AUTHORIZATION' not in request.META:
+            request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        await super().initial(request)
+
+    async def get(self, request):
+        # Here rather than in the stream, which starts after the response
+        # headers are sent.
+        try:
+            subscription = events.hub.subscribe(request.user.pk)
+        except events.TooManySubscribers:
+            raise ServiceUnavailable()
+        # The authentication took a connection in the sync thread of the
+        # request, which the stream would hold for as long as the client stays.
+        await sync_to_async(release_connection)()
+        response = StreamingHttpResponse(events.event_stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Proxies like nginx would hold the events back in their buffers.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def finalize_response(self, request, response):
+        if response.streaming:
+            return response
+        return super().finalize_response(request, response)
+
+
+def release_connection():
+    """
+    Closes the database connection of the thread, or hands it back to the
+    pool. Not in a transaction, which only the tests run requests in.
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def websocket_user(authorization):
+    """
+    The user of an Authorization header value, AnonymousUser without one.
+    Runs outside of a request, so closes the connection it used.
+    """
+    authentication = AsyncAPIView.authentication
+    try:
+        raw_token = authentication.get_raw_token(authorization) if authorization else None
+        if raw_token is None:
+            return AnonymousUser()
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    finally:
+        connection.close()
+
+
+async def events_websocket(scope, receive, send):
+    """
+    ASGI application of the book events over WebSocket, at the path of
+    BookEventsView, routed by myBookList.asgi. Each event is a text message,
+    ``{"type": "book.updated", "ids": [1]}``, and a client that falls behind
+    gets ``{"type": "overflow"}`` before being disconnected. Messages from
+    the client are ignored.
+    """
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if scope['path'] != reverse('book-events'):
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    authorization = dict(scope['headers']).get(b'authorization')
+    if authorization is None:
+        token = parse_qs(scope['query_string'].decode('latin-1')).get('access_token')
+        if token:
+            authorization = f'Bearer {token[0]}'.encode('latin-1')
+    try:
+        user = await sync_to_async(websocket_user, thread_sensitive=False)(authorization)
+    except exceptions.AuthenticationFailed:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    try:
+        subscription = events.hub.subscribe(user.pk)
+    except events.TooManySubscribers:
+        # Try again later.
+        await send({'type': 'websocket.close', 'code': 1013})
+        return
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+        subscription.close()
+
+    disconnected = asyncio.create_task(wait_for_disconnect())
+    try:
+        await send({'type': 'websocket.accept'})
+        while not subscription.closed:
+            batch = await subscription.get()
+            if subscription.overflowed:
+                await send({'type': 'websocket.send', 'text': json.dumps({'type': 'overflow'})})
+                await send({'type': 'websocket.close', 'code': 1013})
+                return
+            for event in batch:
+                await send({'type': 'websocket.send', 'text': event.json})
+    finally:
+        disconnected.cancel()
+        events.hub.unsubscribe(subscription)
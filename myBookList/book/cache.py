@@ -0,0 +1,184 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+from django.utils.http import urlencode
+from rest_framework.response import Response
+
+from myBookList.db import replicas
+from myBookList.metrics import registry
+
+from .conditional import etag_matches, not_modified
+
+
+# Cached responses are keyed with the versions of what they show: a list
+# with the catalog version, a book with its own version, and both with the
+# version of the user when authenticated, for is_favourited. Writing a book
+# bumps the catalog and the book, a favourite change the catalog (the lists
+# show favourite_count), the user and the books.
+CATALOG_VERSION_KEY = 'books:version:catalog'
+
+
+def book_version_key(pk):
+    return f'books:version:book:{pk}'
+
+
+def user_version_key(pk):
+    return f'books:version:user:{pk}'
+
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cache():
+    return caches[settings.BOOK_CACHE_ALIAS]
+
+
+def version_keys(request, book_pk=None):
+    keys = [CATALOG_VERSION_KEY if book_pk is None else book_version_key(book_pk)]
+    if request.user.is_authenticated:
+        keys.append(user_version_key(request.user.pk))
+    return keys
+
+
+def current_versions(cache, keys):
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        # Start from the clock, so if a version key gets evicted the new
+        # version is still newer than every response stored before.
+        for key in keys:
+            if key not in versions:
+                cache.add(key, time.time_ns(), timeout=None)
+        versions = cache.get_many(keys)
+    return [versions.get(key) for key in keys]
+
+
+async def acurrent_versions(cache, keys):
+    versions = await cache.aget_many(keys)
+    if len(versions) < len(keys):
+        for key in keys:
+            if key not in versions:
+                await cache.aadd(key, time.time_ns(), timeout=None)
+        versions = await cache.aget_many(keys)
+    return [versions.get(key) for key in keys]
+
+
+def bump_versions(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate(catalog=False, books=(), users=()):
+    """
+    Makes the cached book responses showing the catalog, the ``books`` or
+    the favourites of the ``users`` stale.
+
+    The versions are bumped right away and again once the transaction
+    commits: a response cached in between may hold the data from before the
+    commit, and the second bump discards it.
+    """
+    keys = [CATALOG_VERSION_KEY] if catalog else []
+    keys += [book_version_key(pk) for pk in books]
+    keys += [user_version_key(pk) for pk in users]
+    if keys:
+        bump_versions(keys)
+        transaction.on_commit(lambda: bump_versions(keys))
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(name):
+    with _stats_lock:
+        _stats[name] += 1
+    registry.inc('cache_requests_total', (('cache', 'books'), ('result', 'hit' if name == 'hits' else 'miss')))
+
+
+def response_key(request, versions):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # With the scheme and host, the pagination links are absolute.
+    url = request.build_absolute_uri(request.path)
+    return f'books:{":".join(map(str, versions))}:{user}:{url}?{query}'
+
+
+def store_timeout():
+    if replicas.replica_in_use():
+        # A replica may not have the latest changes yet, what it returned
+        # must not outlive the lag under the current versions.
+        return settings.DATABASE_REPLICA_LAG
+    return DEFAULT_TIMEOUT
+
+
+def cached_response(request, cached):
+    data, etag = cached
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if etag and if_none_match and etag_matches(if_none_match, etag, weak=True):
+        return not_modified(etag)
+    headers = {'X-Cache': 'HIT'}
+    if etag:
+        headers['ETag'] = etag
+    return Response(data, headers=headers)
+
+
+class CachedResponseMixin:
+    """
+    Read-through cache for GET responses, keyed by the URL, the query
+    parameters (filters, page or cursor) and the user, since responses carry
+    the per user is_favourited flag. Views with a ``pk`` URL argument show
+    that book, the others the catalog, see version_keys().
+
+    Authentication, permissions and throttling still run on cache hits, only
+    the queries and the serialization are skipped. The ETag is stored with
+    the response, so If-None-Match is answered from the cache as well.
+    """
+
+    def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        # The versions are read before the database, so a response built from
+        # data that changes meanwhile is stored under an already stale key.
+        book_pk = kwargs.get('pk')
+        key = response_key(request, current_versions(cache, version_keys(request, book_pk)))
+        cached = cache.get(key)
+        if cached is not None:
+            _record('hits')
+            return cached_response(request, cached)
+
+        _record('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.data, response.get('ETag')), timeout=store_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class AsyncCachedResponseMixin:
+    """
+    CachedResponseMixin for the async views.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        book_pk = kwargs.get('pk')
+        key = response_key(request, await acurrent_versions(cache, version_keys(request, book_pk)))
+        cached = await cache.aget(key)
+        if cached is not None:
+            _record('hits')
+            return cached_response(request, cached)
+
+        _record('misses')
+        response = await super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, (response.data, response.get('ETag')), timeout=store_timeout())
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,105 @@
+"""
+Changes feed: the books created, updated or deleted since a token.
+
+Every change stores the id of its transaction (Book.change_xid and
+BookTombstone.change_xid), and the feed is ordered by (transaction id, book
+id). Transaction ids are handed out when a transaction starts writing, not
+when it commits, so the feed stops before the oldest transaction still
+running: everything before it has committed (or rolled back) and nothing can
+be added there anymore, so a token never skips a change. A long running
+transaction anywhere on the server holds the feed back until it ends.
+
+Books are returned as they are when the feed is read, once however many
+times they changed.
+"""
+import base64
+import binascii
+from heapq import merge
+
+from django.db import connections, router
+from django.db.models import Q
+from rest_framework import serializers
+
+from .models import Book, BookTombstone
+from .serializers import BookValuesSerializer
+
+
+class InvalidToken(serializers.ValidationError):
+    default_detail = "Invalid token."
+
+
+def encode_token(position):
+    return base64.urlsafe_b64encode(f'{position[0]}:{position[1]}'.encode()).decode()
+
+
+def decode_token(token):
+    """
+    The (transaction id, book id) of the last change returned, (0, 0) to
+    start from the beginning.
+    """
+    if not token:
+        return (0, 0)
+    try:
+        xid, book_id = base64.urlsafe_b64decode(token.encode()).decode().split(':')
+        return (int(xid), int(book_id))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidToken({'since': InvalidToken.default_detail})
+
+
+def committed_before(model):
+    """
+    Transactions under this id have all ended, for the database the changes
+    are read from.
+    """
+    with connections[router.db_for_read(model)].cursor() as cursor:
+        cursor.execute('SELECT txid_snapshot_xmin(txid_current_snapshot())')
+        return cursor.fetchone()[0]
+
+
+def after(position, id_field):
+    xid, book_id = position
+    return Q(change_xid__gt=xid) | Q(change_xid=xid, **{f'{id_field}__gt': book_id})
+
+
+def changes_since(user, position, limit, fields=None):
+    """
+    Up to ``limit`` changes after ``position``, the position of the last one
+    and whether there are more.
+    """
+    xmin = committed_before(Book)
+    values_fields = BookValuesSerializer.values_fields_for(fields)
+    books = (
+        Book.objects.with_favourite_state(user)
+        .filter(after(position, 'id'), change_xid__lt=xmin)
+        .order_by('change_xid', 'id')
+        .values(*values_fields, 'change_xid', 'updated_at')[:limit + 1]
+    )
+    tombstones = (
+        BookTombstone.objects.filter(after(position, 'book_id'), change_xid__lt=xmin)
+        .order_by('change_xid', 'book_id')
+        .values('book_id', 'change_xid', 'deleted_at')[:limit + 1]
+    )
+    rows = list(merge(
+        ((row['change_xid'], row['id'], row) for row in books),
+        ((row['change_xid'], row['book_id'], row) for row in tombstones),
+        key=lambda item: item[:2],
+    ))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    serializer = BookValuesSerializer(fields=fields)
+    changed_at = serializers.DateTimeField()
+    changes = []
+    for xid, book_id, row in rows:
+        if 'deleted_at' in row:
+            changes.append({'type': 'delete', 'id': book_id, 'changed_at': changed_at.to_representation(row['deleted_at'])})
+        else:
+            serializer.instance = row
+            changes.append({
+                'type': 'upsert', 'id': book_id,
+                'changed_at': changed_at.to_representation(row['updated_at']),
+                'book': serializer.data,
+            })
+    if rows:
+        position = rows[-1][:2]
+    return changes, position, has_more
@@ -0,0 +1,149 @@
+import hashlib
+
+from django.db.models import Model
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+# Everything in a book representation that can change: the row version, which
+# Book.save() and update_changed() increment on every write of the row (plain
+# update() calls do not and must not change the representation), and the
+# per user is_favourited.
+ETAG_FIELDS = ('id', 'version', 'favourite_count', 'is_favourited')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The book has been modified since it was fetched."
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def etag_matches(header, etag, weak=False):
+    """
+    Whether ``etag`` is listed in an If-Match / If-None-Match header value.
+    If-None-Match uses the weak comparison, If-Match the strong one.
+    """
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    if weak:
+        etags = [tag.removeprefix('W/') for tag in etags]
+    return etag in etags
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def etag_row(book):
+    if isinstance(book, dict):
+        return tuple(book[name] for name in ETAG_FIELDS)
+    return tuple(getattr(book, name, False) for name in ETAG_FIELDS)
+
+
+def list_etag(request, paginator, books):
+    """
+    ETag of a list page, covering the books on the page along with the total
+    count and the page links.
+    """
+    links = count = None
+    if paginator is not None:
+        links = (paginator.get_next_link(), paginator.get_previous_link())
+        page = getattr(paginator, 'page', None)
+        if hasattr(page, 'paginator'):
+            count = page.paginator.count
+    return make_etag(
+        request.get_full_path(), request.accepted_renderer.format,
+        count, links, [etag_row(book) for book in books],
+    )
+
+
+def book_etag(request, book):
+    return make_etag(request.accepted_renderer.format, etag_row(book))
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETags for GET responses, answering If-None-Match with a 304.
+
+    The ETag is computed from ETAG_FIELDS of the books in the response, so
+    checking If-None-Match only fetches those columns, the rows are neither
+    loaded into models nor serialized. Responses that are sent in full get
+    their ETag from the books that were just serialized.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etag = self.get_etag()
+            if etag is not None and etag_matches(if_none_match, etag, weak=True):
+                return not_modified(etag)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = self.etag_for(self.etag_source)
+        return response
+
+    def get_serializer(self, *args, **kwargs):
+        if args:
+            self.etag_source = args[0]
+        return super().get_serializer(*args, **kwargs)
+
+    def get_etag(self):
+        """
+        ETag checked against If-None-Match before the response is built,
+        None to always build it.
+        """
+        return None
+
+    def etag_for(self, source):
+        """
+        ETag of the book, or of the page of books, the response was built from.
+        """
+        if isinstance(source, (dict, Model)):
+            return book_etag(self.request, source)
+        return list_etag(self.request, getattr(self, 'paginator', None), source)
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """
+    Per page ETag of a paginated list, see list_etag().
+    """
+
+    def get_etag(self):
+        queryset = self.filter_queryset(self.get_queryset()).values(*ETAG_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.etag_for(queryset if page is None else page)
+
+
+class ConditionalObjectMixin(ConditionalGetMixin):
+    """
+    ETag of a single book, also checked against If-Match before the book is
+    updated or deleted. Views must lock the row for those methods so the
+    check and the write see the same version.
+    """
+
+    def get_etag(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values(*ETAG_FIELDS).first()
+        return None if row is None else self.etag_for(row)
+
+    def get_object(self):
+        book = super().get_object()
+        if_match = self.request.META.get('HTTP_IF_MATCH')
+        if if_match and self.request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            if not etag_matches(if_match, self.etag_for(book)):
+                raise PreconditionFailed()
+        return book
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.etag_for(self.etag_source)
+        return response
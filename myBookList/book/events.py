@@ -0,0 +1,336 @@
+"""
+Push channel of book changes: the books created, updated and deleted, and
+the favourites of each user, streamed to the clients connected to
+/api/events/ (server-sent events, or WebSocket under ASGI).
+
+Events are published when the transaction that made the change commits and
+go through a broker to the Hub of every process, which hands them to its
+subscribers: catalog events to all of them, favourite events to the
+subscribers of their user only. An event only says what changed,
+``{'type': 'book.updated', 'ids': [1, 2]}``, the clients fetch the books or
+read the changes feed (book.changes) for the rest.
+
+Events are not stored: a client that was disconnected, or dropped for not
+keeping up, resyncs from the changes feed.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import weakref
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+# Ids per event, bulk changes are split. Keeps NOTIFY payloads under their
+# 8000 bytes limit.
+MAX_IDS = 500
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Event:
+    """
+    An event as sent to the subscribers, encoded once for all of them.
+    """
+    __slots__ = ('type', 'ids', 'sse', 'json')
+
+    def __init__(self, event):
+        self.type = event['type']
+        self.ids = event['ids']
+        self.sse = f'event: {self.type}\ndata: {json.dumps({"ids": self.ids})}\n\n'
+        self.json = json.dumps({'type': self.type, 'ids': self.ids})
+
+
+class Subscription:
+    """
+    The events waiting for one client, at most ``max_events``. A client that
+    falls further behind is marked ``overflowed`` and its events dropped:
+    publishing never waits for a client.
+    """
+    __slots__ = ('user_id', 'events', 'max_events', 'waiter', 'overflowed', 'closed')
+
+    def __init__(self, user_id, max_events):
+        self.user_id = user_id
+        self.events = []
+        self.max_events = max_events
+        self.waiter = None
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, event):
+        if self.overflowed or self.closed:
+            return
+        if len(self.events) >= self.max_events:
+            self.overflowed = True
+            self.events = []
+        else:
+            self.events.append(event)
+        self.wake()
+
+    def close(self):
+        self.closed = True
+        self.wake()
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self):
+        """
+        The events queued since the last call, waiting for one. Empty when
+        woken by the heartbeat, or once overflowed or closed.
+        """
+        if not self.events and not self.overflowed and not self.closed:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        if self.overflowed or self.closed:
+            return []
+        events, self.events = self.events, []
+        return events
+
+
+class Hub:
+    """
+    The subscriptions of this process. They live on the event loop of the
+    ASGI server, the one loop of the process; events may be delivered from
+    any thread.
+
+    A single timer wakes every subscription each BOOK_EVENTS_HEARTBEAT
+    seconds so idle streams send a keep-alive, a timeout per subscription
+    would cost a timer handle each and slow every event down.
+    """
+
+    def __init__(self):
+        self.subscriptions = set()
+        self.by_user = defaultdict(set)
+        self.loop = None
+        self.heartbeat = None
+        self._broker = None
+        self._broker_lock = threading.Lock()
+
+    @property
+    def broker(self):
+        with self._broker_lock:
+            if self._broker is None:
+                self._broker = import_string(settings.BOOK_EVENTS_BROKER)(self.deliver)
+            return self._broker
+
+    def full(self):
+        return len(self.subscriptions) >= settings.BOOK_EVENTS_MAX_SUBSCRIBERS
+
+    def subscribe(self, user_id=None):
+        """
+        A new subscription to the catalog events, and to the favourite events
+        of ``user_id``. Must be called on the event loop.
+        """
+        if self.full():
+            raise TooManySubscribers()
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # The timer of the previous loop, e.g. of a test, would never run.
+            if self.heartbeat is not None:
+                self.heartbeat.cancel()
+            self.loop = loop
+            self.heartbeat = None
+        if self.heartbeat is None:
+            self.heartbeat = loop.call_later(settings.BOOK_EVENTS_HEARTBEAT, self.beat)
+        # Processes that only publish never listen.
+        self.broker.start()
+        subscription = Subscription(user_id, settings.BOOK_EVENTS_QUEUE_SIZE)
+        self.subscriptions.add(subscription)
+        if user_id is not None:
+            self.by_user[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        self.subscriptions.discard(subscription)
+        user_subscriptions = self.by_user.get(subscription.user_id)
+        if user_subscriptions is not None:
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                del self.by_user[subscription.user_id]
+        if not self.subscriptions and self.heartbeat is not None:
+            self.heartbeat.cancel()
+            self.heartbeat = None
+
+    def beat(self):
+        for subscription in self.subscriptions:
+            subscription.wake()
+        self.heartbeat = self.loop.call_later(settings.BOOK_EVENTS_HEARTBEAT, self.beat)
+
+    def publish(self, event):
+        self.broker.publish(event)
+
+    def deliver(self, event):
+        """
+        Hands an event from the broker to the subscribers, from any thread.
+        """
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.dispatch(event)
+            return
+        try:
+            loop.call_soon_threadsafe(self.dispatch, event)
+        except RuntimeError:
+            # The loop was closed.
+            pass
+
+    def dispatch(self, event):
+        if 'user' in event:
+            subscriptions = self.by_user.get(event['user'], ())
+        else:
+            subscriptions = self.subscriptions
+        if not subscriptions:
+            return
+        event = Event(event)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+hub = Hub()
+
+
+class LocalBroker:
+    """
+    Delivers the events to the hub of the process that published them,
+    enough with a single worker process.
+    """
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def start(self):
+        pass
+
+    def publish(self, event):
+        self.deliver(event)
+
+
+class PostgresBroker:
+    """
+    Shares the events between processes with PostgreSQL LISTEN/NOTIFY on the
+    default database. Each subscribing process holds one more connection,
+    outside of the pool, listening in a thread; events published while it
+    reconnects are lost.
+    """
+    channel = 'book_events'
+    poll_interval = 5
+    retry_interval = 1
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.thread = None
+        self.lock = threading.Lock()
+        self.listening = threading.Event()
+        self.stopped = threading.Event()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.listen, name='book-events', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def publish(self, event):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(event)])
+
+    def listen(self):
+        database = connections[DEFAULT_DB_ALIAS]
+        while not self.stopped.is_set():
+            try:
+                connection = database.Database.connect(**database.get_connection_params())
+            except database.Database.Error:
+                logger.exception("Could not connect to listen for book events.")
+                self.stopped.wait(self.retry_interval)
+                continue
+            try:
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                self.listening.set()
+                while not self.stopped.is_set():
+                    if select.select([connection], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.deliver(json.loads(connection.notifies.pop(0).payload))
+            except database.Database.Error:
+                logger.exception("Lost the connection listening for book events.")
+                self.stopped.wait(self.retry_interval)
+            finally:
+                self.listening.clear()
+                connection.close()
+
+
+def publish(event_type, ids, user_id=None):
+    """
+    Publishes an event once the current transaction commits, split in
+    events of at most MAX_IDS ids.
+    """
+    ids = list(ids)
+    for start in range(0, len(ids), MAX_IDS):
+        event = {'type': event_type, 'ids': ids[start:start + MAX_IDS]}
+        if user_id is not None:
+            event['user'] = user_id
+        # robust: a broker error must not fail the request that committed.
+        transaction.on_commit(partial(hub.publish, event), robust=True)
+
+
+def event_stream(subscription):
+    """
+    Server-sent events of ``subscription``, from hub.subscribe(), with a
+    keep-alive comment on each heartbeat. An ``overflow`` event ends the
+    stream of a client that fell behind.
+
+    The subscription ends with the stream, or once the stream is garbage
+    collected when the server never started it, e.g. the client left
+    before the response headers were sent.
+    """
+    stream = _event_stream(subscription)
+    weakref.finalize(stream, hub.unsubscribe, subscription)
+    return stream
+
+
+async def _event_stream(subscription):
+    try:
+        # Milliseconds before EventSource reconnects.
+        yield 'retry: 3000\n\n'
+        while True:
+            events = await subscription.get()
+            if subscription.overflowed:
+                yield 'event: overflow\ndata: {}\n\n'
+                return
+            if subscription.closed:
+                # Unsubscribed, get() would return at once from now on.
+                return
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            yield ''.join(event.sse for event in events)
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,92 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Same names as BookSerializer, without the per user is_favourited flag.
+EXPORT_FIELDS = ['id', 'title', 'author', 'creator', 'publicationYear', 'isbn', 'favourite_count']
+EXPORT_COLUMNS = ['id', 'title', 'author', 'creator_id', 'publicationYear', 'isbn', 'favourite_count']
+FORMATS = ('ndjson', 'csv')
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Yields one tuple per book. The rows are read through a server side cursor
+    ``chunk_size`` at a time and no model instances are built.
+    """
+    return queryset.order_by('pk').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+
+
+async def aexport_rows(queryset, chunk_size=2000):
+    """
+    export_rows() as an async iterator, for aexport_chunks(). Each chunk is
+    read in the thread of the sync code, which holds the server side cursor:
+    QuerySet.aiterator() would run the values_list() query on the event loop.
+    """
+    rows = export_rows(queryset, chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    try:
+        while chunk := await next_chunk():
+            for row in chunk:
+                yield row
+    finally:
+        await sync_to_async(rows.close)()
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, header=True):
+    writer = csv.writer(Echo())
+    if header:
+        yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_chunks(rows, fmt, chunk_size=2000):
+    """
+    Encodes the rows from export_rows() and yields them as text chunks of
+    ``chunk_size`` rows, so memory stays flat whatever the size of the catalog.
+    """
+    lines = {'ndjson': ndjson_lines, 'csv': csv_lines}[fmt](rows)
+    while True:
+        chunk = ''.join(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def aexport_chunks(rows, fmt, chunk_size=2000):
+    """
+    export_chunks() for the rows from aexport_rows(). ASGI servers send the
+    chunks as they are read, they would consume a sync iterator whole first.
+    """
+    header = True
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            yield encode_chunk(batch, fmt, header)
+            header = False
+            batch = []
+    chunk = encode_chunk(batch, fmt, header)
+    if chunk:
+        yield chunk
+
+
+def encode_chunk(rows, fmt, header):
+    if fmt == 'csv':
+        return ''.join(csv_lines(rows, header))
+    return ''.join(ndjson_lines(rows))
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Book
+from .signals import favourites_changed
+
+
+FavouriteRelation = Book.favourites.through
+
+
+@dataclass
+class FavouriteChanges:
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    # Requested changes that were already in place.
+    unchanged: list = field(default_factory=list)
+    # Book id -> reason the change was rejected.
+    failed: dict = field(default_factory=dict)
+
+
+def update_favourites(user, add=(), remove=()):
+    """
+    Adds and removes books from the user's favourites in one transaction.
+
+    The number of queries does not depend on how many ids are given: the
+    books are validated and locked with a single IN query, the M2M rows are
+    inserted and deleted in bulk and the favourite_count of every touched
+    book is updated with one UPDATE per direction.
+    """
+    add = set(add)
+    remove = set(remove)
+    changes = FavouriteChanges()
+    for book_id in add & remove:
+        changes.failed[book_id] = "The book cannot be added and removed at the same time"
+    add -= remove
+    remove -= set(changes.failed)
+    if not add and not remove:
+        return changes
+
+    with transaction.atomic():
+        # Locking the books, always in id order, serializes concurrent changes
+        # to their counters without risking deadlocks.
+        existing = set(
+            Book.objects.select_for_update().filter(pk__in=add | remove).order_by('pk').values_list('pk', flat=True)
+        )
+        current = set(
+            FavouriteRelation.objects.filter(user_id=user.pk, book_id__in=existing).values_list('book_id', flat=True)
+        )
+        to_add = sorted(add & existing - current)
+        to_remove = sorted(remove & existing & current)
+
+        if to_add:
+            FavouriteRelation.objects.bulk_create(
+                [FavouriteRelation(book_id=book_id, user_id=user.pk) for book_id in to_add]
+            )
+            Book.objects.filter(pk__in=to_add).update_changed(favourite_count=F('favourite_count') + 1)
+        if to_remove:
+            FavouriteRelation.objects.filter(user_id=user.pk, book_id__in=to_remove).delete()
+            # Never go negative if the counter drifted, reconcile_favourite_counts fixes it.
+            Book.objects.filter(pk__in=to_remove).update_changed(favourite_count=Greatest(F('favourite_count') - 1, 0))
+
+    if to_add or to_remove:
+        favourites_changed.send(sender=Book, user=user, added=to_add, removed=to_remove)
+
+    changes.added = to_add
+    changes.removed = to_remove
+    changes.unchanged = sorted((add & current) | (remove & existing - current))
+    for book_id in (add | remove) - existing:
+        changes.failed[book_id] = "The book Requested does not exist"
+    return changes
+
+
+def add_favourite(user, book_id):
+    """
+    Adds the book to the user's favourites and bumps its favourite_count.
+
+    Returns False when the book was already a favourite, raises
+    Book.DoesNotExist when there is no such book.
+    """
+    changes = update_favourites(user, add=[book_id])
+    if changes.failed:
+        raise Book.DoesNotExist(changes.failed[book_id])
+    return bool(changes.added)
+
+
+def remove_favourite(user, book_id):
+    """
+    Removes the book from the user's favourites and decrements its
+    favourite_count.
+
+    Returns False when the book was not a favourite, raises
+    Book.DoesNotExist when there is no such book.
+    """
+    changes = update_favourites(user, remove=[book_id])
+    if changes.failed:
+        raise Book.DoesNotExist(changes.failed[book_id])
+    return bool(changes.removed)
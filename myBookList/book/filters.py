@@ -0,0 +1,61 @@
+from django.db.models import Value
+from django.db.models.functions import Replace
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import normalize_isbn
+
+
+class BookFilterBackend(BaseFilterBackend):
+    """
+    Server side filtering for book lists.
+
+    Every parameter maps to a lookup that is served by one of the indexes
+    declared on ``Book.Meta`` (or by the creator foreign key index):
+
+    * ``isbn`` - exact match, dashes are ignored
+    * ``creator`` - id of the user that created the book
+    * ``year_min`` / ``year_max`` - inclusive publication year range
+    * ``author`` - case insensitive prefix
+    * ``title`` - case insensitive substring
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        isbn = params.get('isbn')
+        if isbn:
+            # Must be the same expression as book_isbn_normalized_idx.
+            queryset = queryset.alias(
+                isbn_normalized=Replace('isbn', Value('-'), Value(''))
+            ).filter(isbn_normalized=normalize_isbn(isbn))
+
+        creator = self.get_integer(params, 'creator')
+        if creator is not None:
+            queryset = queryset.filter(creator_id=creator)
+
+        year_min = self.get_integer(params, 'year_min')
+        if year_min is not None:
+            queryset = queryset.filter(publicationYear__gte=year_min)
+        year_max = self.get_integer(params, 'year_max')
+        if year_max is not None:
+            queryset = queryset.filter(publicationYear__lte=year_max)
+
+        author = params.get('author')
+        if author:
+            queryset = queryset.filter(author__istartswith=author)
+
+        title = params.get('title')
+        if title:
+            queryset = queryset.filter(title__icontains=title)
+
+        return queryset
+
+    def get_integer(self, params, name):
+        value = params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: "A valid integer is required."})
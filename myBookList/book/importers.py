@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import SEARCH_CONFIG, Book
+from .serializers import BookSerializer
+from .signals import books_bulk_created
+
+
+FORMATS = ('jsonl', 'csv')
+
+# The validated fields of a row, copied into the staging table.
+IMPORT_FIELDS = ('title', 'author', 'publicationYear', 'isbn')
+
+# The search vector is the one update_search_vector() sets, computed in the
+# insert instead of updating every row again.
+INSERT_SQL = '''
+INSERT INTO {books} ({columns}, {creator}, {favourite_count}, {version}, {search_vector}, {created_at}, {updated_at})
+SELECT
+    {columns}, %(creator)s, 0, 1,
+    setweight(to_tsvector(%(config)s::regconfig, coalesce({title}, '')), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, coalesce({author}, '')), 'B'),
+    now(), now()
+FROM book_import
+ORDER BY position
+RETURNING {id}
+'''
+
+
+def read_rows(lines, fmt):
+    """
+    Yields ``(line_number, row)`` for every record in ``lines``, an iterable
+    of text lines. ``row`` is a ValidationError for lines that cannot be
+    parsed, so a single bad line does not stop the import.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValidationError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(row, dict):
+                yield line_number, ValidationError("Each line must be a JSON object.")
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}, expected one of {', '.join(FORMATS)}.")
+
+
+class BookImporter:
+    """
+    Validates rows with BookSerializer in a single streaming pass and inserts
+    the valid ones ``batch_size`` rows at a time: COPY into a temporary
+    staging table, then one INSERT ... SELECT.
+
+    Only one batch is held in memory, and at most ``max_errors`` error
+    reports are kept (``failed`` still counts all of them).
+
+    Each batch is committed on its own, an import that fails part way keeps
+    the batches before. ``committed_line`` is the line of the last row
+    committed, run it again with ``start_line`` set to it to resume.
+    """
+
+    def __init__(self, creator, batch_size=1000, max_errors=100, start_line=0):
+        self.creator = creator
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.start_line = start_line
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.committed_line = start_line
+
+    def run(self, rows):
+        # One serializer validates every row, building it per row costs more
+        # than the validation itself.
+        serializer = BookSerializer()
+        batch = []
+        line_number = None
+        for line_number, row in rows:
+            if line_number <= self.start_line:
+                continue
+            try:
+                if isinstance(row, ValidationError):
+                    raise row
+                data = serializer.run_validation(row)
+            except ValidationError as e:
+                self.add_error(line_number, e.detail)
+                continue
+            batch.append([data[name] for name in IMPORT_FIELDS])
+            if len(batch) >= self.batch_size:
+                self.insert(batch, line_number)
+                batch = []
+        if batch:
+            self.insert(batch, line_number)
+        elif line_number is not None:
+            # Only invalid rows after the last batch.
+            self.committed_line = max(self.committed_line, line_number)
+        return self
+
+    def insert(self, batch, line_number):
+        fields = {field.name: field for field in Book._meta.concrete_fields}
+        quote = connection.ops.quote_name
+        content = io.StringIO()
+        csv.writer(content).writerows(batch)
+        content.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE book_import (position serial, {})'.format(
+                ', '.join(f'{quote(fields[name].column)} {fields[name].db_type(connection)}' for name in IMPORT_FIELDS)
+            ))
+            columns = ', '.join(quote(fields[name].column) for name in IMPORT_FIELDS)
+            # Empty strings stay empty strings, not NULL.
+            cursor.copy_expert(f'COPY book_import ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({columns}))', content)
+            cursor.execute(INSERT_SQL.format(
+                books=quote(Book._meta.db_table), columns=columns,
+                **{name: quote(field.column) for name, field in fields.items()},
+            ), {'creator': self.creator.pk, 'config': SEARCH_CONFIG})
+            ids = [row[0] for row in cursor.fetchall()]
+            # Not ON COMMIT DROP, the batch may not be the outermost transaction.
+            cursor.execute('DROP TABLE book_import')
+            books_bulk_created.send(sender=Book, ids=ids)
+        self.created += len(ids)
+        self.committed_line = line_number
+
+    def add_error(self, line_number, detail):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_number, "errors": detail})
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Populates Book.search_vector in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Recompute every row instead of only the rows without a vector.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = Book.objects.all() if options['all'] else Book.objects.filter(search_vector__isnull=True)
+
+        # Each batch is its own short transaction, so only batch_size rows are
+        # locked at a time and the table stays writable during the backfill.
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            updated += Book.objects.filter(pk__in=ids).update_search_vector()
+            last_id = ids[-1]
+            self.stdout.write(f"Updated {updated} books (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Search vector backfilled for {updated} books."))
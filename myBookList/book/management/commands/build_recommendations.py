@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+
+from book.changes import committed_before
+from book.models import Book, BookNeighbour, RecommendationBuild
+from book.recommendations import build_neighbours, heavy_users
+
+
+class Command(BaseCommand):
+    help = "Computes the books most often favourited together, see book.recommendations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--changed', action='store_true',
+            help=(
+                "Only the books changed since the last run and the books listing them, every book when there was "
+                "none. Approximate, see book.recommendations."
+            ),
+        )
+        parser.add_argument('--neighbours', type=int, default=settings.BOOK_RECOMMENDATIONS_NEIGHBOURS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-user-favourites', type=int, default=1000)
+        parser.add_argument('--min-common', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # Changes from here on, or still uncommitted, are left to the next run.
+        watermark = committed_before(Book)
+        books = Book.objects.all()
+        incremental = False
+        if options['changed']:
+            last_build = RecommendationBuild.objects.order_by('-finished_at', '-id').first()
+            if last_build is not None:
+                # Their scores for the changed books are stale too.
+                lists_changed = Exists(BookNeighbour.objects.filter(
+                    book_id=OuterRef('pk'), neighbour__change_xid__gte=last_build.watermark,
+                ))
+                books = books.filter(Q(change_xid__gte=last_build.watermark) | lists_changed)
+                incremental = True
+
+        heavy_user_ids = heavy_users(options['max_user_favourites'])
+        last_id = 0
+        built = 0
+        rows = 0
+        while True:
+            ids = list(books.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            rows += build_neighbours(
+                ids, options['neighbours'], options['max_user_favourites'], options['min_common'], heavy_user_ids,
+            )
+            built += len(ids)
+            last_id = ids[-1]
+
+        RecommendationBuild.objects.create(watermark=watermark, books=built, incremental=incremental)
+        self.stdout.write(self.style.SUCCESS(f"Built the neighbours of {built} books, {rows} in all."))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from book.exporters import FORMATS, export_chunks, export_rows
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Streams every book to a NDJSON or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument('--output', help="Defaults to stdout.")
+        parser.add_argument('--creator', type=int, help="Only export books created by this user id.")
+        parser.add_argument('--year-min', type=int)
+        parser.add_argument('--year-max', type=int)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        queryset = Book.objects.all()
+        if options['creator'] is not None:
+            queryset = queryset.filter(creator_id=options['creator'])
+        if options['year_min'] is not None:
+            queryset = queryset.filter(publicationYear__gte=options['year_min'])
+        if options['year_max'] is not None:
+            queryset = queryset.filter(publicationYear__lte=options['year_max'])
+
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        output = open(options['output'], 'w', encoding='utf-8', newline='') if options['output'] else None
+        started = time.perf_counter()
+        try:
+            rows = counted(export_rows(queryset, options['chunk_size']))
+            for chunk in export_chunks(rows, options['format'], chunk_size=options['chunk_size']):
+                if output:
+                    output.write(chunk)
+                else:
+                    self.stdout.write(chunk, ending='')
+        finally:
+            if output:
+                output.close()
+        elapsed = time.perf_counter() - started
+
+        rate = exported / elapsed if elapsed else 0
+        self.stderr.write(f"Exported {exported} books in {elapsed:.2f}s ({rate:.0f} rows/sec)")
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from book.importers import FORMATS, BookImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Imports books from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--creator', required=True, help="Username set as creator of the imported books.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=100, help="Number of row errors to report.")
+        parser.add_argument(
+            '--start-line', type=int, default=0,
+            help="Skips the rows up to this line, to resume an import that failed after it.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            creator = User.objects.get(username=options['creator'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['creator']!r} does not exist")
+
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if fmt == 'ndjson':
+            fmt = 'jsonl'
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot guess the format of {options['path']}, use --format")
+
+        importer = BookImporter(
+            creator, batch_size=options['batch_size'], max_errors=options['max_errors'],
+            start_line=options['start_line'],
+        )
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            try:
+                importer.run(read_rows(f, fmt))
+            except Exception:
+                # The batches before are committed.
+                self.stderr.write(
+                    f"Imported {importer.created} books before failing, "
+                    f"resume with --start-line {importer.committed_line}"
+                )
+                raise
+
+        for error in importer.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {importer.created} books, {importer.failed} rows failed."))
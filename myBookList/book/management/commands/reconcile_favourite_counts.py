@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from book import cache
+from book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Repairs Book.favourite_count where it drifted from the favourites table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        actual_count = Coalesce(
+            Subquery(
+                Book.favourites.through.objects.filter(book_id=OuterRef('pk'))
+                .order_by().values('book_id').annotate(total=Count('*')).values('total')
+            ),
+            0,
+        )
+
+        last_id = 0
+        checked = 0
+        repaired = 0
+        while True:
+            ids = list(Book.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            drifted = list(Book.objects.filter(pk__in=ids).exclude(favourite_count=actual_count).values_list('pk', flat=True))
+            if drifted:
+                repaired += Book.objects.filter(pk__in=drifted).update_changed(favourite_count=actual_count)
+                cache.invalidate(catalog=True, books=drifted)
+            checked += len(ids)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} books, repaired {repaired} counters."))
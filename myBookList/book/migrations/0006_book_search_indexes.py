@@ -0,0 +1,48 @@
+# Generated by Django 5.0.14 on 2026-10-18 02:59
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+import django.core.validators
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built with CREATE INDEX CONCURRENTLY so that existing
+    # catalogs keep accepting writes while they are created.
+    atomic = False
+
+    dependencies = [
+        ('book', '0005_book_favourites'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AlterModelOptions(
+            name='book',
+            options={'ordering': ['id']},
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn',
+            field=models.CharField(validators=[django.core.validators.RegexValidator('^(?=(?:\\D*\\d){10}(?:(?:\\D*\\d){3})?$)[\\d-]+$', 'Invalid ISBN. ISBN must be 10 or 13 digits long.')]),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(django.db.models.functions.text.Replace('isbn', models.Value('-'), models.Value('')), name='book_isbn_normalized_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['publicationYear'], name='book_publication_year_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('author'), name='text_pattern_ops'), name='book_author_prefix_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='book_title_trgm_idx'),
+        ),
+    ]
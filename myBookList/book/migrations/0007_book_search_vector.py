@@ -0,0 +1,30 @@
+# Generated by Django 5.0.14 on 2026-10-18 03:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # The column is added empty, populate it afterwards with
+    # `python manage.py backfill_search_vector`.
+    atomic = False
+
+    dependencies = [
+        ('book', '0006_book_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+    ]
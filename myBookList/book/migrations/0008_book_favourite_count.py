@@ -0,0 +1,20 @@
+# Generated by Django 5.0.14 on 2026-10-18 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Existing books start at 0, populate the counter afterwards with
+    # `python manage.py reconcile_favourite_counts`.
+
+    dependencies = [
+        ('book', '0007_book_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='favourite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
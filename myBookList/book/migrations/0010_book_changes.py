@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:18
+
+import book.models
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0009_book_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTombstone',
+            fields=[
+                ('book_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('change_xid', models.BigIntegerField(db_default=book.models.CurrentTransactionId(), editable=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='change_xid',
+            field=models.BigIntegerField(db_default=book.models.CurrentTransactionId(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # The table is new and empty, the books indexes are built concurrently
+        # in 0011.
+        migrations.AddIndex(
+            model_name='booktombstone',
+            index=models.Index(fields=['change_xid', 'book_id'], name='book_tombstone_change_idx'),
+        ),
+    ]
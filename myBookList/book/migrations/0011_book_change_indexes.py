@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 04:18
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The indexes are built with CREATE INDEX CONCURRENTLY so that existing
+    # catalogs keep accepting writes while they are created.
+    atomic = False
+
+    dependencies = [
+        ('book', '0010_book_changes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='book',
+            index=models.Index(fields=['change_xid', 'id'], name='book_change_idx'),
+        ),
+    ]
@@ -1,8 +1,53 @@
 from django.db import models
+from django.db.models import Exists, F, Func, OuterRef, Value
+from django.db.models.functions import Now, Replace, Upper
 from django.core.validators import RegexValidator
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 # Create your models here.
 
+# Text search configuration shared by the stored vector and the search queries.
+SEARCH_CONFIG = 'english'
+
+
+class CurrentTransactionId(Func):
+    """
+    Id of the current transaction, assigning one if needed. Orders the
+    changes feed, see book.changes.
+    """
+    template = 'txid_current()'
+    output_field = models.BigIntegerField()
+
+
+class BookQuerySet(models.QuerySet):
+    def with_favourite_state(self, user):
+        # Annotates whether `user` favourited each book with one EXISTS
+        # subquery, instead of one query per serialized book.
+        if not user.is_authenticated:
+            return self.annotate(is_favourited=Value(False))
+        favourites = Book.favourites.through.objects.filter(book_id=OuterRef('pk'), user_id=user.pk)
+        return self.annotate(is_favourited=Exists(favourites))
+
+    def favourited_by(self, user):
+        return self.filter(favourites=user).annotate(is_favourited=Value(True))
+
+    def update_changed(self, **kwargs):
+        """
+        update() that also moves the books up the changes feed and changes
+        their ETags, for updates of fields in the representation.
+        """
+        return self.update(
+            **kwargs, updated_at=Now(), change_xid=CurrentTransactionId(), version=F('version') + 1,
+        )
+
+    def update_search_vector(self):
+        return self.update(
+            search_vector=SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('author', weight='B', config=SEARCH_CONFIG)
+        )
+
+
 isbn_validator = RegexValidator(r"^(?=(?:\D*\d){10}(?:(?:\D*\d){3})?$)[\d-]+$", "Invalid ISBN. ISBN must be 10 or 13 digits long.")
 class Book(models.Model):
     id = models.AutoField(primary_key=True)
@@ -12,7 +57,86 @@ class Book(models.Model):
     isbn = models.CharField(validators=[isbn_validator])
     creator = models.ForeignKey(User, on_delete=models.CASCADE)
     favourites = models.ManyToManyField(User, related_name='favourite_books', blank=True)
+    # Denormalized size of `favourites`, maintained by book.favourites and
+    # repaired by the reconcile_favourite_counts command.
+    favourite_count = models.PositiveIntegerField(default=0, editable=False)
+    # Incremented by save() and update_changed() on every change, the ETags
+    # are derived from it. Writers of an existing row lock it first, like the
+    # views, or concurrent saves increment it once.
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # Maintained by BookSerializer and the backfill_search_vector command.
+    search_vector = SearchVectorField(null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Transaction of the last change, set by save() and update_changed().
+    change_xid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+
+    objects = BookQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"{self.title} by {self.author} - {self.publicationYear}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.change_xid = CurrentTransactionId()
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'updated_at', 'change_xid', 'version'}
+        super().save(*args, **kwargs)
     class Meta:
         ordering = ['id']  # or any other field
+        indexes = [
+            # Exact ISBN lookups ignore the dashes, see normalize_isbn().
+            models.Index(Replace('isbn', Value('-'), Value('')), name='book_isbn_normalized_idx'),
+            models.Index(fields=['publicationYear'], name='book_publication_year_idx'),
+            # Case insensitive prefix search, matches UPPER(author) LIKE 'ABC%'.
+            models.Index(OpClass(Upper('author'), name='text_pattern_ops'), name='book_author_prefix_idx'),
+            # Case insensitive substring search, matches UPPER(title) LIKE '%ABC%'.
+            GinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='book_title_trgm_idx'),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+            models.Index(fields=['change_xid', 'id'], name='book_change_idx'),
+        ]
+
+
+class BookTombstone(models.Model):
+    """
+    A deleted book, for the changes feed. Written by a post_delete receiver,
+    so cascades and queryset deletes leave one too.
+    """
+    book_id = models.IntegerField(primary_key=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    change_xid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['change_xid', 'book_id'], name='book_tombstone_change_idx')]
+
+
+class BookNeighbour(models.Model):
+    """
+    One of the books most similar to ``book`` by who favourited them, see
+    book.recommendations. Written by the build_recommendations command.
+    """
+    # The index of the unique constraint serves the lookups by book.
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbours', db_index=False)
+    neighbour = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbour_of')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['book', 'rank'], name='book_neighbour_rank_uniq')]
+
+
+class RecommendationBuild(models.Model):
+    """
+    A run of build_recommendations. The books changed since ``watermark``
+    (a change_xid) are recomputed by the next run with --changed.
+    """
+    watermark = models.BigIntegerField()
+    books = models.PositiveIntegerField()
+    incremental = models.BooleanField()
+    finished_at = models.DateTimeField(auto_now_add=True)
+
+
+def normalize_isbn(isbn):
+    return isbn.replace('-', '').strip()
@@ -0,0 +1,70 @@
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class BookCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the book primary key.
+
+    Pages are fetched with ``WHERE id > <cursor> ORDER BY id LIMIT n`` so the
+    cost of a page does not depend on how deep it is, and no COUNT(*) query
+    is issued. Cursors are opaque, base64 encoded tokens.
+    """
+    ordering = 'id'
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class BookSearchPagination(CursorPagination):
+    """
+    Cursor pagination for ranked search results, best matches first.
+
+    CursorPagination positions the cursor on the first ordering field only,
+    books tied on it would be told apart by an offset. rank_key, the rank
+    followed by the id, is unique instead, see BookSearchView.
+    """
+    ordering = '-rank_key'
+    page_size = 6
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination for the async views, the count and the page are
+    fetched with the async ORM.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        # The Django paginator only validates the page number against the
+        # count here, the page itself is sliced from the queryset below.
+        paginator = self.django_paginator_class(range(await queryset.acount()), page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        bounds = self.page.object_list
+        self.page.object_list = [obj async for obj in queryset[bounds.start:bounds.stop]]
+        return list(self.page)
+
+
+class AsyncBookCursorPagination(BookCursorPagination):
+    """
+    BookCursorPagination for the async views. CursorPagination has no hook to
+    fetch the page asynchronously, the page is paginated in a thread instead,
+    where paginate_queryset() evaluates it to a list.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
@@ -0,0 +1,135 @@
+"""
+"Users who favourited this also favourited": item-item recommendations from
+the favourites.
+
+Two books are similar when the same users favourited them. Their score is
+the cosine similarity of their columns in the user x book favourites
+matrix: the number of users who favourited both, over the square root of
+the product of their favourite counts. The build_recommendations command
+computes it in PostgreSQL, one chunk of books at a time, and keeps the top
+neighbours of each book in BookNeighbour. The memory used depends on the
+chunk size, not on the numbers of users and books: the database spills the
+pair counts of a chunk to disk when they outgrow work_mem.
+
+Users with more than ``max_user_favourites`` favourites, see
+heavy_users(), are left out of the pair counts and of the favourite counts
+they are divided by. They pair every book with every other, and cost the
+square of their favourites.
+
+Favourite changes move the books up the changes feed (Book.change_xid), so
+``build_recommendations --changed`` recomputes the books changed since the
+last run, and the books listing one of them as a neighbour. That is an
+approximation: a pair gaining common users can become the top neighbour of
+a book that did not change and did not list it, it shows up with the next
+full build.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Sum, Value
+
+from .models import Book, BookNeighbour
+from .serializers import BookValuesSerializer
+
+
+NEIGHBOURS_SQL = '''
+WITH fans AS (
+    SELECT book_id, user_id FROM {favourites}
+    WHERE book_id = ANY(%(books)s) AND user_id <> ALL(%(heavy_users)s)
+), pairs AS (
+    SELECT fans.book_id, other.book_id AS neighbour_id, count(*) AS common
+    FROM fans
+    JOIN {favourites} other ON other.user_id = fans.user_id AND other.book_id <> fans.book_id
+    GROUP BY fans.book_id, other.book_id
+    HAVING count(*) >= %(min_common)s
+), heavy_favourites AS (
+    SELECT book_id, count(*) AS favourites FROM {favourites}
+    WHERE user_id = ANY(%(heavy_users)s)
+    GROUP BY book_id
+), norms AS (
+    -- The favourites of the users counted in the pairs, favourite_count
+    -- without the heavy users'.
+    SELECT books.id AS book_id, greatest(books.favourite_count - coalesce(heavy.favourites, 0), 1)::float8 AS favourites
+    FROM {books} books
+    LEFT JOIN heavy_favourites heavy ON heavy.book_id = books.id
+    WHERE books.id IN (SELECT book_id FROM pairs UNION SELECT neighbour_id FROM pairs)
+), scored AS (
+    SELECT
+        pairs.book_id, pairs.neighbour_id,
+        pairs.common / sqrt(book.favourites * neighbour.favourites) AS score
+    FROM pairs
+    JOIN norms book ON book.book_id = pairs.book_id
+    JOIN norms neighbour ON neighbour.book_id = pairs.neighbour_id
+), ranked AS (
+    SELECT *, row_number() OVER (PARTITION BY book_id ORDER BY score DESC, neighbour_id) AS rank
+    FROM scored
+)
+INSERT INTO {neighbours} (book_id, neighbour_id, score, rank)
+SELECT book_id, neighbour_id, score, rank FROM ranked WHERE rank <= %(neighbours)s
+'''
+
+
+def heavy_users(max_user_favourites):
+    """
+    Ids of the users with more than ``max_user_favourites`` favourites.
+    """
+    return list(
+        Book.favourites.through.objects.values('user_id')
+        .annotate(favourites=Count('*')).filter(favourites__gt=max_user_favourites)
+        .values_list('user_id', flat=True)
+    )
+
+
+def build_neighbours(book_ids, neighbours, max_user_favourites, min_common=1, heavy_user_ids=None):
+    """
+    Replaces the neighbours of ``book_ids`` with their ``neighbours`` most
+    similar books, in one transaction. Returns the number of rows written.
+
+    ``heavy_user_ids`` saves looking up heavy_users() again for every chunk.
+    """
+    if heavy_user_ids is None:
+        heavy_user_ids = heavy_users(max_user_favourites)
+    quote = connection.ops.quote_name
+    sql = NEIGHBOURS_SQL.format(
+        favourites=quote(Book.favourites.through._meta.db_table),
+        books=quote(Book._meta.db_table),
+        neighbours=quote(BookNeighbour._meta.db_table),
+    )
+    with transaction.atomic():
+        BookNeighbour.objects.filter(book_id__in=book_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'books': list(book_ids),
+                'heavy_users': list(heavy_user_ids),
+                'min_common': min_common,
+                'neighbours': neighbours,
+            })
+            return cursor.rowcount
+
+
+def similar_books(user, book_id, limit, fields=None):
+    """
+    .values() rows of the books most similar to ``book_id``, best first.
+    """
+    return (
+        Book.objects.with_favourite_state(user)
+        .filter(neighbour_of__book_id=book_id)
+        .order_by('neighbour_of__rank')
+        .values(*BookValuesSerializer.values_fields_for(fields))[:limit]
+    )
+
+
+def recommended_books(user, limit, fields=None):
+    """
+    .values() rows of the books most similar to the user's favourites, their
+    scores summed over the favourites, without the favourites themselves.
+    """
+    favourites = Book.favourites.through.objects.filter(user_id=user.pk)
+    # NOT EXISTS, unlike NOT IN, lets PostgreSQL start from the neighbours of
+    # the favourites instead of scanning every book.
+    favourited = Exists(favourites.filter(book_id=OuterRef('pk')))
+    return (
+        Book.objects.filter(neighbour_of__book_id__in=favourites.values('book_id'))
+        .filter(~favourited)
+        .annotate(score=Sum('neighbour_of__score'), is_favourited=Value(False))
+        .order_by('-score', 'id')
+        .values(*BookValuesSerializer.values_fields_for(fields))[:limit]
+    )
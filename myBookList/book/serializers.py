@@ -1,8 +1,172 @@
+from operator import itemgetter
+
+from django.utils.html import escape
 from rest_framework import serializers
+
+from myBookList.metrics import timed_serialization
+
+from .conditional import ETAG_FIELDS
 from .models import Book
 
+class BookListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
 class BookSerializer(serializers.ModelSerializer):
+    is_favourited = serializers.SerializerMethodField()
+
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'creator', 'publicationYear', 'isbn' ]  # include other fields as needed
+        list_serializer_class = BookListSerializer
+        fields = ['id', 'title', 'author', 'creator', 'publicationYear', 'isbn', 'favourite_count', 'is_favourited' ]  # include other fields as needed
         read_only_fields = ['creator']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # Only ``fields`` are serialized, see requested_fields().
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @staticmethod
+    def only_fields(fields):
+        """
+        Columns to load with .only() for ``fields``, the ETags need the
+        others in ETAG_FIELDS too. is_favourited is an annotation.
+        """
+        names = [*fields, *ETAG_FIELDS]
+        return [name for name in dict.fromkeys(names) if name != 'is_favourited']
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+    def get_is_favourited(self, obj):
+        # Annotated by Book.objects.with_favourite_state() in the views.
+        return getattr(obj, 'is_favourited', False)
+
+    def create(self, validated_data):
+        book = super().create(validated_data)
+        Book.objects.filter(pk=book.pk).update_search_vector()
+        return book
+
+    def update(self, instance, validated_data):
+        # Book.save() increments the version, the views lock the row before
+        # updating it, see ConditionalObjectMixin.
+        book = super().update(instance, validated_data)
+        if 'title' in validated_data or 'author' in validated_data:
+            Book.objects.filter(pk=book.pk).update_search_vector()
+        return book
+
+
+class BookValuesSerializer:
+    """
+    Read-only BookSerializer for lists, building the representations straight
+    from ``.values(*values_fields)`` rows: no model instances and no per
+    field to_representation(). The output is the same as BookSerializer's.
+    """
+    # Representation field to .values() key, in BookSerializer.Meta.fields order.
+    sources = {
+        'id': 'id',
+        'title': 'title',
+        'author': 'author',
+        'creator': 'creator_id',
+        'publicationYear': 'publicationYear',
+        'isbn': 'isbn',
+        'favourite_count': 'favourite_count',
+        'is_favourited': 'is_favourited',
+    }
+    fields = tuple(sources)
+    row_values = itemgetter(*sources.values())
+    # The ETags also need the version.
+    values_fields = (*sources.values(), 'version')
+
+    def __init__(self, instance=None, many=False, fields=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        if fields is not None:
+            keys = [self.sources[name] for name in fields]
+            self.fields = tuple(fields)
+            # itemgetter() of a single key returns the value, not a tuple.
+            self.row_values = itemgetter(*keys) if len(keys) > 1 else lambda row: (row[keys[0]],)
+
+    @classmethod
+    def values_fields_for(cls, fields):
+        """
+        The .values() keys for ``fields``, all of them for None.
+        """
+        if fields is None:
+            return cls.values_fields
+        return tuple(dict.fromkeys([*(cls.sources[name] for name in fields), *ETAG_FIELDS]))
+
+    @property
+    def data(self):
+        fields, row_values = self.fields, self.row_values
+        with timed_serialization():
+            if self.many:
+                return [dict(zip(fields, row_values(row))) for row in self.instance]
+            return dict(zip(fields, row_values(self.instance)))
+
+
+def requested_fields(request):
+    """
+    The fields listed in ``?fields=id,title``, in BookSerializer.Meta.fields
+    order, or None without the parameter. Unknown fields are a 400.
+    """
+    value = request.query_params.get('fields')
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(',')} - {''}
+    if not names:
+        raise serializers.ValidationError({'fields': "List at least one field."})
+    unknown = names - set(BookSerializer.Meta.fields)
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}."})
+    return [name for name in BookSerializer.Meta.fields if name in names]
+
+
+# Around the matches in the search headlines. Control characters, should a
+# title hold them it gets stray <b> tags at worst, never markup of its own.
+HEADLINE_START = '\x02'
+HEADLINE_STOP = '\x03'
+
+
+class HeadlineField(serializers.CharField):
+    """
+    The headline as HTML: the text escaped and the matches in <b> tags.
+    """
+
+    def to_representation(self, value):
+        return escape(value).replace(HEADLINE_START, '<b>').replace(HEADLINE_STOP, '</b>')
+
+
+class RankField(serializers.FloatField):
+    """
+    The search rank to four decimals. Between 0.0001 and 1e16, orjson writes
+    floats like json, see myBookList.renderers.
+    """
+
+    def to_representation(self, value):
+        return round(float(value), 4)
+
+
+class BookSearchSerializer(BookSerializer):
+    rank = RankField(read_only=True)
+    headline = HeadlineField(read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['rank', 'headline']
+
+
+class BulkFavouriteSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=1000)
+
+    def validate(self, attrs):
+        if not attrs.get('add') and not attrs.get('remove'):
+            raise serializers.ValidationError("Provide at least one book id to add or remove.")
+        return attrs
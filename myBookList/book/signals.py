@@ -0,0 +1,83 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from myBookList.db.replicas import stick_to_primary
+
+from . import cache, events
+from .models import Book, BookTombstone
+
+
+# Sent by book.favourites.update_favourites() with the user and the ids of the
+# books actually added to / removed from their favourites.
+favourites_changed = Signal()
+
+# Sent with the ``ids`` of books inserted in bulk by BookImporter, which
+# skips post_save.
+books_bulk_created = Signal()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_responses(instance, **kwargs):
+    cache.invalidate(catalog=True, books=[instance.pk])
+
+
+@receiver(books_bulk_created)
+def invalidate_catalog_responses(**kwargs):
+    cache.invalidate(catalog=True)
+
+
+@receiver(favourites_changed)
+def invalidate_favourite_responses(user, added, removed, **kwargs):
+    # The lists show the favourite_count of the books.
+    cache.invalidate(catalog=True, books=[*added, *removed], users=[user.pk])
+
+
+@receiver(post_delete, sender=Book)
+def leave_tombstone(instance, **kwargs):
+    # For the changes feed, in the transaction of the delete.
+    BookTombstone.objects.create(book_id=instance.pk)
+
+
+@receiver(post_save, sender=Book)
+def publish_book_saved(instance, created, **kwargs):
+    events.publish('book.created' if created else 'book.updated', [instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def publish_book_deleted(instance, **kwargs):
+    events.publish('book.deleted', [instance.pk])
+
+
+@receiver(books_bulk_created)
+def publish_books_created(ids, **kwargs):
+    events.publish('book.created', ids)
+
+
+@receiver(favourites_changed)
+def publish_favourites_changed(user, added, removed, **kwargs):
+    events.publish('favourite.added', added, user_id=user.pk)
+    events.publish('favourite.removed', removed, user_id=user.pk)
+    # Their favourite_count changed.
+    events.publish('book.updated', sorted([*added, *removed]))
+
+
+@receiver(favourites_changed)
+def read_favourites_from_primary(user, **kwargs):
+    # The user's next reads must see the change, the replicas may not yet.
+    stick_to_primary(user)
+
+
+@receiver(m2m_changed, sender=Book.favourites.through)
+def invalidate_response_cache_on_m2m(action, instance, reverse, pk_set, **kwargs):
+    # Favourites changed through the ORM relation instead of book.favourites.
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.favourite_books, pk_set holds book ids (None when cleared).
+        cache.invalidate(catalog=True, books=pk_set or (), users=[instance.pk])
+    elif pk_set is None:
+        # book.favourites.clear(), whose users are not known anymore.
+        cache.invalidate(catalog=True, books=[instance.pk])
+    else:
+        cache.invalidate(catalog=True, books=[instance.pk], users=pk_set)
@@ -161,7 +161,7 @@ class UserFavouriteBooksViewTestCase(TestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.get('/api/favourite-books/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        favourite_books = self.user.favourite_books.all()
+        favourite_books = Book.objects.favourited_by(self.user)
         serializer = BookSerializer(favourite_books, many=True)
         self.assertEqual(response.data["results"], serializer.data)
 
@@ -331,7 +331,7 @@ class UserFavouriteBooksViewTestCase(TestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.get('/api/favourites/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        favourite_books = self.user.favourite_books.all()
+        favourite_books = Book.objects.favourited_by(self.user)
         serializer = BookSerializer(favourite_books, many=True)
         self.assertEqual(response.data["results"], serializer.data)
 
@@ -386,9 +386,51 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+import csv
+import json
+import os
+import tempfile
+from unittest import mock
 
 from .models import Book
 from .serializers import BookSerializer
+from .pagination import BookCursorPagination
+from myBookList.throttling import SlidingWindowThrottle
+from myBookList.db import replicas
+from myBookList.db.replicas import ReplicaRouter
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.test import TransactionTestCase, override_settings
+from unittest import skipUnless
+import threading
+from django.db import transaction
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.test import APIRequestFactory
+from rest_framework.renderers import JSONRenderer
+from .serializers import BookValuesSerializer
+from myBookList.renderers import FastJSONRenderer
+import asyncio
+from . import events
+from .async_views import events_websocket
+from .favourites import update_favourites
+from .models import BookNeighbour, RecommendationBuild
+from base64 import b64decode
+from asgiref.sync import async_to_sync, sync_to_async
+from .exporters import aexport_chunks
+from urllib.parse import parse_qs, urlparse
+from rest_framework import generics
+from .conditional import ConditionalGetMixin, book_etag
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
 
 class BookListCreateViewTestCase(TestCase):
     def setUp(self):
@@ -545,10 +587,1460 @@ class UserFavouriteBooksViewTestCase(TestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.get('/api/favourites/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        favourite_books = self.user.favourite_books.all()
+        favourite_books = Book.objects.favourited_by(self.user)
         serializer = BookSerializer(favourite_books, many=True)
         self.assertEqual(response.data["results"], serializer.data)
 
     def test_get_user_favourite_books_unauthenticated(self):
         response = self.client.get('/api/favourites/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class BookCursorPaginationTestCase(TestCase):
+    def setUp(self):
+        # Keep the throttle history and cached responses out of other tests.
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        Book.objects.bulk_create([
+            Book(title=f'Test Book {i}', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+            for i in range(10)
+        ])
+
+    def test_cursor_pages_follow_id_order(self):
+        response = self.client.get('/api/books/?pagination=cursor')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        first_page = [book['id'] for book in response.data['results']]
+        self.assertEqual(len(first_page), 6)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        second_page = [book['id'] for book in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        self.assertEqual(first_page + second_page, list(Book.objects.values_list('id', flat=True)))
+
+    def test_cursor_page_skips_count_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/books/?pagination=cursor')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cursor_page_size_is_capped(self):
+        response = self.client.get('/api/books/?pagination=cursor&page_size=8')
+        self.assertEqual(len(response.data['results']), 8)
+        with mock.patch.object(BookCursorPagination, 'max_page_size', 4):
+            response = self.client.get('/api/books/?pagination=cursor&page_size=1000')
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_page_number_pagination_is_the_default(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 6)
+
+class BookFilterTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.hobbit = Book.objects.create(title='The Hobbit', author='J. R. R. Tolkien', creator=self.user,
+            publicationYear=1937, isbn='978-0-261-10221-7')
+        self.rings = Book.objects.create(title='The Fellowship of the Ring', author='J. R. R. Tolkien', creator=self.user,
+            publicationYear=1954, isbn='9780261102354')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', creator=self.user,
+            publicationYear=1965, isbn='0441172717')
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/books/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['id'] for book in response.data['results']]
+
+    def test_filter_by_isbn_ignores_dashes(self):
+        self.assertEqual(self.get_ids('isbn=9780261102217'), [self.hobbit.id])
+        self.assertEqual(self.get_ids('isbn=978-0261102354'), [self.rings.id])
+
+    def test_filter_by_year_range(self):
+        self.assertEqual(self.get_ids('year_min=1950'), [self.rings.id, self.dune.id])
+        self.assertEqual(self.get_ids('year_min=1940&year_max=1960'), [self.rings.id])
+
+    def test_filter_by_invalid_year(self):
+        response = self.client.get('/api/books/?year_min=nineteen')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('year_min', response.data)
+
+    def test_filter_by_author_prefix(self):
+        self.assertEqual(self.get_ids('author=j. r.'), [self.hobbit.id, self.rings.id])
+        self.assertEqual(self.get_ids('author=Tolkien'), [])
+
+    def test_filter_by_title_substring(self):
+        self.assertEqual(self.get_ids('title=ring'), [self.rings.id])
+        self.assertEqual(self.get_ids('title=the&year_max=1940'), [self.hobbit.id])
+
+class BookSearchViewTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        for data in [
+            {'title': 'The Hobbit', 'author': 'J. R. R. Tolkien', 'publicationYear': 1937, 'isbn': '9780261102217'},
+            {'title': 'Dragons of Autumn Twilight', 'author': 'Margaret Weis', 'publicationYear': 1984, 'isbn': '0880381736'},
+            {'title': 'A Dragon Reader', 'author': 'Dragon Society', 'publicationYear': 2001, 'isbn': '1234567890'},
+        ]:
+            response = self.client.post('/api/books/', data)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_search_ranks_results(self):
+        response = self.client.get('/api/books/search/?q=dragons')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        titles = [book['title'] for book in response.data['results']]
+        # Title and author both match for the last book, so it ranks first.
+        self.assertEqual(titles, ['A Dragon Reader', 'Dragons of Autumn Twilight'])
+        ranks = [book['rank'] for book in response.data['results']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertIn('<b>Dragons</b>', response.data['results'][1]['headline'])
+
+    def test_search_uses_cursor_pages(self):
+        response = self.client.get('/api/books/search/?q=dragon&page_size=1')
+        self.assertNotIn('count', response.data)
+        first = response.data['results']
+        response = self.client.get(response.data['next'])
+        second = response.data['results']
+        self.assertIsNone(response.data['next'])
+        self.assertEqual([first[0]['title'], second[0]['title']], ['A Dragon Reader', 'Dragons of Autumn Twilight'])
+
+    def test_headline_is_escaped(self):
+        self.client.post('/api/books/', {'title': '<img src=x onerror=alert(1)> Dragon & co', 'author': 'Test Author',
+            'publicationYear': 2022, 'isbn': '1234567890'})
+        response = self.client.get('/api/books/search/?q=co')
+        headline = response.data['results'][0]['headline']
+        self.assertNotIn('<img', headline)
+        self.assertIn('&amp;', headline)
+
+    def test_search_cursor_with_tied_ranks(self):
+        for number in range(4):
+            self.client.post('/api/books/', {'title': 'Griffin', 'author': 'Test Author', 'publicationYear': 2022,
+                'isbn': '1234567890'})
+        ids = []
+        url = '/api/books/search/?q=griffin&page_size=1'
+        while url:
+            response = self.client.get(url)
+            ids += [book['id'] for book in response.data['results']]
+            url = response.data['next']
+            if url:
+                # The cursors hold a position, never an offset.
+                cursor = parse_qs(urlparse(url).query)['cursor'][0]
+                self.assertNotIn('o', parse_qs(b64decode(cursor).decode()))
+        self.assertEqual(ids, sorted(Book.objects.filter(title='Griffin').values_list('pk', flat=True), reverse=True))
+
+    def test_search_vector_follows_updates(self):
+        book = Book.objects.get(title='The Hobbit')
+        response = self.client.patch(f'/api/books/{book.pk}/', {'title': 'There and Back Again'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/books/search/?q=hobbit').data['results'], [])
+        results = self.client.get('/api/books/search/?q=back').data['results']
+        self.assertEqual([book['id'] for book in results], [book.pk])
+
+    def test_search_requires_query(self):
+        response = self.client.get('/api/books/search/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('q', response.data)
+
+    def test_backfill_search_vector(self):
+        Book.objects.update(search_vector=None)
+        self.assertEqual(self.client.get('/api/books/search/?q=hobbit').data['results'], [])
+        call_command('backfill_search_vector', batch_size=2, stdout=StringIO())
+        self.assertFalse(Book.objects.filter(search_vector__isnull=True).exists())
+        self.assertEqual(len(self.client.get('/api/books/search/?q=hobbit').data['results']), 1)
+
+class FavouriteCountTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpassword')
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+        self.other_book = Book.objects.create(title='Test Book 2', author='Test Author', creator=self.user,
+            publicationYear=2022, isbn='1234567890')
+
+    def favourite(self, user, book):
+        self.client.force_authenticate(user=user)
+        response = self.client.post(f'/api/favourites/{book.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_counter_follows_favourite_changes(self):
+        self.favourite(self.user, self.book)
+        self.favourite(self.other_user, self.book)
+        # Favouriting twice does not count twice.
+        self.favourite(self.other_user, self.book)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.favourite_count, 2)
+
+        self.client.delete(f'/api/favourites/{self.book.pk}/')
+        self.client.delete(f'/api/favourites/{self.book.pk}/')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.favourite_count, 1)
+
+    def test_list_detail_and_favourites_expose_counts(self):
+        self.favourite(self.other_user, self.book)
+        self.favourite(self.user, self.book)
+
+        response = self.client.get('/api/books/')
+        books = {book['id']: book for book in response.data['results']}
+        self.assertEqual(books[self.book.pk]['favourite_count'], 2)
+        self.assertTrue(books[self.book.pk]['is_favourited'])
+        self.assertEqual(books[self.other_book.pk]['favourite_count'], 0)
+        self.assertFalse(books[self.other_book.pk]['is_favourited'])
+
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response.data['favourite_count'], 2)
+        self.assertTrue(response.data['is_favourited'])
+
+        response = self.client.get('/api/favourites/')
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book.pk])
+        self.assertTrue(response.data['results'][0]['is_favourited'])
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertFalse(response.data['is_favourited'])
+
+    def test_list_queries_do_not_depend_on_page_length(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            self.client.get('/api/books/')
+        for book in Book.objects.bulk_create([
+            Book(title=f'Test Book {i}', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+            for i in range(4)
+        ]):
+            self.user.favourite_books.add(book)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/books/')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_reconcile_favourite_counts(self):
+        self.book.favourites.add(self.user, self.other_user)
+        Book.objects.filter(pk=self.other_book.pk).update(favourite_count=5)
+        out = StringIO()
+        call_command('reconcile_favourite_counts', batch_size=1, stdout=out)
+        self.assertIn('repaired 2 counters', out.getvalue())
+        self.assertEqual(
+            dict(Book.objects.values_list('pk', 'favourite_count')),
+            {self.book.pk: 2, self.other_book.pk: 0},
+        )
+
+class BulkFavouriteBooksTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.books = Book.objects.bulk_create([
+            Book(title=f'Test Book {i}', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+            for i in range(5)
+        ])
+        self.ids = [book.pk for book in self.books]
+
+    def test_bulk_add_and_remove(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/favourites/bulk/', {'add': self.ids[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['added'], self.ids[:3])
+
+        response = self.client.post('/api/favourites/bulk/', {
+            'add': [self.ids[0], self.ids[3], 999],
+            'remove': [self.ids[1], self.ids[4]],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'added': [self.ids[3]],
+            'removed': [self.ids[1]],
+            'unchanged': [self.ids[0], self.ids[4]],
+            'failed': [{'id': 999, 'error': 'The book Requested does not exist'}],
+        })
+        self.assertEqual(
+            sorted(self.user.favourite_books.values_list('pk', flat=True)),
+            [self.ids[0], self.ids[2], self.ids[3]],
+        )
+        self.assertEqual(
+            list(Book.objects.values_list('favourite_count', flat=True)),
+            [1, 0, 1, 1, 0],
+        )
+
+    def test_bulk_queries_do_not_depend_on_batch_size(self):
+        self.client.force_authenticate(user=self.user)
+        self.user.favourite_books.add(*self.books[:2])
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/favourites/bulk/', {'add': self.ids[2:3], 'remove': self.ids[:1]}, format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/favourites/bulk/', {'add': self.ids[3:], 'remove': self.ids[1:3]}, format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_same_book_added_and_removed(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/favourites/bulk/', {'add': self.ids[:1], 'remove': self.ids[:1]}, format='json')
+        self.assertEqual(response.data['failed'][0]['id'], self.ids[0])
+        self.assertFalse(self.user.favourite_books.exists())
+
+    def test_bulk_invalid_payload(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/favourites/bulk/', {'add': ['abc']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/favourites/bulk/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_unauthenticated(self):
+        response = self.client.post('/api/favourites/bulk/', {'add': self.ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class BookImportViewTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def test_import_csv(self):
+        self.client.force_authenticate(user=self.user)
+        body = (
+            'title,author,publicationYear,isbn\n'
+            'Dune,Frank Herbert,1965,0441172717\n'
+            'Bad Book,Someone,1999,22\n'
+            'Emma,Jane Austen,1815,978-0141439587\n'
+        )
+        response = self.client.post('/api/books/import/?batch_size=1', body, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 3)
+        self.assertIn('isbn', response.data['errors'][0]['errors'])
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Dune', 'Emma'])
+        self.assertFalse(Book.objects.filter(creator=self.user, search_vector__isnull=True).exists())
+
+    def test_import_jsonl(self):
+        self.client.force_authenticate(user=self.user)
+        body = '\n'.join([
+            json.dumps({'title': 'Dune', 'author': 'Frank Herbert', 'publicationYear': 1965, 'isbn': '0441172717'}),
+            '{not json',
+            json.dumps({'title': 'No Year', 'author': 'Someone', 'isbn': '0441172717'}),
+            '',
+            json.dumps({'title': 'Emma', 'author': 'Jane Austen', 'publicationYear': 1815, 'isbn': '9780141439587'}),
+        ])
+        response = self.client.post('/api/books/import/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3])
+        self.assertIn('publicationYear', response.data['errors'][1]['errors'])
+
+    def test_import_rejects_unknown_content_type(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/books/import/', {'title': 'Dune'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_import_unauthenticated(self):
+        response = self.client.post('/api/books/import/', 'title\n', content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_books_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for i in range(5):
+                f.write(json.dumps({'title': f'Book {i}', 'author': 'Author', 'publicationYear': 2000, 'isbn': '1234567890'}) + '\n')
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_books', f.name, creator='testuser', batch_size=2, stdout=out)
+        self.assertIn('Imported 5 books, 0 rows failed.', out.getvalue())
+        self.assertEqual(Book.objects.filter(creator=self.user).count(), 5)
+
+    def test_search_vector(self):
+        self.client.force_authenticate(user=self.user)
+        body = 'title,author,publicationYear,isbn\nDune Messiah,Frank Herbert,1969,0441172695\n'
+        self.client.post('/api/books/import/', body, content_type='text/csv')
+        imported = list(Book.objects.values_list('search_vector', flat=True))
+        Book.objects.update_search_vector()
+        self.assertEqual(imported, list(Book.objects.values_list('search_vector', flat=True)))
+
+    def test_import_books_command_resume(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for i in range(5):
+                f.write(json.dumps({'title': f'Book {i}', 'author': 'Author', 'publicationYear': 2000, 'isbn': '1234567890'}) + '\n')
+        self.addCleanup(os.remove, f.name)
+        err = StringIO()
+        # The second batch fails, the first one stays.
+        with mock.patch('book.importers.books_bulk_created.send', side_effect=[None, DatabaseError('Failed')]):
+            with self.assertRaises(DatabaseError):
+                call_command('import_books', f.name, creator='testuser', batch_size=2, stdout=StringIO(), stderr=err)
+        self.assertIn('Imported 2 books before failing, resume with --start-line 2', err.getvalue())
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Book 0', 'Book 1'])
+
+        out = StringIO()
+        call_command('import_books', f.name, creator='testuser', batch_size=2, start_line=2, stdout=out)
+        self.assertIn('Imported 3 books, 0 rows failed.', out.getvalue())
+        self.assertEqual(Book.objects.filter(creator=self.user).count(), 5)
+
+class BookExportViewTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpassword')
+        self.dune = Book.objects.create(title='Dune', author='Frank Herbert', creator=self.user,
+            publicationYear=1965, isbn='0441172717')
+        self.emma = Book.objects.create(title='Emma, a "novel"', author='Jane Austen', creator=self.other_user,
+            publicationYear=1815, isbn='9780141439587')
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_unauthenticated(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/books/export/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get('/api/books/export/?format=csv', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ['id', 'title', 'author', 'creator', 'publicationYear', 'isbn', 'favourite_count'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Dune', 'Emma, a "novel"'])
+
+    def test_async_chunks(self):
+        async def rows():
+            for number in range(5):
+                yield (number, 'Title', 'Author', 1, 2000, '1234567890', 0)
+
+        async def read(fmt):
+            return [chunk async for chunk in aexport_chunks(rows(), fmt, chunk_size=2)]
+
+        chunks = async_to_sync(read)('csv')
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(''.join(chunks).count('id,title'), 1)
+        self.assertEqual(len(''.join(async_to_sync(read)('ndjson')).splitlines()), 5)
+
+    def test_export_ndjson(self):
+        response = self.client.get('/api/books/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(rows, [
+            {'id': self.dune.pk, 'title': 'Dune', 'author': 'Frank Herbert', 'creator': self.user.pk,
+             'publicationYear': 1965, 'isbn': '0441172717', 'favourite_count': 0},
+            {'id': self.emma.pk, 'title': 'Emma, a "novel"', 'author': 'Jane Austen', 'creator': self.other_user.pk,
+             'publicationYear': 1815, 'isbn': '9780141439587', 'favourite_count': 0},
+        ])
+
+    def test_export_csv(self):
+        response = self.client.get('/api/books/export/?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(self.read(response))))
+        self.assertEqual(rows[0], ['id', 'title', 'author', 'creator', 'publicationYear', 'isbn', 'favourite_count'])
+        self.assertEqual(rows[2][1], 'Emma, a "novel"')
+        self.assertEqual(len(rows), 3)
+
+    def test_export_filters(self):
+        response = self.client.get(f'/api/books/export/?creator={self.other_user.pk}')
+        self.assertEqual([json.loads(line)['id'] for line in self.read(response).splitlines()], [self.emma.pk])
+        response = self.client.get('/api/books/export/?year_min=1900')
+        self.assertEqual([json.loads(line)['id'] for line in self.read(response).splitlines()], [self.dune.pk])
+
+    def test_export_invalid_filter(self):
+        response = self.client.get('/api/books/export/?format=csv&creator=me')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('creator', response.content.decode())
+
+    def test_export_books_command(self):
+        out = StringIO()
+        err = StringIO()
+        call_command('export_books', format='csv', chunk_size=1, stdout=out, stderr=err)
+        self.assertEqual(len(list(csv.reader(StringIO(out.getvalue())))), 3)
+        self.assertIn('Exported 2 books', err.getvalue())
+
+class BookResponseCacheTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+
+    def test_list_and_detail_are_served_from_cache(self):
+        for url in ['/api/books/', f'/api/books/{self.book.pk}/']:
+            response = self.client.get(url)
+            self.assertEqual(response['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                cached = self.client.get(url)
+            self.assertEqual(cached['X-Cache'], 'HIT')
+            self.assertEqual(cached.data, response.data)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get('/api/books/?title=test')
+        response = self.client.get('/api/books/?title=other')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_writes_invalidate_cached_responses(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(f'/api/books/{self.book.pk}/')
+        self.client.patch(f'/api/books/{self.book.pk}/', {'title': 'Updated Book'})
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], 'Updated Book')
+
+        self.client.get('/api/books/')
+        self.client.post('/api/books/', {'title': 'New Book', 'author': 'Test Author', 'publicationYear': 2022, 'isbn': '1234567890'})
+        self.assertEqual(self.client.get('/api/books/').data['count'], 2)
+
+        self.client.delete(f'/api/books/{self.book.pk}/')
+        self.assertEqual(self.client.get('/api/books/').data['count'], 1)
+
+    def test_favourites_invalidate_cached_responses(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertFalse(self.client.get(f'/api/books/{self.book.pk}/').data['is_favourited'])
+        self.client.post(f'/api/favourites/{self.book.pk}/')
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertTrue(response.data['is_favourited'])
+        self.assertEqual(response.data['favourite_count'], 1)
+
+    def test_favourites_invalidate_the_lists_and_the_books(self):
+        other_book = Book.objects.create(title='Other Book', author='Test Author', creator=self.user,
+            publicationYear=2022, isbn='1234567890')
+        other_user = User.objects.create_user(username='otheruser', password='testpassword')
+        self.client.force_authenticate(user=other_user)
+        self.client.get('/api/books/')
+        self.client.get(f'/api/books/{other_book.pk}/')
+        self.client.get(f'/api/books/{self.book.pk}/')
+
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f'/api/favourites/{self.book.pk}/')
+        self.client.force_authenticate(user=other_user)
+        # Every list shows the favourite_count of the book.
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['favourite_count'], 1)
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['favourite_count'], 1)
+        self.assertEqual(self.client.get(f'/api/books/{other_book.pk}/')['X-Cache'], 'HIT')
+
+    def test_m2m_changes_invalidate_cached_responses(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(f'/api/books/{self.book.pk}/')
+        self.user.favourite_books.add(self.book)
+        self.assertTrue(self.client.get(f'/api/books/{self.book.pk}/').data['is_favourited'])
+        self.book.favourites.clear()
+        self.assertFalse(self.client.get(f'/api/books/{self.book.pk}/').data['is_favourited'])
+
+    @override_settings(ALLOWED_HOSTS=['one.example.com', 'two.example.com'])
+    def test_host_is_part_of_the_key(self):
+        Book.objects.create(title='Other Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+        self.client.get('/api/books/?pagination=cursor&page_size=1', HTTP_HOST='one.example.com')
+        response = self.client.get('/api/books/?pagination=cursor&page_size=1', HTTP_HOST='two.example.com')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.data['next'].startswith('http://two.example.com/'))
+
+    def test_responses_are_cached_per_user(self):
+        self.user.favourite_books.add(self.book)
+        self.client.force_authenticate(user=self.user)
+        self.assertTrue(self.client.get(f'/api/books/{self.book.pk}/').data['is_favourited'])
+        self.client.force_authenticate(user=None)
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertFalse(response.data['is_favourited'])
+
+    def test_invalidation_after_commit(self):
+        self.client.get('/api/books/')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Book.objects.create(title='New Book', author='Test Author', creator=self.user, publicationYear=2022,
+                isbn='1234567890')
+        # The invalidation, and the book.created event.
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(self.client.get('/api/books/').data['count'], 2)
+
+    def test_cache_stats(self):
+        self.client.get('/api/books/')
+        self.client.get('/api/books/')
+        admin = User.objects.create_user(username='admin', password='testpassword', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/books/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['hits'], 1)
+        self.assertGreaterEqual(response.data['misses'], 1)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/books/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BookConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+        self.detail_url = f'/api/books/{self.book.pk}/'
+
+    def get_etag(self, url):
+        clear_caches()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response['ETag']
+
+    def test_if_none_match_returns_304(self):
+        for url in ['/api/books/', self.detail_url]:
+            etag = self.get_etag(url)
+            clear_caches()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_304_from_cache_runs_no_queries(self):
+        etag = self.get_etag(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_matches_between_full_and_narrow_responses(self):
+        self.user.favourite_books.add(self.book)
+        self.client.force_authenticate(user=self.user)
+        for url in ['/api/books/', '/api/books/?pagination=cursor', '/api/favourites/', self.detail_url]:
+            etag = self.get_etag(url)
+            clear_caches()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+
+    def test_etag_changes_with_the_book(self):
+        etag = self.get_etag(self.detail_url)
+        list_etag = self.get_etag('/api/books/')
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(self.detail_url, {'title': 'Updated Book'})
+        new_etag = self.get_etag(self.detail_url)
+        self.assertEqual(response['ETag'], new_etag)
+        self.assertNotEqual(new_etag, etag)
+        self.assertNotEqual(self.get_etag('/api/books/'), list_etag)
+
+        self.client.post(f'/api/favourites/{self.book.pk}/')
+        self.assertNotEqual(self.get_etag(self.detail_url), new_etag)
+
+    def test_list_etag_covers_the_page(self):
+        etag = self.get_etag('/api/books/')
+        Book.objects.create(title='New Book', author='Test Author', creator=self.user, publicationYear=2022,
+            isbn='1234567890')
+        self.assertNotEqual(self.get_etag('/api/books/'), etag)
+        self.assertNotEqual(self.get_etag('/api/books/?title=new'), self.get_etag('/api/books/?title=book'))
+
+    def test_if_match(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.get_etag(self.detail_url)
+
+        response = self.client.patch(self.detail_url, {'title': 'Updated Book'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.version, 2)
+
+        # The ETag the client holds is now stale.
+        response = self.client.put(self.detail_url, {'title': 'Other Book', 'author': 'Test Author',
+            'publicationYear': 2022, 'isbn': '1234567890'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        response = self.client.delete(self.detail_url, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'Updated Book')
+
+        response = self.client.delete(self.detail_url, HTTP_IF_MATCH=self.get_etag(self.detail_url))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Book.objects.filter(pk=self.book.pk).exists())
+
+    def test_other_writes_change_the_etag(self):
+        etag = self.get_etag(self.detail_url)
+        self.book.title = 'Saved Book'
+        self.book.save()
+        saved = self.get_etag(self.detail_url)
+        self.assertNotEqual(saved, etag)
+        Book.objects.filter(pk=self.book.pk).update_changed(title='Updated Book')
+        self.assertNotEqual(self.get_etag(self.detail_url), saved)
+
+    def test_default_etag(self):
+        class View(ConditionalGetMixin, generics.RetrieveAPIView):
+            queryset = Book.objects.all()
+            serializer_class = BookSerializer
+
+        request = APIRequestFactory().get(self.detail_url)
+        response = View.as_view()(request, pk=self.book.pk)
+        self.assertEqual(response['ETag'], book_etag(response.renderer_context['request'], self.book))
+        # Without get_etag() the response is built every time.
+        request = APIRequestFactory().get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(View.as_view()(request, pk=self.book.pk).status_code, status.HTTP_200_OK)
+
+
+class AsyncBookViewsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.other_user = User.objects.create_user(username='otheruser', password='testpassword')
+        self.books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='Test Author', creator=self.user, publicationYear=2000 + i, isbn='1234567890')
+            for i in range(8)
+        ])
+        self.user.favourite_books.add(self.books[0], self.books[3])
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def assertSameResponse(self, path):
+        clear_caches()
+        sync_response = self.client.get(f'/api/{path}')
+        clear_caches()
+        async_response = self.client.get(f'/api/async/{path}')
+        self.assertEqual(async_response.status_code, sync_response.status_code, path)
+        expected = json.loads(sync_response.content.decode().replace('/api/', '/api/async/'))
+        self.assertEqual(async_response.json(), expected, path)
+        return async_response
+
+    def test_responses_match_the_sync_views(self):
+        paths = ['books/', 'books/?page=2', 'books/?page=9', 'books/?year_min=2003&author=test',
+            'books/?year_min=abc', f'books/{self.books[0].pk}/', 'books/0/', 'favourites/']
+        for path in paths:
+            self.assertSameResponse(path)
+        self.authenticate()
+        for path in paths:
+            self.assertSameResponse(path)
+
+    def test_cursor_pagination(self):
+        self.authenticate()
+        response = self.assertSameResponse('books/?pagination=cursor&page_size=3')
+        ids = [book['id'] for book in response.json()['results']]
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            ids += [book['id'] for book in response.json()['results']]
+        self.assertEqual(ids, [book.pk for book in self.books])
+        previous = self.client.get(response.json()['previous']).json()
+        self.assertEqual([book['id'] for book in previous['results']], ids[3:6])
+
+    def test_authentication_and_permissions(self):
+        response = self.client.get('/api/async/favourites/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        response = self.client.get('/api/async/books/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+    def test_favourite_book(self):
+        self.authenticate()
+        book = self.books[1]
+        response = self.client.post(f'/api/async/favourites/{book.pk}/')
+        self.assertEqual(response.json(), {"sueccess": True})
+        self.assertTrue(self.user.favourite_books.filter(pk=book.pk).exists())
+        response = self.client.delete(f'/api/async/favourites/{book.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.user.favourite_books.filter(pk=book.pk).exists())
+        response = self.client.post('/api/async/favourites/0/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_favourite_book_error(self):
+        self.authenticate()
+        self.client.raise_request_exception = False
+        with mock.patch('book.async_views.add_favourite', side_effect=DatabaseError('Failed')):
+            response = self.client.post(f'/api/async/favourites/{self.books[1].pk}/')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def test_writes_use_the_sync_views(self):
+        self.authenticate()
+        book = self.books[0]
+        response = self.client.patch(f'/api/async/books/{book.pk}/', {'title': 'Updated Book'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(f'/api/async/books/{book.pk}/').json()['title'], 'Updated Book')
+        response = self.client.post('/api/async/books/', {'title': 'New Book', 'author': 'Test Author',
+            'publicationYear': 2022, 'isbn': '1234567890'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_conditional_get_and_cache(self):
+        for path in ['books/', f'books/{self.books[0].pk}/']:
+            response = self.client.get(f'/api/async/{path}')
+            self.assertEqual(response['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                response = self.client.get(f'/api/async/{path}', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            clear_caches()
+            response = self.client.get(f'/api/async/{path}', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+class SlidingWindowThrottleTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+
+    def check(self, now, rate='4/min'):
+        class Throttle(SlidingWindowThrottle):
+            scope = 'test'
+            THROTTLE_RATES = {'test': rate}
+            timer = staticmethod(lambda: now)
+
+        throttle = Throttle()
+        request = APIRequestFactory().get('/api/books/')
+        request.user = self.user
+        return throttle.allow_request(request, None), throttle
+
+    def test_previous_window_slides_out(self):
+        self.assertEqual([self.check(60)[0] for _ in range(5)], [True] * 4 + [False])
+        # Halfway through the next window half of the previous one still counts.
+        allowed, throttle = self.check(150)
+        self.assertTrue(allowed)
+        allowed, throttle = self.check(150)
+        self.assertTrue(allowed)
+        allowed, throttle = self.check(150)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(throttle.wait(), 15)
+        self.assertTrue(self.check(165)[0])
+
+    def test_full_window_waits_into_the_next(self):
+        for _ in range(4):
+            self.check(60)
+        allowed, throttle = self.check(90)
+        self.assertFalse(allowed)
+        # 30s to the next window, then a quarter of it for one request to slide out.
+        self.assertAlmostEqual(throttle.wait(), 45)
+        self.assertFalse(self.check(134)[0])
+        self.assertTrue(self.check(135)[0])
+
+    def test_counters_are_shared(self):
+        for _ in range(4):
+            self.check(60)
+        # A throttle of another worker sees the same counters.
+        self.assertEqual(caches['throttle'].get(f'throttle:test:{self.user.pk}:1'), 4)
+        self.assertFalse(self.check(60)[0])
+
+    def test_endpoint_scopes(self):
+        for i in range(10):
+            response = self.client.post('/api/books/', {'title': f'Book {i}', 'author': 'Author', 'publicationYear': 2022, 'isbn': '1234567890'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post('/api/books/', {'title': 'Book', 'author': 'Author', 'publicationYear': 2022, 'isbn': '1234567890'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        # Favourites have their own, larger, budget and the user rate is untouched.
+        for _ in range(30):
+            response = self.client.post(f'/api/favourites/{self.book.id}/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/books/').status_code, status.HTTP_200_OK)
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTestCase(TestCase):
+    def test_router(self):
+        router = ReplicaRouter()
+        token = replicas.use_replica('replica1')
+        try:
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(router.db_for_read(Book), 'replica1')
+            # The test case runs in a transaction, which keeps reads on the primary.
+            self.assertEqual(router.db_for_read(Book), 'default')
+            self.assertEqual(router.db_for_write(Book), 'default')
+        finally:
+            replicas.stop_using_replica(token)
+        self.assertFalse(router.allow_migrate('replica1', 'book'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+        # Records where reads would go, but runs them on the test database.
+        self.reads = []
+        patcher = mock.patch.object(
+            ReplicaRouter, 'db_for_read', autospec=True,
+            side_effect=lambda router, model, **hints: self.reads.append(replicas._read_from.get()) or 'default',
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_safe_requests_read_from_a_replica(self):
+        self.assertEqual(self.client.get('/api/books/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(f'/api/books/{self.book.id}/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/books/search/?q=test').status_code, status.HTTP_200_OK)
+        self.assertTrue(self.reads)
+        self.assertEqual(set(self.reads), {'replica1'})
+        self.assertFalse(replicas.replica_in_use())
+
+    def test_replica_is_reset_after_errors(self):
+        with mock.patch('book.views.BookListCreateView.get_queryset', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.get('/api/books/')
+        self.assertFalse(replicas.replica_in_use())
+
+    def test_writers_read_from_the_primary(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get('/api/favourites/')
+        self.assertEqual(set(self.reads), {'replica1'})
+
+        self.reads.clear()
+        self.client.post(f'/api/favourites/{self.book.id}/')
+        self.client.get('/api/favourites/')
+        self.client.get('/api/async/books/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(set(self.reads), {None})
+
+        # Other users still read from the replicas.
+        self.reads.clear()
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.client.get('/api/async/books/', HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        # Authentication reads the user before a replica is picked.
+        self.assertEqual(self.reads[0], None)
+        self.assertEqual(set(self.reads[1:]), {'replica1'})
+
+    def test_writes_and_creators(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/books/', {'title': 'Book', 'author': 'Author', 'publicationYear': 2022, 'isbn': '1234567890'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.reads.clear()
+        self.client.get(f'/api/books/{response.data["id"]}/')
+        self.assertEqual(set(self.reads), {None})
+
+        # Once the user is no longer sticky, the response is not cached yet either.
+        clear_caches()
+        self.reads.clear()
+        self.client.get(f'/api/books/{response.data["id"]}/')
+        self.assertEqual(set(self.reads), {'replica1'})
+
+    def test_replica_responses_are_cached_for_the_lag(self):
+        with mock.patch.object(caches['books'], 'set', wraps=caches['books'].set) as cache_set:
+            self.client.get('/api/books/')
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], settings.DATABASE_REPLICA_LAG)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "No replica configured, see PG_DB_REPLICAS.")
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+
+    def test_list_reads_from_the_replica(self):
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+        with mock.patch('random.choice', return_value=replica.alias), CaptureQueriesContext(replica) as queries:
+            response = APIClient().get('/api/books/')
+        self.assertEqual(response.data['count'], 1)
+        self.assertTrue(len(queries))
+
+
+class BookValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.books = [
+            Book.objects.create(title=f'Tést Book {i} \u2028', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+            for i in range(3)
+        ]
+        self.user.favourite_books.add(self.books[1])
+
+    def test_same_data_as_book_serializer(self):
+        self.assertEqual(BookValuesSerializer.fields, tuple(BookSerializer.Meta.fields))
+        for user in (self.user, AnonymousUser()):
+            queryset = Book.objects.with_favourite_state(user)
+            rows = queryset.values(*BookValuesSerializer.values_fields)
+            self.assertEqual(BookValuesSerializer(rows, many=True).data, BookSerializer(queryset, many=True).data)
+        favourites = Book.objects.favourited_by(self.user)
+        self.assertEqual(
+            BookValuesSerializer(favourites.values(*BookValuesSerializer.values_fields), many=True).data,
+            BookSerializer(favourites, many=True).data,
+        )
+
+    def test_same_response_bytes(self):
+        self.client.force_authenticate(user=self.user)
+        for path in ('/api/books/', '/api/books/?pagination=cursor', '/api/favourites/'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            queryset = Book.objects.favourited_by(self.user) if 'favourites' in path else Book.objects.with_favourite_state(self.user)
+            expected = {**response.data, 'results': BookSerializer(queryset, many=True).data}
+            self.assertEqual(response.content, JSONRenderer().render(expected), path)
+
+    def test_async_list(self):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        response = self.client.get('/api/async/books/', **headers)
+        expected = BookSerializer(Book.objects.with_favourite_state(self.user), many=True).data
+        self.assertEqual(json.loads(response.content)['results'], expected)
+        self.assertEqual(response.content, FastJSONRenderer().render(json.loads(response.content)))
+
+
+class SparseFieldsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+        self.user.favourite_books.add(self.book)
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, path, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, **extra)
+        selects = [query['sql'] for query in queries.captured_queries if 'FROM "book_book"' in query['sql']]
+        return response, selects
+
+    def test_list(self):
+        response, selects = self.get('/api/books/?fields=title,id')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'id': self.book.id, 'title': 'Test Book'}])
+        self.assertNotIn('"book_book"."isbn"', selects[-1])
+        self.assertNotIn('"book_book"."author"', selects[-1])
+
+        response = self.client.get('/api/books/?fields=title,id', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_favourites(self):
+        response, selects = self.get('/api/favourites/?fields=id,is_favourited')
+        self.assertEqual(response.data['results'], [{'id': self.book.id, 'is_favourited': True}])
+        self.assertNotIn('"book_book"."title"', selects[-1])
+
+    def test_detail(self):
+        response, selects = self.get(f'/api/books/{self.book.id}/?fields=title')
+        self.assertEqual(response.data, {'title': 'Test Book'})
+        self.assertNotIn('"book_book"."isbn"', selects[-1])
+        self.assertEqual(len(selects), 1)
+        # The ETag is the book's, whatever the fieldset.
+        self.assertEqual(response['ETag'], self.client.get(f'/api/books/{self.book.id}/')['ETag'])
+
+    def test_async(self):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        response = self.client.get('/api/async/books/?fields=id,author', **headers)
+        self.assertEqual(json.loads(response.content)['results'], [{'id': self.book.id, 'author': 'Test Author'}])
+        response = self.client.get(f'/api/async/books/{self.book.id}/?fields=isbn', **headers)
+        self.assertEqual(json.loads(response.content), {'isbn': '1234567890'})
+
+    def test_unknown_fields(self):
+        for path in ('/api/books/?fields=id,secret', f'/api/books/{self.book.id}/?fields=secret', '/api/favourites/?fields=,'):
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, path)
+        self.assertEqual(self.client.get('/api/books/?fields=id,secret').data, {'fields': 'Unknown fields: secret.'})
+        response = self.client.get('/api/async/books/?fields=secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_ignore_fields(self):
+        response = self.client.patch(f'/api/books/{self.book.id}/?fields=title', {'author': 'Other'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['author'], 'Other')
+
+
+class BookChangesTestCase(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(title=f'Test Book {i}', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+            for i in range(3)
+        ]
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/books/changes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def summary(self, data):
+        return [(change['type'], change['id']) for change in data['changes']]
+
+    def test_sync(self):
+        first = self.changes(page_size=2)
+        self.assertEqual(self.summary(first), [('upsert', book.id) for book in self.books[:2]])
+        self.assertTrue(first['has_more'])
+        self.assertEqual(first['changes'][0]['book'], BookSerializer(Book.objects.with_favourite_state(self.user).get(pk=self.books[0].id)).data)
+        second = self.changes(first['next'], page_size=2)
+        self.assertEqual(self.summary(second), [('upsert', self.books[2].id)])
+        self.assertFalse(second['has_more'])
+
+        self.client.patch(f'/api/books/{self.books[0].id}/', {'title': 'Changed'})
+        self.client.delete(f'/api/books/{self.books[1].id}/')
+        self.client.post(f'/api/favourites/{self.books[2].id}/')
+        third = self.changes(second['next'])
+        self.assertEqual(self.summary(third), [
+            ('upsert', self.books[0].id), ('delete', self.books[1].id), ('upsert', self.books[2].id),
+        ])
+        self.assertEqual(third['changes'][0]['book']['title'], 'Changed')
+        self.assertEqual(third['changes'][2]['book']['favourite_count'], 1)
+        self.assertTrue(third['changes'][2]['book']['is_favourited'])
+
+        # Nothing changed since.
+        last = self.changes(third['next'])
+        self.assertEqual(last['changes'], [])
+        self.assertEqual(last['next'], third['next'])
+
+    def test_waits_for_running_transactions(self):
+        start = self.changes()
+        started, done = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Book.objects.filter(pk=self.books[0].pk).update_changed(title='Slow')
+                    started.set()
+                    done.wait(5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        started.wait(5)
+        # Committed, but after a transaction that is still running.
+        Book.objects.filter(pk=self.books[1].pk).update_changed(title='Fast')
+        self.assertEqual(self.changes(start['next'])['changes'], [])
+
+        done.set()
+        writer.join()
+        data = self.changes(start['next'])
+        self.assertEqual(self.summary(data), [('upsert', self.books[0].id), ('upsert', self.books[1].id)])
+
+    def test_cascades_leave_tombstones(self):
+        start = self.changes()
+        self.user.delete()
+        self.client.force_authenticate(user=None)
+        data = self.changes(start['next'])
+        self.assertEqual(sorted(self.summary(data)), [('delete', book.id) for book in self.books])
+
+    def test_fields(self):
+        data = self.changes(fields='id,title', page_size=1)
+        self.assertEqual(data['changes'][0]['book'], {'id': self.books[0].id, 'title': 'Test Book 0'})
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/books/changes/', {'since': 'not a token'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'since': 'Invalid token.'})
+
+
+class BookEventsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.book = Book.objects.create(
+            title='Test Book', author='Test Author', creator=self.user, publicationYear=2000, isbn='1234567890',
+        )
+
+    def subscribe(self, user_id=None):
+        subscription = events.hub.subscribe(user_id)
+        self.addCleanup(events.hub.unsubscribe, subscription)
+        return subscription
+
+    async def test_favourite_events_go_to_their_user(self):
+        user, other, anonymous = self.subscribe(self.user.pk), self.subscribe(self.user.pk + 1), self.subscribe()
+        events.hub.deliver({'type': 'book.updated', 'ids': [1]})
+        events.hub.deliver({'type': 'favourite.added', 'ids': [1], 'user': self.user.pk})
+        self.assertEqual([event.type for event in await user.get()], ['book.updated', 'favourite.added'])
+        self.assertEqual([event.type for event in await other.get()], ['book.updated'])
+        self.assertEqual([event.type for event in await anonymous.get()], ['book.updated'])
+
+    async def test_slow_subscribers_overflow(self):
+        with override_settings(BOOK_EVENTS_QUEUE_SIZE=2):
+            subscription = self.subscribe()
+        for book_id in range(3):
+            events.hub.deliver({'type': 'book.updated', 'ids': [book_id]})
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual(await subscription.get(), [])
+
+    async def test_deliver_from_another_thread(self):
+        subscription = self.subscribe()
+        thread = threading.Thread(target=events.hub.deliver, args=({'type': 'book.deleted', 'ids': [1]},))
+        thread.start()
+        [event] = await asyncio.wait_for(subscription.get(), 5)
+        self.assertEqual((event.type, event.ids), ('book.deleted', [1]))
+        thread.join()
+
+    def test_changes_are_published_on_commit(self):
+        published = []
+        self.client.force_authenticate(user=self.user)
+        with mock.patch.object(events.hub, 'publish', published.append):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/books/', {
+                    'title': 'New', 'author': 'Author', 'publicationYear': 2001, 'isbn': '1234567890',
+                })
+            created = response.data['id']
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/books/{self.book.pk}/', {'title': 'Changed'})
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/api/favourites/{self.book.pk}/')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(f'/api/books/{created}/')
+        self.assertEqual(published, [
+            {'type': 'book.created', 'ids': [created]},
+            {'type': 'book.updated', 'ids': [self.book.pk]},
+            {'type': 'favourite.added', 'ids': [self.book.pk], 'user': self.user.pk},
+            {'type': 'book.updated', 'ids': [self.book.pk]},
+            {'type': 'book.deleted', 'ids': [created]},
+        ])
+
+    def test_large_changes_are_split(self):
+        published = []
+        with mock.patch.object(events.hub, 'publish', published.append):
+            with self.captureOnCommitCallbacks(execute=True):
+                events.publish('book.created', range(events.MAX_IDS + 1))
+        self.assertEqual([len(event['ids']) for event in published], [events.MAX_IDS, 1])
+
+    async def read(self, response):
+        """
+        Reads the stream in a task, cancelled like the server does when the
+        client disconnects.
+        """
+        chunks = asyncio.Queue()
+
+        async def reader():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk)
+
+        return chunks, asyncio.create_task(reader())
+
+    async def disconnect(self, task):
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual(events.hub.subscriptions, set())
+        self.assertIsNone(events.hub.heartbeat)
+
+    async def test_event_stream(self):
+        response = await self.async_client.get('/api/events/', {'access_token': self.token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks, task = await self.read(response)
+        try:
+            self.assertEqual(await asyncio.wait_for(chunks.get(), 5), b'retry: 3000\n\n')
+            events.hub.publish({'type': 'book.updated', 'ids': [1, 2]})
+            events.hub.publish({'type': 'favourite.removed', 'ids': [2], 'user': self.user.pk})
+            events.hub.publish({'type': 'favourite.added', 'ids': [3], 'user': self.user.pk + 1})
+            self.assertEqual(await asyncio.wait_for(chunks.get(), 5), (
+                b'event: book.updated\ndata: {"ids": [1, 2]}\n\n'
+                b'event: favourite.removed\ndata: {"ids": [2]}\n\n'
+            ))
+        finally:
+            await self.disconnect(task)
+
+    async def test_keep_alive(self):
+        with override_settings(BOOK_EVENTS_HEARTBEAT=0.01):
+            response = await self.async_client.get('/api/events/')
+            chunks, task = await self.read(response)
+            try:
+                await asyncio.wait_for(chunks.get(), 5)
+                self.assertEqual(await asyncio.wait_for(chunks.get(), 5), b': keep-alive\n\n')
+            finally:
+                await self.disconnect(task)
+
+    async def test_invalid_token(self):
+        response = await self.async_client.get('/api/events/', headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_too_many_subscribers(self):
+        with override_settings(BOOK_EVENTS_MAX_SUBSCRIBERS=0):
+            response = await self.async_client.get('/api/events/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    async def test_streams_never_started_unsubscribe(self):
+        stream = events.event_stream(events.hub.subscribe(self.user.pk))
+        self.assertEqual(len(events.hub.subscriptions), 1)
+        del stream
+        self.assertEqual(events.hub.subscriptions, set())
+
+    async def test_streams_end_once_unsubscribed(self):
+        subscription = events.hub.subscribe(self.user.pk)
+        stream = events.event_stream(subscription)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        events.hub.unsubscribe(subscription)
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(stream), 5)
+
+    async def test_heartbeat_of_another_loop_is_cancelled(self):
+        heartbeat = mock.Mock()
+        with mock.patch.object(events.hub, 'loop', object()), mock.patch.object(events.hub, 'heartbeat', heartbeat):
+            self.subscribe()
+        heartbeat.cancel.assert_called_once_with()
+
+    async def test_streams_are_served_without_a_thread_of_their_own(self):
+        from myBookList import asgi
+
+        scope = {'type': 'http', 'path': '/api/events/'}
+        with mock.patch.object(asgi.django_application, 'handle', mock.AsyncMock()) as handle:
+            await asgi.application(scope, None, None)
+        handle.assert_awaited_once_with(scope, None, None)
+
+    async def websocket(self, path='/api/events/', headers=()):
+        received, sent = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': path, 'query_string': b'', 'headers': list(headers)}
+        task = asyncio.create_task(events_websocket(scope, received.get, sent.put))
+        await received.put({'type': 'websocket.connect'})
+        return received, sent, task
+
+    async def test_websocket(self):
+        received, sent, task = await self.websocket()
+        self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.accept'})
+        events.hub.publish({'type': 'book.created', 'ids': [1]})
+        message = await asyncio.wait_for(sent.get(), 5)
+        self.assertEqual(json.loads(message['text']), {'type': 'book.created', 'ids': [1]})
+
+        await received.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(task, 5)
+        self.assertEqual(events.hub.subscriptions, set())
+
+    async def test_websocket_invalid_token(self):
+        received, sent, task = await self.websocket(headers=[(b'authorization', b'Bearer invalid')])
+        self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.close', 'code': 4401})
+        await task
+
+    async def test_websocket_unknown_path(self):
+        received, sent, task = await self.websocket(path='/api/books/')
+        self.assertEqual(await asyncio.wait_for(sent.get(), 5), {'type': 'websocket.close', 'code': 4404})
+        await task
+
+
+class PostgresBrokerTestCase(TransactionTestCase):
+    def test_events_go_through_the_database(self):
+        delivered = []
+        received = threading.Event()
+
+        def deliver(event):
+            delivered.append(event)
+            received.set()
+
+        broker = events.PostgresBroker(deliver)
+        broker.poll_interval = 0.1
+        broker.start()
+        self.addCleanup(broker.stop)
+        self.assertTrue(broker.listening.wait(5))
+        with transaction.atomic():
+            broker.publish({'type': 'book.deleted', 'ids': [1]})
+            # Notifications are sent on commit.
+            self.assertFalse(received.wait(0.2))
+        self.assertTrue(received.wait(5))
+        self.assertEqual(delivered, [{'type': 'book.deleted', 'ids': [1]}])
+
+
+class RecommendationsTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.addCleanup(clear_caches)
+        self.client = APIClient()
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpassword') for i in range(4)]
+        self.books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='Test Author', creator=self.users[0], publicationYear=2000, isbn='1234567890')
+            for i in range(5)
+        ])
+        b = [book.pk for book in self.books]
+        update_favourites(self.users[0], add=[b[0], b[1], b[2]])
+        update_favourites(self.users[1], add=[b[0], b[1]])
+        update_favourites(self.users[2], add=[b[0], b[2]])
+        update_favourites(self.users[3], add=[b[3]])
+
+    def build(self, *args):
+        out = StringIO()
+        call_command('build_recommendations', *args, stdout=out)
+        return out.getvalue()
+
+    def neighbours(self, book):
+        return [
+            (row['neighbour_id'], round(row['score'], 3))
+            for row in BookNeighbour.objects.filter(book=book).order_by('rank').values('neighbour_id', 'score')
+        ]
+
+    def test_cosine_similarity(self):
+        self.assertIn("Built the neighbours of 5 books", self.build())
+        b = self.books
+        # 2 common fans, over sqrt(3 * 2) favourites.
+        self.assertEqual(self.neighbours(b[0]), [(b[1].pk, 0.816), (b[2].pk, 0.816)])
+        self.assertEqual(self.neighbours(b[1]), [(b[0].pk, 0.816), (b[2].pk, 0.5)])
+        self.assertEqual(self.neighbours(b[3]), [])
+        self.assertEqual(self.neighbours(b[4]), [])
+
+    def test_options(self):
+        self.build('--neighbours', '1', '--batch-size', '2')
+        self.assertEqual(self.neighbours(self.books[0]), [(self.books[1].pk, 0.816)])
+        # Without user0 and their 3 favourites, in the common fans and in the
+        # favourite counts: 1 common fan over sqrt(1 * 2) favourites.
+        self.build('--max-user-favourites', '2')
+        self.assertEqual(self.neighbours(self.books[1]), [(self.books[0].pk, 0.707)])
+        self.build('--min-common', '2')
+        self.assertEqual(self.neighbours(self.books[1]), [(self.books[0].pk, 0.816)])
+
+    def test_rebuild_replaces_neighbours(self):
+        self.build()
+        update_favourites(self.users[0], remove=[self.books[2].pk])
+        self.build()
+        self.assertEqual(self.neighbours(self.books[2]), [(self.books[0].pk, 0.577)])
+
+    def test_book_recommendations(self):
+        self.build()
+        response = self.client.get(f'/api/books/{self.books[1].pk}/recommendations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['id'] for book in response.data['results']], [self.books[0].pk, self.books[2].pk])
+        self.assertEqual(response.data['results'][0], BookSerializer(Book.objects.get(pk=self.books[0].pk)).data)
+
+        response = self.client.get(f'/api/books/{self.books[1].pk}/recommendations/', {'limit': 1, 'fields': 'id,title'})
+        self.assertEqual(response.data['results'], [{'id': self.books[0].pk, 'title': 'Book 0'}])
+        response = self.client.get('/api/books/999999/recommendations/')
+        self.assertEqual(response.data['results'], [])
+
+    def test_user_recommendations(self):
+        self.build()
+        self.assertEqual(self.client.get('/api/recommendations/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.users[1])
+        response = self.client.get('/api/recommendations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Neighbour of both favourites, the favourites themselves are left out.
+        self.assertEqual([book['id'] for book in response.data['results']], [self.books[2].pk])
+        self.assertFalse(response.data['results'][0]['is_favourited'])
+
+    def test_deleted_books_leave_the_neighbours(self):
+        self.build()
+        self.books[1].delete()
+        self.assertEqual(self.neighbours(self.books[0]), [(self.books[2].pk, 0.816)])
+
+
+class IncrementalRecommendationsTestCase(TransactionTestCase):
+    def test_only_changed_books_are_rebuilt(self):
+        user, other = User.objects.create_user(username='user'), User.objects.create_user(username='other')
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author='Test Author', creator=user, publicationYear=2000, isbn='1234567890')
+            for i in range(3)
+        ])
+        update_favourites(user, add=[books[0].pk, books[1].pk])
+        out = StringIO()
+        call_command('build_recommendations', '--changed', stdout=out)
+        self.assertIn("Built the neighbours of 3 books", out.getvalue())
+
+        update_favourites(other, add=[books[0].pk, books[2].pk])
+        out = StringIO()
+        call_command('build_recommendations', '--changed', stdout=out)
+        # And books[1], whose score for books[0] changed.
+        self.assertIn("Built the neighbours of 3 books", out.getvalue())
+        self.assertEqual(
+            list(BookNeighbour.objects.filter(book=books[2]).values_list('neighbour_id', flat=True)), [books[0].pk],
+        )
+        # 1 common fan over sqrt(1 * 2) favourites.
+        self.assertEqual(round(BookNeighbour.objects.get(book=books[1]).score, 3), 0.707)
+        self.assertEqual(list(RecommendationBuild.objects.values_list('incremental', flat=True).order_by('id')), [False, True])
@@ -1,9 +1,19 @@
 from django.urls import path 
-from .views import BookListCreateView, BookRetrieveUpdateDestroyView, UserFavouriteBooksView, FavouriteBook
+from .views import BookListCreateView, BookRetrieveUpdateDestroyView, BookSearchView, BookImportView, BookExportView, BookCacheStatsView, UserFavouriteBooksView, FavouriteBook, BulkFavouriteBooks, BookChangesView, BookRecommendationsView, UserRecommendationsView
+from .async_views import BookEventsView
 
 urlpatterns = [
     path('books/', BookListCreateView.as_view(), name="get-books-list"),
+    path('books/import/', BookImportView.as_view(), name="import-books"),
+    path('books/export/', BookExportView.as_view(), name="export-books"),
+    path('books/cache-stats/', BookCacheStatsView.as_view(), name="book-cache-stats"),
+    path('books/search/', BookSearchView.as_view(), name="search-books"),
+    path('books/changes/', BookChangesView.as_view(), name="book-changes"),
     path('books/<int:pk>/', BookRetrieveUpdateDestroyView.as_view(), name="get-update-delete-book"),
+    path('books/<int:pk>/recommendations/', BookRecommendationsView.as_view(), name="book-recommendations"),
+    path('events/', BookEventsView.as_view(), name="book-events"),
+    path('recommendations/', UserRecommendationsView.as_view(), name="user-recommendations"),
     path('favourites/', UserFavouriteBooksView.as_view(), name="get-favourite-books"),
+    path('favourites/bulk/', BulkFavouriteBooks.as_view(), name="bulk-favourite-books"),
     path('favourites/<int:book_id>/', FavouriteBook.as_view(), name="favourite-book"),
 ]
@@ -1,16 +1,42 @@
+import codecs
+
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 # This is the model that we will use
-from .models import Book
+from .models import Book, SEARCH_CONFIG
 # This is the serializer that we will use
-from .serializers import BookSerializer
+from .serializers import (
+    HEADLINE_START, HEADLINE_STOP, BookSerializer, BookSearchSerializer, BookValuesSerializer, BulkFavouriteSerializer,
+    requested_fields,
+)
+from .pagination import BookCursorPagination, BookSearchPagination
+from .filters import BookFilterBackend
+from .favourites import add_favourite, remove_favourite, update_favourites
+from .importers import BookImporter, read_rows
+from .exporters import aexport_chunks, aexport_rows, export_chunks, export_rows
+from .renderers import CSVRenderer, NDJSONRenderer
+from .cache import CachedResponseMixin
+from .conditional import ConditionalListMixin, ConditionalObjectMixin
+from .changes import changes_since, decode_token, encode_token
+from .recommendations import recommended_books, similar_books
+from . import cache
+from myBookList.db.replicas import ReplicaReadMixin, stick_to_primary
 
 from rest_framework import generics
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import permissions
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import CharField, F, FloatField, Func, Value
+from django.db.models.functions import Cast, Collate, Concat, LPad
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import _positive_int
 
 from rest_framework.views import APIView
 class IsCreator(permissions.BasePermission):
@@ -19,11 +45,69 @@ class IsCreator(permissions.BasePermission):
     """
     def has_object_permission(self, request, view, obj):
         # Write permissions are only allowed to the creator of the book.
-        return obj.creator == request.user
+        # Compared by id, obj.creator would load the user again.
+        return obj.creator_id == request.user.pk
     
-class BookListCreateView(generics.ListCreateAPIView):
+class SparseFieldsMixin:
+    """
+    ``?fields=id,title`` on GET, only those fields are serialized. The views
+    load only their columns, along with the ones the ETags need. The ETag
+    of a book stays the same for every fieldset, so If-Match works with any.
+    """
+    sparse_fields = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.sparse_fields = requested_fields(request)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields is not None:
+            kwargs['fields'] = self.sparse_fields
+        return super().get_serializer(*args, **kwargs)
+
+
+class ValuesListMixin(SparseFieldsMixin):
+    """
+    Serializes GET lists with BookValuesSerializer, from ``.values()`` rows
+    instead of model instances.
+    """
+    values_serializer_class = BookValuesSerializer
+
+    def get_serializer_class(self):
+        if self.request.method in ('GET', 'HEAD'):
+            return self.values_serializer_class
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        values_fields = self.values_serializer_class.values_fields_for(self.sparse_fields)
+        queryset = self.filter_queryset(self.get_queryset()).values(*values_fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+
+class BookListCreateView(ReplicaReadMixin, CachedResponseMixin, ConditionalListMixin, ValuesListMixin, generics.ListCreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    filter_backends = [BookFilterBackend]
+    throttle_scope = {'POST': 'book-create'}
+
+    def get_queryset(self):
+        return Book.objects.with_favourite_state(self.request.user)
+
+    @property
+    def paginator(self):
+        # Clients opt into keyset pagination with ?pagination=cursor, and keep
+        # using it by following the cursor links returned in the response.
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = BookCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
 
     def get_permissions(self):
         if self.request.method == 'POST':
@@ -33,38 +117,221 @@ class BookListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         if serializer.is_valid():
             serializer.save(creator=self.request.user)
+            stick_to_primary(self.request.user)
 
-    
-class BookRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+
+
+class BookImportView(APIView):
+    """
+    Bulk import of books sent as CSV (text/csv) or JSON Lines
+    (application/x-ndjson). The body is validated and inserted while it is
+    being read, and invalid rows are reported without aborting the import.
+    """
+    permission_classes = [IsAuthenticated]
+    formats = {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'jsonl',
+        'application/jsonl': 'jsonl',
+    }
+    max_batch_size = 5000
+
+    def post(self, request):
+        fmt = self.formats.get(request.content_type.split(';')[0].strip())
+        if fmt is None:
+            return Response(
+                {"error": f"Content type must be one of {', '.join(self.formats)}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        try:
+            batch_size = min(int(request.query_params.get('batch_size', 1000)), self.max_batch_size)
+        except ValueError:
+            return Response({"batch_size": "A valid integer is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # request.stream is read line by line, the body is never loaded whole.
+        lines = codecs.iterdecode(request.stream or [], 'utf-8')
+        importer = BookImporter(request.user, batch_size=max(batch_size, 1))
+        try:
+            importer.run(read_rows(lines, fmt))
+        except UnicodeDecodeError:
+            importer.add_error(None, ["The body must be UTF-8 encoded."])
+        if importer.created:
+            stick_to_primary(request.user)
+        return Response({
+            "created": importer.created,
+            "failed": importer.failed,
+            "errors": importer.errors,
+        }, status=status.HTTP_200_OK)
+
+
+class BookExportView(generics.GenericAPIView):
+    """
+    Streams the whole catalog, or the part matching the list filters, as
+    NDJSON (?format=ndjson, the default) or CSV (?format=csv). Under ASGI
+    the rows are read with the async ORM, see aexport_chunks().
+    """
+    queryset = Book.objects.all()
+    permission_classes = [IsAuthenticated]
+    filter_backends = [BookFilterBackend]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    chunk_size = 2000
+
+    def get(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        fmt = request.accepted_renderer.format
+        if isinstance(request._request, ASGIRequest):
+            chunks = aexport_chunks(aexport_rows(queryset, self.chunk_size), fmt, chunk_size=self.chunk_size)
+        else:
+            chunks = export_chunks(export_rows(queryset, self.chunk_size), fmt, chunk_size=self.chunk_size)
+        response = StreamingHttpResponse(chunks, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="books.{fmt}"'
+        return response
+
+
+class BookSearchView(ReplicaReadMixin, generics.ListAPIView):
+    serializer_class = BookSearchSerializer
+    pagination_class = BookSearchPagination
+
+    def get_queryset(self):
+        q = self.request.query_params.get('q', '').strip()
+        if not q:
+            raise ValidationError({"q": "This query parameter is required."})
+        query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+        return Book.objects.with_favourite_state(self.request.user).filter(search_vector=query).annotate(
+            # ts_rank returns a real, cast it so the cursor position round trips exactly.
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+            # Unique, so the cursor positions never fall between books of the
+            # same rank, see BookSearchPagination.
+            rank_key=Collate(
+                Concat(
+                    Func(F('rank'), Value('FM000000.000000000'), function='to_char', output_field=CharField()),
+                    LPad(Cast('id', CharField()), 20, Value('0')),
+                ),
+                'C',
+            ),
+            # Marked with HEADLINE_START/STOP, the serializer escapes the text.
+            headline=SearchHeadline(
+                Concat('title', Value(' by '), 'author'), query,
+                config=SEARCH_CONFIG, start_sel=HEADLINE_START, stop_sel=HEADLINE_STOP,
+            ),
+        )
+
+
+
+class BookChangesView(ReplicaReadMixin, APIView):
+    """
+    Books created, updated or deleted since ``?since=<token>``, see
+    book.changes. Clients start without ``since`` and pass the ``next``
+    token of every response to the following request, until ``has_more`` is
+    false, then poll with the last one. Takes ``page_size`` and ``fields``.
+    """
+    page_size = 100
+    max_page_size = 1000
+
+    def get(self, request):
+        fields = requested_fields(request)
+        position = decode_token(request.query_params.get('since'))
+        try:
+            limit = _positive_int(request.query_params['page_size'], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            limit = self.page_size
+        changes, position, has_more = changes_since(request.user, position, limit, fields)
+        return Response({'changes': changes, 'next': encode_token(position), 'has_more': has_more})
+
+
+class RecommendationsView(ReplicaReadMixin, APIView):
+    """
+    Recommended books, see book.recommendations. Takes ``limit`` and
+    ``fields``.
+    """
+    limit = 10
+    max_limit = 100
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params['limit'], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            return self.limit
+
+    def respond(self, books, fields):
+        return Response({'results': BookValuesSerializer(books, many=True, fields=fields).data})
+
+
+class BookRecommendationsView(RecommendationsView):
+    """
+    The books most similar to this one by who favourited them, none for
+    books without favourites or that do not exist.
+    """
+    max_limit = settings.BOOK_RECOMMENDATIONS_NEIGHBOURS
+
+    def get(self, request, pk):
+        fields = requested_fields(request)
+        return self.respond(similar_books(request.user, pk, self.get_limit(request), fields), fields)
+
+
+class UserRecommendationsView(RecommendationsView):
+    """
+    The books most similar to the user's favourites.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        fields = requested_fields(request)
+        return self.respond(recommended_books(request.user, self.get_limit(request), fields), fields)
+
+
+class BookRetrieveUpdateDestroyView(ReplicaReadMixin, CachedResponseMixin, ConditionalObjectMixin, SparseFieldsMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     partial = True
     lookup_field = 'pk'
 
+    def get_queryset(self):
+        queryset = Book.objects.with_favourite_state(self.request.user)
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Held until the write commits, so If-Match is checked against
+            # the version that gets updated.
+            queryset = queryset.select_for_update(of=('self',))
+        elif self.sparse_fields is not None:
+            queryset = queryset.only(*BookSerializer.only_fields(self.sparse_fields))
+        return queryset
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        stick_to_primary(self.request.user)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        stick_to_primary(self.request.user)
+
     def get_permissions(self):
         if self.request.method == 'PUT' or self.request.method == 'DELETE' or self.request.method == 'PATCH':
             return [IsAuthenticated(), IsCreator()]
         return super().get_permissions()
 
     def destroy(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.perform_destroy(instance)
+        with transaction.atomic():
+            instance = self.get_object()
+            self.perform_destroy(instance)
         return Response(status=status.HTTP_200_OK, data={"message": "Book deleted successfully."})
     
 
-class UserFavouriteBooksView(generics.ListAPIView):
+class UserFavouriteBooksView(ReplicaReadMixin, ConditionalListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
-        return self.request.user.favourite_books.all()
+        return Book.objects.favourited_by(self.request.user)
     
 class FavouriteBook(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'favourite'
 
     def post(self, request, book_id):
         try:
-            book = Book.objects.get(id=book_id)
-            request.user.favourite_books.add(book)
+            add_favourite(request.user, book_id)
             return Response({"sueccess": True}, status=status.HTTP_200_OK)
         except Book.DoesNotExist:
             return Response({"sueccess": False, "error": "The book Requested does not exist"}, status=status.HTTP_400_BAD_REQUEST)
@@ -73,10 +340,35 @@ class FavouriteBook(APIView):
 
     def delete(self, request, book_id):
         try:
-            book = Book.objects.get(id=book_id)
-            request.user.favourite_books.remove(book)
+            remove_favourite(request.user, book_id)
             return Response({"sueccess": True}, status=status.HTTP_200_OK)
         except Book.DoesNotExist:
             return Response({"sueccess": False, "error": "The book Requested does not exist"}, status=status.HTTP_400_BAD_REQUEST)
         except:
             return Response({"sueccess": False}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BulkFavouriteBooks(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFavouriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = update_favourites(
+            request.user,
+            add=serializer.validated_data.get('add', []),
+            remove=serializer.validated_data.get('remove', []),
+        )
+        return Response({
+            "added": changes.added,
+            "removed": changes.removed,
+            "unchanged": changes.unchanged,
+            "failed": [{"id": book_id, "error": error} for book_id, error in sorted(changes.failed.items())],
+        }, status=status.HTTP_200_OK)
+
+
+class BookCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache.stats())
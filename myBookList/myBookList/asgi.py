@@ -9,8 +9,41 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myBookList.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+def check_connections(databases):
+    # Each request runs its sync code in a thread of its own, persistent
+    # connections would be left open by every request until max_connections.
+    if any(database['CONN_MAX_AGE'] != 0 for database in databases.values()):
+        raise ImproperlyConfigured(
+            "Persistent connections do not work under ASGI, set PG_DB_POOL instead of PG_DB_CONN_MAX_AGE."
+        )
+
+
+check_connections(settings.DATABASES)
+
+# Imported once Django is set up.
+from django.urls import reverse  # noqa: E402
+
+from book.async_views import events_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django serves HTTP only, WebSocket connections get the book events.
+    if scope['type'] == 'websocket':
+        return await events_websocket(scope, receive, send)
+    if scope['path'] == reverse('book-events'):
+        # Outside of the ThreadSensitiveContext ASGIHandler.__call__() gives
+        # each request: its thread would be kept, idle, for as long as the
+        # stream stays open. The sync code of the streams (middleware,
+        # authentication) runs in asgiref's single sync thread instead,
+        # shared by all of them.
+        return await django_application.handle(scope, receive, send)
+    return await django_application(scope, receive, send)
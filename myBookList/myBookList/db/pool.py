@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Keeps database connections open between uses.
+
+    At most ``max_size`` connections are checked out at a time, getconn()
+    waits up to ``timeout`` seconds for one to be returned and raises
+    PoolTimeout after that. Idle connections are closed once they have
+    been idle for ``max_idle`` seconds, and checked with ``check`` before
+    reuse when they have been idle for ``check_after`` seconds.
+    """
+
+    def __init__(self, max_size, timeout, max_idle, check_after, check):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.check = check
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.counters = dict.fromkeys((
+            'checkouts', 'connections_opened', 'connections_closed',
+            'failed_checks', 'timeouts', 'checkout_seconds_total',
+        ), 0)
+        self.checkout_seconds_max = 0
+
+    def getconn(self, connect):
+        """
+        Returns an idle connection, or a new one from ``connect()``.
+        """
+        started = time.monotonic()
+        with self.lock:
+            self.waiting += 1
+        acquired = self.slots.acquire(timeout=self.timeout)
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.counters['timeouts'] += 1
+        if not acquired:
+            raise PoolTimeout(f"No connection available within {self.timeout} seconds.")
+
+        try:
+            connection = self.take_idle()
+            if connection is None:
+                connection = connect()
+                with self.lock:
+                    self.counters['connections_opened'] += 1
+        except BaseException:
+            self.slots.release()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.in_use += 1
+            self.counters['checkouts'] += 1
+            self.counters['checkout_seconds_total'] += elapsed
+            self.checkout_seconds_max = max(self.checkout_seconds_max, elapsed)
+        return connection
+
+    def take_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                # The most recently returned one, the others can age out.
+                connection, returned_at = self.idle.pop()
+            idle_for = time.monotonic() - returned_at
+            if connection.closed or idle_for > self.max_idle:
+                self.discard(connection)
+            elif idle_for >= self.check_after and not self.check(connection):
+                with self.lock:
+                    self.counters['failed_checks'] += 1
+                self.discard(connection)
+            else:
+                return connection
+
+    def putconn(self, connection, reusable=True):
+        try:
+            if reusable and not connection.closed:
+                with self.lock:
+                    self.idle.append((connection, time.monotonic()))
+            else:
+                self.discard(connection)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.lock:
+            self.counters['connections_closed'] += 1
+
+    def close(self):
+        """
+        Closes the idle connections, checked out ones are closed when they
+        are returned.
+        """
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for connection, returned_at in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                **self.counters,
+                'checkout_seconds_max': self.checkout_seconds_max,
+            }
@@ -0,0 +1,110 @@
+"""
+PostgreSQL backend that takes its connections from an in-process
+ConnectionPool, configured with OPTIONS['pool'] like the pool of Django 5.1:
+
+    'OPTIONS': {'pool': {'max_size': 10, 'timeout': 10, 'max_idle': 600, 'check_after': 5}}
+
+Closing the connection, at the end of every request with CONN_MAX_AGE = 0,
+returns it to the pool instead.
+"""
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseDatabaseCreation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from ..pool import ConnectionPool, PoolTimeout
+
+
+POOL_DEFAULTS = {'max_size': 10, 'timeout': 10, 'max_idle': 600, 'check_after': 5}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # The check may have started a transaction.
+        connection.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def pool_stats():
+    """
+    Statistics of every pool of this process, by alias and database name.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {f'{alias}:{name}': pool.stats() for (alias, name), pool in pools}
+
+
+def close_pools(name=None):
+    """
+    Closes the idle connections of the pools, or only those to the database
+    ``name``.
+    """
+    with _pools_lock:
+        pools = [pool for (alias, pool_name), pool in _pools.items() if name is None or pool_name == name]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the database from being dropped.
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured("Pooled connections need CONN_MAX_AGE = 0.")
+
+    @property
+    def pool(self):
+        key = (self.alias, self.settings_dict['NAME'])
+        with _pools_lock:
+            if key not in _pools:
+                options = {**POOL_DEFAULTS, **self.settings_dict['OPTIONS'].get('pool', {})}
+                _pools[key] = ConnectionPool(check=check_connection, **options)
+            return _pools[key]
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        # The parent sets the isolation level on new connections, reused ones
+        # keep theirs.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        try:
+            return self.pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+
+    def _close(self):
+        if self.connection is None:
+            return
+        reusable = not self.connection.closed
+        if reusable:
+            # Hand it back without a transaction in progress.
+            try:
+                if self.connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    self.connection.rollback()
+            except self.Database.Error:
+                reusable = False
+        self.pool.putconn(self.connection, reusable=reusable)
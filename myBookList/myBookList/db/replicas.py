@@ -0,0 +1,107 @@
+"""
+Reads from the replicas in DATABASE_REPLICAS.
+
+Only the views with ReplicaReadMixin read from a replica, for safe requests
+of users who did not write during the last DATABASE_REPLICA_LAG seconds:
+stick_to_primary() keeps the reads of a user who just wrote on the primary,
+so they see their own writes. Every other query goes to the primary.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+_read_from = ContextVar('read_from', default=None)
+
+
+def get_cache():
+    return caches[settings.DATABASE_REPLICA_CACHE_ALIAS]
+
+
+def sticky_key(user):
+    return f'replicas:sticky:{user.pk}'
+
+
+def stick_to_primary(user):
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        get_cache().set(sticky_key(user), True, timeout=settings.DATABASE_REPLICA_LAG)
+
+
+def replica_for(user):
+    """
+    The replica the user can read from, None when they must read from the
+    primary.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user.is_authenticated and get_cache().get(sticky_key(user)):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def use_replica(alias):
+    """
+    Sends the reads of the current thread or task to ``alias``, until reset
+    with the returned token.
+    """
+    return _read_from.set(alias)
+
+
+def stop_using_replica(token):
+    _read_from.reset(token)
+
+
+def replica_in_use():
+    return _read_from.get() is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_from.get()
+        # Reads in a transaction must see its writes.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Runs the queries of safe requests on a replica, see replica_for().
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            alias = replica_for(request.user)
+            if alias is not None:
+                self.replica_token = use_replica(alias)
+
+    def dispatch(self, request, *args, **kwargs):
+        # Reset here, handle_exception() re-raises the unexpected exceptions
+        # before finalize_response().
+        self.replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.replica_token is not None:
+                stop_using_replica(self.replica_token)
+                self.replica_token = None
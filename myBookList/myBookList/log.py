@@ -0,0 +1,21 @@
+import json
+import logging
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record, with the ``request_stats`` of the query
+    budget middleware as fields.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'request_stats', {}),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
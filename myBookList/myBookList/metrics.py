@@ -0,0 +1,232 @@
+"""
+Counters and histograms in the Prometheus text format, served at /metrics.
+
+Every thread updates its own shard, so recording takes no lock, and the
+shards are only merged when /metrics is scraped. With METRICS_DIR set, every
+process also writes its totals to a file in that directory, at most every
+METRICS_FLUSH_INTERVAL seconds, and a scrape adds up the files of all the
+processes. Empty the directory when the server starts, like for the
+multiprocess mode of prometheus_client.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+METRICS = {
+    'http_requests_total': ('counter', "Requests by route, method and status.", None),
+    'http_request_duration_seconds': ('histogram', "Request latency by route.", LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', "SQL queries per request by route.", QUERY_BUCKETS),
+    'db_query_duration_seconds': ('histogram', "Database time per request by route.", LATENCY_BUCKETS),
+    'cache_requests_total': ('counter', "Cache lookups by cache and result.", None),
+    'throttle_rejections_total': ('counter', "Requests rejected by throttling, by scope.", None),
+    'auth_failures_total': ('counter', "Requests answered 401 Unauthorized, by route.", None),
+}
+
+
+class Shard:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        # [count per bucket..., count over the last bucket, sum]
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self):
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed_at = 0.0
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = Shard()
+            # Kept after the thread ends, counters never go down.
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def inc(self, name, labels=(), value=1):
+        self.shard().counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        histograms = self.shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(buckets) + 2)
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        """
+        Totals of this process, as lists of [name, labels, value].
+        """
+        with self.lock:
+            shards = list(self.shards)
+        counters = defaultdict(float)
+        histograms = {}
+        for shard in shards:
+            # Copied first, the thread may add keys meanwhile.
+            for key, value in list(shard.counters.items()):
+                counters[key] += value
+            for key, values in list(shard.histograms.items()):
+                total = histograms.setdefault(key, [0] * len(values))
+                for index, value in enumerate(list(values)):
+                    total[index] += value
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+        }
+
+    def maybe_flush(self):
+        """
+        Flushes if it is time and no other thread is flushing. Called by
+        every request, so it never raises.
+        """
+        if not settings.METRICS_DIR or time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._flush()
+        except OSError:
+            logger.exception("Could not write the metrics to %s.", settings.METRICS_DIR)
+        finally:
+            self.flush_lock.release()
+
+    def flush(self):
+        with self.flush_lock:
+            self._flush()
+
+    def _flush(self):
+        self.flushed_at = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'metrics-{os.getpid()}.json'
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=f'metrics-{os.getpid()}-', suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'w') as file:
+                json.dump(self.snapshot(), file)
+            # Readers see the old file or the new one, never a partial one.
+            os.replace(temporary, path)
+        except BaseException:
+            Path(temporary).unlink(missing_ok=True)
+            raise
+
+    def collect(self):
+        """
+        Totals of every process, or of this one without METRICS_DIR.
+        """
+        if not settings.METRICS_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            for path in Path(settings.METRICS_DIR).glob('metrics-*.json'):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        counters = defaultdict(float)
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, values in snapshot['histograms']:
+                total = histograms.setdefault((name, tuple(map(tuple, labels))), [0] * len(values))
+                for index, value in enumerate(values):
+                    total[index] += value
+        return counters, histograms
+
+
+registry = Registry()
+
+# The QueryLog of the current request, set by
+# myBookList.middleware.QueryBudgetMiddleware.
+query_log = ContextVar('query_log', default=None)
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Adds the time of the block to the serialization time of the request,
+    with the queries of the lazy querysets it evaluates.
+    """
+    log = query_log.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if log is not None:
+            log.serialize_duration += time.perf_counter() - started
+
+
+def format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def exposition():
+    """
+    Every metric in the Prometheus text format.
+    """
+    counters, histograms = registry.collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), values[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(values[-1])}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    # Ratios are derived from the counters, for dashboards without PromQL.
+    lines.append('# HELP cache_hit_ratio Share of cache lookups that were hits.')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    lookups = defaultdict(lambda: {'hit': 0, 'miss': 0})
+    for (metric, labels), value in counters.items():
+        if metric == 'cache_requests_total':
+            labels = dict(labels)
+            lookups[labels['cache']][labels['result']] += value
+    for cache, results in sorted(lookups.items()):
+        total = results['hit'] + results['miss']
+        if total:
+            lines.append(f'cache_hit_ratio{format_labels((("cache", cache),))} {format_value(results["hit"] / total)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,240 @@
+import logging
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import query_log, registry
+
+
+logger = logging.getLogger('myBookList.queries')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryLog:
+    """
+    The queries of one request: how many, for how long, and how often each
+    statement ran. Also the time spent in serializers, see
+    myBookList.metrics.timed_serialization().
+
+    Runs with the same parameters are only counted with ``identical``, it
+    takes a repr() of the parameters of every query.
+    """
+
+    def __init__(self, identical=True):
+        self.count = 0
+        self.duration = 0.0
+        self.serialize_duration = 0.0
+        # Same statement with any parameters, and with the same parameters.
+        self.statements = Counter()
+        self.identical = Counter() if identical else None
+
+    def record(self, sql, params, duration):
+        self.count += 1
+        self.duration += duration
+        self.statements[sql] += 1
+        if self.identical is None:
+            return
+        try:
+            self.identical[sql, repr(params)] += 1
+        except Exception:
+            pass
+
+    def repeated(self, max_repeats):
+        """
+        Statements that ran more than ``max_repeats`` times, typically once per
+        row of an earlier query (N+1), and the ones that ran more than once
+        with the same parameters.
+        """
+        problems = [
+            f'{count} x {sql}' for sql, count in self.statements.items() if count > max_repeats
+        ]
+        problems += [
+            f'{count} x {sql} with {params}' for (sql, params), count in (self.identical or {}).items()
+            if count > 1 and self.statements[sql] <= max_repeats
+        ]
+        return problems
+
+
+def record_query(execute, sql, params, many, context):
+    log = query_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.record(sql, params, time.perf_counter() - started)
+
+
+def install_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_recorder)
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the queries, database time, serializer time (serializer.data,
+    see myBookList.metrics.timed_serialization()) and rendering time (the
+    renderer encoding the data) of every request, sends them as
+    Server-Timing and logs them to ``myBookList.queries``.
+
+    QUERY_BUDGETS holds the highest number of queries of each URL name, a
+    request over it, or running statements over and over (see
+    QueryLog.repeated(), with the same parameters only in 'raise' mode), is
+    logged as a warning, or raises QueryBudgetExceeded when
+    QUERY_BUDGET_MODE is 'raise'. Routes with a None budget are not checked.
+
+    Queries are collected in a context variable, so the ones the async views
+    run in other threads are counted too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.QUERY_BUDGET_MODE not in ('raise', 'warn', 'off'):
+            raise ImproperlyConfigured("QUERY_BUDGET_MODE must be one of 'raise', 'warn' or 'off'.")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if settings.QUERY_BUDGET_MODE == 'off':
+            return self.get_response(request)
+        started, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            log = query_log.get()
+            query_log.reset(token)
+        return self.finish(request, response, log, started)
+
+    async def __acall__(self, request):
+        if settings.QUERY_BUDGET_MODE == 'off':
+            return await self.get_response(request)
+        started, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            log = query_log.get()
+            query_log.reset(token)
+        return self.finish(request, response, log, started)
+
+    def start(self, request):
+        # Connections opened before this module was imported.
+        for connection in connections.all(initialized_only=True):
+            install_recorder(connection)
+        request.render_duration = None
+        # Repeats with the same parameters are worth their cost in the tests
+        # and in development, not on every query in production.
+        request.query_log = QueryLog(identical=settings.QUERY_BUDGET_MODE == 'raise')
+        return time.perf_counter(), query_log.set(request.query_log)
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view, time that separately.
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.render_duration = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, log, started):
+        duration = time.perf_counter() - started
+        timings = [
+            f'db;dur={log.duration * 1000:.1f};desc="{log.count} queries"',
+            f'serialize;dur={log.serialize_duration * 1000:.1f}',
+        ]
+        if request.render_duration is not None:
+            timings.append(f'render;dur={request.render_duration * 1000:.1f}')
+        timings.append(f'total;dur={duration * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+
+        match = request.resolver_match
+        url_name = match.view_name if match else None
+        budget = settings.QUERY_BUDGETS.get(url_name)
+        if budget is None and url_name in settings.QUERY_BUDGETS:
+            problems = []
+        else:
+            problems = log.repeated(settings.QUERY_BUDGET_MAX_REPEATS)
+        if budget is not None and log.count > budget:
+            problems.insert(0, f'{log.count} queries, the budget is {budget}')
+
+        stats = {
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            'queries': log.count,
+            'budget': budget,
+            'db_ms': round(log.duration * 1000, 1),
+            'serialize_ms': round(log.serialize_duration * 1000, 1),
+            'render_ms': None if request.render_duration is None else round(request.render_duration * 1000, 1),
+            'total_ms': round(duration * 1000, 1),
+        }
+        if not problems:
+            logger.info('%(method)s %(path)s: %(queries)s queries in %(db_ms)sms', stats, extra={'request_stats': stats})
+            return response
+
+        message = f'{request.method} {request.path} ({url_name}) went over its query budget: ' + '; '.join(problems)
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message, extra={'request_stats': {**stats, 'problems': problems}})
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Request counts, latency, queries and database time by route, see
+    myBookList.metrics. Goes before QueryBudgetMiddleware, which counts the
+    queries.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, duration):
+        match = request.resolver_match
+        # The pattern, not the path, so there is one series per route.
+        route = (('route', match.route if match else 'unmatched'),)
+        method = (('method', request.method),)
+        registry.inc('http_requests_total', (*method, *route, ('status', str(response.status_code))))
+        registry.observe('http_request_duration_seconds', (*method, *route), duration)
+        log = getattr(request, 'query_log', None)
+        if log is not None:
+            registry.observe('db_queries_per_request', route, log.count)
+            registry.observe('db_query_duration_seconds', route, log.duration)
+        if response.status_code == 401:
+            registry.inc('auth_failures_total', route)
+        registry.maybe_flush()
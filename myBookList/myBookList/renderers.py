@@ -0,0 +1,74 @@
+"""
+JSON renderer and parser on orjson, when it is installed
+(``pip install orjson``), otherwise they behave like DRF's.
+
+The output is the same as JSONRenderer's with the default COMPACT_JSON,
+UNICODE_JSON and STRICT_JSON settings, except for floats: orjson writes the
+ones under 0.0001 or from 1e16 on differently (``0.00001`` for ``1e-05``),
+and NaN and Infinity as null where JSONRenderer raises. Fields that hold
+floats keep them in between, like the search rank (book.serializers.RankField).
+"""
+import io
+import re
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Dates, times and dataclasses go through the DRF encoder like with
+# JSONRenderer, orjson formats them differently.
+OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson else 0
+)
+
+# orjson reads integers over 64 bits as floats, json as integers.
+LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+def default(obj, encoder=JSONEncoder()):
+    return encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not (self.compact and self.ensure_ascii is False and self.strict)
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        try:
+            content = orjson.dumps(data, default=default, option=OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits, or something the DRF encoder rejects too
+            # and JSONRenderer raises the same error for.
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, these are valid JSON but not valid JavaScript.
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        if not LONG_NUMBER.search(content):
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+        # Also for invalid JSON, so errors read the same as JSONParser's.
+        return super().parse(io.BytesIO(content), media_type, parser_context)
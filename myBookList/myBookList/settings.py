@@ -14,6 +14,7 @@ from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 
 load_dotenv()
 
@@ -44,12 +45,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt.token_blacklist',
     'book',
+    'auth.apps.AuthConfig',
 ]
 
 MIDDLEWARE = [
+    'myBookList.middleware.MetricsMiddleware',
+    'myBookList.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +66,90 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'myBookList.urls'
 
+TESTING = sys.argv[1:2] == ['test']
+
+# Highest number of queries of each URL name, see
+# myBookList.middleware.QueryBudgetMiddleware. Requests over it, or running
+# a statement more than QUERY_BUDGET_MAX_REPEATS times, fail the tests and
+# are logged as warnings otherwise. The budgets are the most queries the
+# tests measured on each route, plus one. None leaves a route out of the
+# checks.
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE') or ('raise' if TESTING else 'warn')
+QUERY_BUDGET_MAX_REPEATS = int(os.environ.get('QUERY_BUDGET_MAX_REPEATS') or 3)
+QUERY_BUDGETS = {
+    # book.urls
+    'get-books-list': 4,
+    # Runs the same statements for every batch of rows.
+    'import-books': None,
+    # Streaming responses query while they stream, after the middleware.
+    'export-books': None,
+    'book-events': None,
+    'book-cache-stats': 1,
+    'search-books': 2,
+    'book-changes': 4,
+    'book-recommendations': 2,
+    'user-recommendations': 2,
+    'get-update-delete-book': 8,
+    'get-favourite-books': 4,
+    'bulk-favourite-books': 9,
+    'favourite-book': 7,
+    # book.async_urls
+    'async-get-books-list': 4,
+    'async-get-update-delete-book': 7,
+    'async-get-favourite-books': 4,
+    'async-favourite-book': 8,
+    # auth.async_urls
+    'async-login': 4,
+    # auth.urls
+    'login': 4,
+    'register': 5,
+    'logout': 7,
+    'token-refresh': 12,
+    'db-pool-stats': 1,
+    'metrics': 0,
+}
+
+# Metrics served at /metrics, see myBookList.metrics. With several worker
+# processes METRICS_DIR must be a directory they share, emptied on start.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>", /metrics is
+# off without it.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Book events pushed at /api/events/, see book.events. With several worker
+# processes they must go through a broker the processes share:
+# BOOK_EVENTS_BROKER=book.events.PostgresBroker.
+BOOK_EVENTS_BROKER = os.environ.get('BOOK_EVENTS_BROKER') or 'book.events.LocalBroker'
+BOOK_EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('BOOK_EVENTS_MAX_SUBSCRIBERS') or 10000)
+# Events queued for a client before it is disconnected as too slow.
+BOOK_EVENTS_QUEUE_SIZE = 100
+# Seconds between keep-alive comments on idle event streams.
+BOOK_EVENTS_HEARTBEAT = 15
+
+# Neighbours kept per book by the build_recommendations command, see
+# book.recommendations.
+BOOK_RECOMMENDATIONS_NEIGHBOURS = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'myBookList.log.JSONFormatter'},
+    },
+    'handlers': {
+        'queries': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        # INFO logs every request.
+        'myBookList.queries': {
+            'handlers': ['queries'],
+            'level': os.environ.get('QUERY_LOG_LEVEL') or 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,17 +172,111 @@ WSGI_APPLICATION = 'myBookList.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Connections are kept open for PG_DB_CONN_MAX_AGE seconds and checked before
+# reuse, under WSGI only: under ASGI every request runs in a thread of its
+# own and nothing would reuse or close them, myBookList.asgi refuses it.
+# With PG_DB_POOL=true they go back to an in-process pool after every
+# request instead (myBookList.db.postgresql), so threads share fewer
+# connections than there are threads, under WSGI and ASGI.
+DATABASE_POOL = (os.environ.get('PG_DB_POOL') or '').lower() in ('1', 'true', 'yes')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'myBookList.db.postgresql' if DATABASE_POOL else 'django.db.backends.postgresql',
         'NAME': os.environ.get('PG_DB_NAME'),
         'USER': os.environ.get('PG_DB_USER'),
         'PASSWORD': os.environ.get('PG_DB_PASSWORD'),
         'HOST': os.environ.get('PG_DB_HOST'),
         'PORT': os.environ.get('PG_DB_PORT'),
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('PG_DB_CONN_MAX_AGE') or 0),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'max_size': int(os.environ.get('PG_DB_POOL_MAX_SIZE') or 10),
+                'timeout': float(os.environ.get('PG_DB_POOL_TIMEOUT') or 10),
+                'max_idle': float(os.environ.get('PG_DB_POOL_MAX_IDLE') or 600),
+                'check_after': float(os.environ.get('PG_DB_POOL_CHECK_AFTER') or 5),
+            },
+        } if DATABASE_POOL else {},
     }
 }
 
+# Read replicas as comma separated host[:port], using the name and credentials
+# of the primary: PG_DB_REPLICAS=replica1:5432,replica2:5432. Any server with
+# a copy of the database can stand in for a replica locally, the test
+# database of the replicas mirrors the primary's. See myBookList.db.replicas.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(filter(None, (os.environ.get('PG_DB_REPLICAS') or '').split(',')), start=1):
+    host, _, port = replica.strip().partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['myBookList.db.replicas.ReplicaRouter']
+
+# Seconds the replicas may lag behind. Users read from the primary for that
+# long after they write, and responses read from a replica are cached no
+# longer than that.
+DATABASE_REPLICA_LAG = float(os.environ.get('PG_DB_REPLICA_LAG') or 5)
+# Holds the users who recently wrote, must be shared by every worker.
+DATABASE_REPLICA_CACHE_ALIAS = os.environ.get('PG_DB_REPLICA_CACHE_ALIAS') or 'default'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# The book responses cache is shared by every worker in production, point it
+# to Redis with BOOK_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and BOOK_CACHE_LOCATION=redis://host:6379/0.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'books': {
+        'BACKEND': os.environ.get('BOOK_CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('BOOK_CACHE_LOCATION') or 'books',
+        'TIMEOUT': int(os.environ.get('BOOK_CACHE_TIMEOUT') or 300),
+    },
+    # Throttle counters, see myBookList.throttling. Every worker must share
+    # it for the rates to hold, point it to Redis like the books cache.
+    'throttle': {
+        'BACKEND': os.environ.get('THROTTLE_CACHE_BACKEND') or 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.environ.get('THROTTLE_CACHE_LOCATION') or 'throttle',
+    },
+}
+
+BOOK_CACHE_ALIAS = 'books'
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+# In-process cache of the users of JWT authenticated requests, used by
+# auth.authentication.CachedJWTAuthentication. A TTL of 0 disables it.
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL') or 60)
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE') or 10000)
+
+
+# Password hashing
+# The tuned hasher comes first, hashes made by the others are upgraded to it
+# on login. Login hashing runs in a pool, see auth.passwords and
+# auth.backends.PooledModelBackend.
+
+AUTHENTICATION_BACKENDS = ['auth.backends.PooledModelBackend']
+
+PASSWORD_HASHERS = [
+    'auth.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS') or 0) or None
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS') or os.cpu_count())
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE') or 4 * PASSWORD_HASHING_WORKERS)
+PASSWORD_HASHING_TIMEOUT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -138,18 +321,32 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Rest Framework settings
 REST_FRAMEWORK = {
+    # orjson when installed, see myBookList.renderers.
+    'DEFAULT_RENDERER_CLASSES': [
+        'myBookList.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'myBookList.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        os.environ.get('JWT_AUTHENTICATION_CLASS') or 'rest_framework_simplejwt.authentication.JWTAuthentication'
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'myBookList.throttling.AnonSlidingWindowThrottle',
+        'myBookList.throttling.UserSlidingWindowThrottle'
     ],
+    # 'user' applies to views without a throttle_scope, the others are
+    # scopes of single endpoints.
     'DEFAULT_THROTTLE_RATES': {
         'anon': '10/min',
-        'user': '20/min'
+        'user': '20/min',
+        'book-create': '10/min',
+        'favourite': '60/min',
     }
 }
 
@@ -157,5 +354,6 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=50),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=2),
     'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True
+    'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'auth.serializers.RefreshTokenSerializer',
 }
@@ -0,0 +1,349 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from importlib import import_module
+from pathlib import Path
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+import io
+from tempfile import TemporaryDirectory
+import json
+import os
+import threading
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from unittest import mock
+
+from book.models import Book
+
+from .db.pool import ConnectionPool, PoolTimeout
+from .db.postgresql.base import DatabaseWrapper, close_pools, pool_stats
+from .metrics import Registry, exposition, registry
+from .middleware import QueryBudgetExceeded, QueryLog
+from .renderers import FastJSONParser, FastJSONRenderer
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTestCase(TestCase):
+    def make_pool(self, **options):
+        options = {'max_size': 2, 'timeout': 0.01, 'max_idle': 600, 'check_after': 5, 'check': lambda c: True, **options}
+        return ConnectionPool(**options)
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(FakeConnection), connection)
+        stats = pool.stats()
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['idle'], 0)
+
+    def test_max_size(self):
+        pool = self.make_pool()
+        first, second = pool.getconn(FakeConnection), pool.getconn(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.putconn(first)
+        self.assertIs(pool.getconn(FakeConnection), first)
+
+    def test_unusable_connections_are_replaced(self):
+        pool = self.make_pool(check=lambda c: False, check_after=0)
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        self.assertIsNot(pool.getconn(FakeConnection), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+        # Closed or broken connections are not kept at all.
+        closed = pool.getconn(FakeConnection)
+        closed.close()
+        pool.putconn(closed)
+        pool.putconn(pool.getconn(FakeConnection), reusable=False)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_idle_connections_expire(self):
+        pool = self.make_pool(max_idle=60)
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        with mock.patch('time.monotonic', return_value=pool.idle[0][1] + 61):
+            self.assertIsNot(pool.getconn(FakeConnection), connection)
+        self.assertTrue(connection.closed)
+
+
+class PooledDatabaseWrapperTestCase(TestCase):
+    def setUp(self):
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': {'max_size': 1}}}
+        # A second wrapper of the default database, django.contrib.postgres
+        # looks the alias up when connecting.
+        self.wrapper = DatabaseWrapper(settings_dict)
+        self.addCleanup(close_pools)
+        self.addCleanup(self.wrapper.close)
+
+    def stats(self):
+        return pool_stats()[f'default:{connection.settings_dict["NAME"]}']
+
+    def test_closing_returns_the_connection(self):
+        self.wrapper.ensure_connection()
+        before = self.stats()
+        raw = self.wrapper.connection
+        self.wrapper.close()
+        self.assertFalse(raw.closed)
+
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIs(self.wrapper.connection, raw)
+        after = self.stats()
+        self.assertEqual(after['connections_opened'], before['connections_opened'])
+        self.assertEqual(after['checkouts'], before['checkouts'] + 1)
+
+    def test_transactions_are_rolled_back(self):
+        self.wrapper.set_autocommit(False)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        self.assertEqual(self.wrapper.connection.get_transaction_status(), 0)
+        self.assertTrue(self.wrapper.get_autocommit())
+
+
+class ASGIConnectionsTestCase(TestCase):
+    def test_persistent_connections_are_refused(self):
+        from .asgi import check_connections
+
+        check_connections({'default': {'CONN_MAX_AGE': 0}})
+        with self.assertRaises(ImproperlyConfigured):
+            check_connections({'default': {'CONN_MAX_AGE': 0}, 'replica1': {'CONN_MAX_AGE': 60}})
+
+
+class DatabasePoolStatsViewTestCase(TestCase):
+    def test_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='testuser', password='testpassword'))
+        self.assertEqual(client.get('/api/db-pool/').status_code, status.HTTP_403_FORBIDDEN)
+
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='testpassword'))
+        response = client.get('/api/db-pool/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, pool_stats())
+
+
+class QueryBudgetMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+
+    def test_every_url_has_a_budget(self):
+        for urlconf in ('book.urls', 'book.async_urls', 'auth.urls', 'auth.async_urls'):
+            for pattern in import_module(urlconf).urlpatterns:
+                self.assertIn(pattern.name, settings.QUERY_BUDGETS, urlconf)
+
+    def test_server_timing(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = dict(timing.split(';', 1) for timing in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'db', 'serialize', 'render', 'total'})
+        self.assertIn('desc="2 queries"', timings['db'])
+
+    @override_settings(QUERY_BUDGETS={'get-books-list': 1})
+    def test_over_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, '2 queries, the budget is 1'):
+            self.client.get('/api/books/')
+
+    @override_settings(QUERY_BUDGET_MODE='warn', QUERY_BUDGETS={'get-books-list': 1})
+    def test_over_budget_warning(self):
+        with self.assertLogs('myBookList.queries', 'WARNING') as logs:
+            response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(logs.records[0].request_stats['queries'], 2)
+        self.assertEqual(logs.records[0].request_stats['url_name'], 'get-books-list')
+
+    @override_settings(QUERY_BUDGET_MAX_REPEATS=0, QUERY_BUDGETS={'get-books-list': None})
+    def test_routes_left_out(self):
+        response = self.client.get('/api/books/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_serialization_time(self):
+        response = self.client.get('/api/books/')
+        self.assertGreater(response.wsgi_request.query_log.serialize_duration, 0)
+
+    def test_repeated_queries(self):
+        log = QueryLog()
+        for book_id in range(4):
+            log.record('SELECT * FROM book_book WHERE id = %s', (book_id,), 0)
+        log.record('SELECT 1', (), 0)
+        log.record('SELECT 1', (), 0)
+        self.assertEqual(log.repeated(3), [
+            '4 x SELECT * FROM book_book WHERE id = %s',
+            '2 x SELECT 1 with ()',
+        ])
+        self.assertEqual(log.repeated(4), ['2 x SELECT 1 with ()'])
+
+    @override_settings(QUERY_BUDGET_MODE='warn')
+    def test_identical_queries_only_counted_in_raise_mode(self):
+        response = self.client.get('/api/books/')
+        self.assertIsNone(response.wsgi_request.query_log.identical)
+        log = QueryLog(identical=False)
+        log.record('SELECT 1', (), 0)
+        log.record('SELECT 1', (), 0)
+        self.assertEqual(log.repeated(3), [])
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+
+    def request_count(self, route, status_code):
+        counters, histograms = registry.collect()
+        labels = (('method', 'GET'), ('route', route), ('status', str(status_code)))
+        return counters['http_requests_total', labels]
+
+    def test_requests_by_route(self):
+        before = self.request_count('api/books/<int:pk>/', 200)
+        book = Book.objects.create(title='Test Book', author='Test Author', creator=self.user, publicationYear=2022, isbn='1234567890')
+        self.client.force_authenticate(user=self.user)
+        self.client.get(f'/api/books/{book.id}/')
+        self.client.get(f'/api/books/{book.id}/')
+        self.assertEqual(self.request_count('api/books/<int:pk>/', 200), before + 2)
+
+        self.client.force_authenticate(user=None)
+        self.client.get('/api/favourites/')
+        with override_settings(METRICS_TOKEN='secret'):
+            output = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="api/books/<int:pk>/",le="+Inf"}', output)
+        self.assertIn('db_queries_per_request_count{route="api/books/<int:pk>/"}', output)
+        self.assertIn('auth_failures_total{route="api/favourites/"}', output)
+
+    def test_histograms(self):
+        metrics = Registry()
+        metrics.observe('db_queries_per_request', (('route', 'a'),), 2)
+        metrics.observe('db_queries_per_request', (('route', 'a'),), 100)
+        counters, histograms = metrics.collect()
+        values = histograms['db_queries_per_request', (('route', 'a'),)]
+        # Buckets 0, 1, 2, ..., over the last one, then the sum.
+        self.assertEqual(values[:3], [0, 0, 1])
+        self.assertEqual(values[-2:], [1, 102])
+
+    def test_threads_are_merged(self):
+        metrics = Registry()
+        threads = [threading.Thread(target=lambda: [metrics.inc('auth_failures_total') for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(metrics.shards), 4)
+        self.assertEqual(metrics.collect()[0]['auth_failures_total', ()], 4000)
+
+    def test_processes_are_merged(self):
+        with TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = Registry()
+            other.inc('throttle_rejections_total', (('scope', 'user'),), 3)
+            # What another process would have flushed.
+            Path(directory, 'metrics-1.json').write_text(json.dumps(other.snapshot()))
+            metrics = Registry()
+            metrics.inc('throttle_rejections_total', (('scope', 'user'),), 2)
+            counters, histograms = metrics.collect()
+            self.assertTrue(Path(directory, f'metrics-{os.getpid()}.json').exists())
+        self.assertEqual(counters['throttle_rejections_total', (('scope', 'user'),)], 5)
+
+    def test_cache_hit_ratio(self):
+        with mock.patch('myBookList.metrics.registry', Registry()) as metrics:
+            metrics.inc('cache_requests_total', (('cache', 'books'), ('result', 'hit')), 3)
+            metrics.inc('cache_requests_total', (('cache', 'books'), ('result', 'miss')))
+            self.assertIn('cache_hit_ratio{cache="books"} 0.75\n', exposition())
+
+    def test_concurrent_flushes(self):
+        with TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=0):
+            metrics = Registry()
+            metrics.inc('auth_failures_total')
+            errors = []
+
+            def flush():
+                try:
+                    for _ in range(200):
+                        metrics.maybe_flush()
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=flush) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual([path.name for path in Path(directory).iterdir()], [f'metrics-{os.getpid()}.json'])
+
+    def test_flush_errors_are_logged(self):
+        with TemporaryDirectory() as directory:
+            # A file where the directory should be.
+            path = Path(directory, 'file')
+            path.write_text('')
+            with override_settings(METRICS_DIR=str(path)), self.assertLogs('myBookList.metrics', 'ERROR'):
+                Registry().maybe_flush()
+
+    def test_off_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+
+class FastJSONTestCase(TestCase):
+    def test_renders_like_json_renderer(self):
+        payloads = [
+            {'title': 'Tést \u2028 \u2029 "quoted" \\ <b>', 'count': 3, 'ok': True, 'missing': None},
+            [{'id': 1, 'nested': {'values': (1, 2.5, -0.0)}}, 'x'],
+            {'detail': ErrorDetail('Not found.', code='not_found'), 1: 'int key'},
+            {'when': datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc), 'day': date(2024, 5, 1)},
+            {'amount': Decimal('1.10'), 'uuid': UUID(int=1), 'big': 2 ** 70, 'set': {1}},
+            None,
+        ]
+        for data in payloads:
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data), data)
+
+    def test_floats(self):
+        data = {'small': 0.0001, 'large': 1e15, 'nested': [{'score': 0.5, 'rank': 0.0608}]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent(self):
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_parses_like_json_parser(self):
+        context = {'encoding': 'utf-8'}
+        for content in (b'{"a": [1, 2.5, "t\u00e9st", null, true]}', b'{"big": 123456789012345678901234567890}'):
+            self.assertEqual(
+                FastJSONParser().parse(io.BytesIO(content), parser_context=context),
+                JSONParser().parse(io.BytesIO(content), parser_context=context),
+            )
+        for content in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError) as fast:
+                FastJSONParser().parse(io.BytesIO(content), parser_context=context)
+            with self.assertRaises(ParseError) as stdlib:
+                JSONParser().parse(io.BytesIO(content), parser_context=context)
+            self.assertEqual(str(fast.exception), str(stdlib.exception))
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+from .metrics import registry
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Rate throttle over a sliding window, kept in the THROTTLE_CACHE_ALIAS
+    cache so every worker counts against the same limit.
+
+    Each key holds two counters, the requests of the current fixed window
+    and of the previous one. The previous window is weighted by how much of
+    it still overlaps the sliding window, so a check costs the same and
+    stores the same whatever the rate. Counters are updated with the cache's
+    atomic incr(), concurrent requests cannot both take the last slot.
+
+    The scope of a request is the ``throttle_scope`` of the view, either a
+    name or a dict of names by HTTP method, and ``scope`` otherwise. Each
+    scope has its own rate in DEFAULT_THROTTLE_RATES and its own counters.
+    """
+    scope = None
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def __init__(self):
+        # The rate depends on the view, it is read in allow_request().
+        pass
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if isinstance(scope, dict):
+            scope = scope.get(request.method)
+        return scope or self.scope
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        window, self.elapsed = divmod(self.timer(), self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        # Kept for two windows, it is the previous window during the second.
+        self.cache.add(current_key, 0, timeout=2 * self.duration)
+        try:
+            self.count = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted since the add().
+            self.cache.set(current_key, 1, timeout=2 * self.duration)
+            self.count = 1
+        self.previous = self.cache.get(f'{self.key}:{int(window) - 1}', 0)
+
+        if self.estimate(self.count) > self.num_requests:
+            # Rejected requests do not count.
+            self.cache.decr(current_key)
+            self.count -= 1
+            registry.inc('throttle_rejections_total', (('scope', self.scope),))
+            return False
+        return True
+
+    def estimate(self, count):
+        return self.previous * (1 - self.elapsed / self.duration) + count
+
+    def wait(self):
+        """
+        Seconds until the estimate leaves room for one more request.
+        """
+        room = self.num_requests - 1
+        if self.count <= room:
+            # The previous window is in the way, wait for it to slide out.
+            return max(0, (1 - (room - self.count) / self.previous) * self.duration - self.elapsed)
+        # The current window is full, wait into the next one.
+        return self.duration - self.elapsed + max(0, 1 - room / self.count) * self.duration
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottle):
+    """
+    Limits the requests of anonymous users, by IP address, whatever the
+    scope of the view.
+    """
+    scope = 'anon'
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle):
+    """
+    Limits the requests of each user, or IP address for anonymous users, in
+    the scope of the view.
+    """
+    scope = 'user'
@@ -21,8 +21,14 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from .views import DatabasePoolStatsView, metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('book.urls')),
+    path('api/async/', include('book.async_urls')),
     path("api/auth/", include('auth.urls')),
+    path('api/async/auth/', include('auth.async_urls')),
+    path('api/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('metrics', metrics, name='metrics'),
 ]
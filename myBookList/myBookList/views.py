@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .db.postgresql.base import pool_stats
+from .metrics import exposition
+
+
+class DatabasePoolStatsView(APIView):
+    """
+    Connection pool statistics of the process serving the request, empty
+    unless PG_DB_POOL is enabled.
+    """
+    permission_classes = [IsAdminUser]
+    throttle_classes = []
+
+    def get(self, request):
+        return Response(pool_stats())
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint. A plain view, so scrapes are not throttled
+    and need no user, only METRICS_TOKEN: without it the endpoint is off.
+    """
+    if not settings.METRICS_TOKEN:
+        return HttpResponse(status=404)
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not constant_time_compare(request.headers.get('Authorization', ''), expected):
+        return HttpResponse(status=401)
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')